@@ -1,81 +1,61 @@
 # --- stdlib & setup ---
-import sys, re, datetime, json
-from time import perf_counter
+import sys
 from pathlib import Path
 import streamlit as st
 
-# router / bandit
-from services.router.bandit import (
-    EpsGreedyBandit,
-    offline_learn_from_csv,
-    reward_from_row,
-)
-
 # Absolute, stable paths
 ROOT = Path(__file__).resolve().parents[2]   # -> /app inside the container
-DATA_DIR = ROOT / "data"
-LOGS_DIR = DATA_DIR / "logs"
-LOGS_DIR.mkdir(parents=True, exist_ok=True)
-LOG_FILE = LOGS_DIR / "app_events.log"
 
 # Make project root importable
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-def log_event(question, mode):
-    event = {
-        "timestamp": datetime.datetime.now().isoformat(),
-        "question": question,
-        "mode": mode,
-    }
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(event) + "\n")
-
 # --- third-party & app modules ---
 from dotenv import load_dotenv
 load_dotenv()
 
-# tools & pipelines
-from services.vector.query_tfidf import query_vector
-from services.graph.graph_qa import query_graph
-from services.vector.query_embed import query_vector_semantic
-from services.router.logger import log_route
-from services.agent.planner import decide_tasks, rewrite_question, combine_answers
-from services.tools.math_eval import eval_math
-from services.tools.num_parse import parse_human_number  # (used by math_eval)
-from services.tools.ocr import extract_text
-
-# --- helper: dynamic route order ---
-def auto_route_order(question: str):
-    q_lower = question.lower()
-    if any(x in q_lower for x in ["who", "ceo", "interact", "relation"]):
-        return ["graph", "vector_semantic"]
-    elif any(x in q_lower for x in ["image", "ocr", "photo"]):
-        return ["ocr", "vector_semantic"]
-    else:
-        return ["vector_semantic", "graph"]
+# The pipeline (rewrite, planner, tools, logging, bandit) lives in the
+# orchestrator service; this script only collects input and renders the result.
+# Backends (OCR, TF-IDF, Chroma, Neo4j, router) are imported on first use and kept
+# as process-wide singletons, so a rerun only re-executes this script.
+from services.api.client import ask
 
 # ---------------- UI ----------------
 st.set_page_config(page_title="Agentic Swarm — Vector + Graph RAG", page_icon="🧭")
 st.title("Agentic Swarm — RAG Demo (Vector + Graph + Router)")
 
-# warm/start the bandit from existing logs (cheap + fast)
-bandit = offline_learn_from_csv()
-
 mode = st.sidebar.radio(
     "Mode",
-    ["Vector (TF-IDF)", "Vector (Semantic)", "Graph (Neo4j)", "Auto (Router)"]
+    ["Vector (TF-IDF)", "Vector (Semantic)", "Vector (Hybrid)", "Graph (Neo4j)", "Auto (Router)"]
 )
 k = st.sidebar.slider("Top-k (Vector)", 1, 8, 4, 1)
 q = st.text_input("Ask a question (e.g., 'Metformin side effects', 'Who is Tesla’s CEO?')")
 
-# Optional image -> OCR (done once; we reuse the text later)
-img_file = st.file_uploader("Optional: attach an image with text (PNG/JPG)", type=["png","jpg","jpeg"])
+# Optional image / scanned document -> OCR (done once; we reuse the text later)
+img_file = st.file_uploader("Optional: attach an image or scanned document (PNG/JPG/TIFF/PDF)",
+                            type=["png", "jpg", "jpeg", "tif", "tiff", "pdf"])
 ocr_text, ocr_latency = "", None
 if img_file is not None:
+    ocr_layout = st.sidebar.selectbox("OCR layout", ["auto", "document", "block", "line", "sparse", "raw"],
+                                      help="auto: 'document' for TIFF/PDF, 'block' for screenshots")
     try:
+        from services.tools.ocr import OcrPageError, extract_text_cached     # PIL / pytesseract only once an image arrives
         img_bytes = img_file.getvalue()
-        ocr_text, ocr_latency = extract_text(img_bytes, lang="eng")
+        ocr_mode = ocr_layout
+        if ocr_mode == "auto":
+            ocr_mode = "document" if img_file.name.lower().endswith((".tif", ".tiff", ".pdf")) else "block"
+        bar = st.progress(0.0, text="OCR…")
+        # content-addressed cache: reruns (slider moves, Ask clicks) don't re-run Tesseract;
+        # multi-page uploads are spread over the OCR process pool
+        try:
+            ocr_text, ocr_latency = extract_text_cached(
+                img_bytes, lang="eng", mode=ocr_mode,
+                progress=lambda done, total: bar.progress(done / total, text=f"OCR page {done}/{total}"),
+            )
+        except OcrPageError as e:     # keep the pages that worked; nothing cached, a rerun retries
+            ocr_text = e.text
+            st.warning(f"OCR incomplete, {len(e.errors)} page(s) failed: {e}")
+        bar.empty()
         with st.expander("📄 OCR text (from image)"):
             st.write(ocr_text if ocr_text else "(no text detected)")
     except Exception as e:
@@ -88,179 +68,49 @@ if st.button("Ask"):
         st.warning("Type a question or upload an image.")
         st.stop()
 
-    # Merge typed text + OCR (if present)
-    if q and ocr_text:
-        base_query = f"{q}\n\n[Image OCR]: {ocr_text}"
-    elif ocr_text:
-        base_query = ocr_text
-    else:
-        base_query = q
-
-    log_event(base_query, mode)
-    t0 = perf_counter()
-    q2 = rewrite_question(base_query)
-
-    # --- FAST PATH: pure math gets answered immediately ---
-    # --- FAST PATHS -----------------------------------------------------
-    if any(op in q2 for op in ["+", "-", "*", "/", "%", "^"]) or re.search(r"\d+\s*(%|M|K|\.\d+)?", q2):
-        try:
-            from services.tools.math_eval import eval_math
-            res = eval_math(q2)
-            if res is not None:
-                st.session_state["decision_used"] = "math"
-                st.write(f"🧮 **Answer:** {res}")
-                st.stop()
-        except Exception as e:
-            st.warning(f"Math agent error: {e}")
-
-        # Log + bandit update
-        log_route(base_query, decision_used, 1, latency_ms, rewritten=q2)
-        try:
-            r = reward_from_row({"decision": decision_used, "had_answer": 1, "latency_ms": latency_ms})
-            bandit.update(decision_used, r)
-        except Exception:
-            pass
-
+    try:
+        res = ask(q, mode=mode, k=k, ocr_text=ocr_text)
+    except Exception as e:
+        st.error(f"Orchestrator unavailable: {e}")
         st.stop()
-    # --- FAST PATH: OCR / IMAGE ------------------------------------------
-    if uploaded_file is not None and uploaded_file.type in ["image/png", "image/jpeg"]:
-        text, latency = extract_text(uploaded_file.read())
-        if text:
-            st.session_state["decision_used"] = "ocr"
-            st.write("🖼️ **Extracted Text from Image:**")
-            st.code(text)
-            st.caption(f"OCR latency: {latency} ms")
-            st.stop()
-    else:
-        st.warning("⚠️ No readable text detected in the uploaded image.")    
-    # --- end fast path ---
 
-    # Decide which tools to try (order matters)
-    if mode == "Vector (TF-IDF)":
-        tasks = ["vector"]
-        router_caption = "VECTOR (manual)"
-
-    elif mode == "Vector (Semantic)":
-        tasks = ["vector_semantic"]
-        router_caption = "SEMANTIC (manual)"
-
-    elif mode == "Graph (Neo4j)":
-        tasks = ["graph"]
-        router_caption = "GRAPH (manual)"
-
-    else:
-        # Auto: planner decides viable tools; allow semantic
-        planner_tasks = decide_tasks(q2)  # e.g., ["math","graph","vector_semantic"] etc.
-        if len(planner_tasks) > 1:
-            chosen = bandit.select()  # one of ["vector","vector_semantic","graph","math"]
-            if chosen == "math":
-                tasks = ["math"] + [t for t in planner_tasks if t != "math"]
-            elif chosen == "graph":
-                tasks = ["graph"] + [t for t in planner_tasks if t != "graph"]
-            elif chosen == "vector_semantic":
-                tasks = ["vector_semantic"] + [t for t in planner_tasks if t != "vector_semantic"]
-            else:
-                tasks = ["vector"] + [t for t in planner_tasks if t not in ["vector", "vector_semantic"]]
-            router_caption = f"AGENT (bandit + planner → {chosen})"
-        else:
-            tasks = planner_tasks
-            router_caption = "AGENT (planner)"
-
-    st.caption(f"Router decision: {router_caption}")
-
-    # Running state
-    decision_used = None
-    final_answer = None  # can be str OR number
-    graph_ans = None
-    vector_ans = None
-    graph_sources = []
-
-    # Try each task until we get a usable answer
-    for tool in tasks:
-        if tool == "math":
-            ans = eval_math(q2)
-            if ans is not None:
-                decision_used = "math"
-                final_answer = ans
-                break
-
-        elif tool == "graph":
-            ans, sources = query_graph(q2)
-            if ans and str(ans).strip():
-                decision_used = "graph"
-                graph_ans = ans
-                graph_sources = sources or []
-                final_answer = ans
-                break
-
-        elif tool == "vector_semantic":
-            docs, metas, ids, v_latency = query_vector_semantic(q2, k=k)
-            if docs and str(docs[0]).strip():
-                snippet = docs[0][:800] + ("..." if len(docs[0]) > 800 else "")
-                decision_used = "vector_semantic"
-                vector_ans = snippet
-                final_answer = snippet
-                break
-
-        elif tool == "vector":
-            docs, metas, ids, v_latency = query_vector(q2, k=k)
-            if docs and docs[0].strip():
-                snippet = docs[0][:800] + ("..." if len(docs[0]) > 800 else "")
-                decision_used = "vector"
-                vector_ans = snippet
-                final_answer = snippet
-                break
-
-    # OPTIONAL: append math result when graph answered
-    if decision_used == "graph":
-        try:
-            math_extra = eval_math(q2)
-            if math_extra is not None:
-                final_answer = (final_answer or "") + f"\n{math_extra}"
-        except Exception:
-            pass
-
-    # If nothing answered yet but we have partials, try to combine (optional)
-    if final_answer is None:
-        final_answer = combine_answers(graph_ans, vector_ans)
-
-    # Compute latency and “has_answer”
-    latency_ms = int((perf_counter() - t0) * 1000)
-    has_answer = bool(final_answer.strip()) if isinstance(final_answer, str) else (final_answer is not None)
+    st.session_state["decision_used"] = res.get("decision")
+    st.caption(f"Router decision: {res.get('router')}")
+    if res.get("cached"):
+        st.caption("⚡ Served from the answer cache")
 
     # ----------- Render -----------
-    st.subheader("Final Answer ↪")
-    st.write(final_answer if has_answer else "Sorry, I don’t know how to answer that yet (graph).")
+    final_answer = res.get("answer")
+    if res.get("won_by") == "math" and res.get("fanout") is None:
+        st.write(f"🧮 **Answer:** {final_answer}")
+    elif res.get("won_by") == "facts":
+        st.write(f"📊 **Answer:** {final_answer}")
+        for f in res.get("facts") or []:
+            st.caption(f"{f['entity']} · {f['metric']} · {f['period'] or 'latest'} = {f['value']:g} ({f['source_file']})")
+    else:
+        st.subheader("Final Answer ↪")
+        st.write(final_answer if res.get("had_answer") else "Sorry, I don’t know how to answer that yet (graph).")
 
-    if graph_sources:
-        st.subheader("Graph Sources")
-        for s in graph_sources:
-            st.write(f"- {s}")
+        if "graph" in (res.get("decision"), res.get("won_by")) and res.get("sources"):
+            st.subheader("Graph Sources")
+            for s in res["sources"]:
+                st.write(f"- {s}")
 
     with st.expander("debug"):
         st.write(
             {
                 "question": q,
-                "rewritten": q2,
-                "tasks": tasks,
-                "decision_used": decision_used,
-                "graph_ans?": bool(graph_ans),
-                "vector_ans?": bool(vector_ans),
+                "rewritten": res.get("rewritten"),
+                "tasks": res.get("tasks"),
+                "decision_used": res.get("won_by"),
+                "fanout": res.get("fanout"),
                 "ocr_chars": len(ocr_text) if ocr_text else 0,
                 "ocr_latency_ms": ocr_latency,
-                "latency_ms": latency_ms,
+                "latency_ms": res.get("latency_ms"),
+                "trace_id": res.get("trace_id"),
+                "spans": res.get("spans"),
             }
         )
 
-    # ----------- Log + bandit update -----------
-    decision_to_log = decision_used or ("graph" if tasks == ["graph"] else "vector")
-    log_route(base_query, decision_to_log, int(has_answer), latency_ms, rewritten=q2)
-    try:
-        row = {"decision": decision_to_log, "had_answer": int(has_answer), "latency_ms": latency_ms}
-        r = reward_from_row(row)
-        bandit.update(decision_to_log, r)
-    except Exception:
-        pass
-
 st.sidebar.markdown("----")
-st.sidebar.caption("✅ App Status: Running")
\ No newline at end of file
+st.sidebar.caption("✅ App Status: Running")
@@ -1,8 +1,9 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import json
+import time
 from pathlib import Path
-import altair as alt  # optional; safe to keep
 
 st.set_page_config(page_title="Router Dashboard", page_icon="📊")
 
@@ -11,51 +12,120 @@ st.title("📊 Router Performance Dashboard")
 log_path = Path("data/logs/route_log.csv")
 model_path = Path("data/models/router_bandit.json")
 
+# Charts query pre-aggregated minute/hour rollups (services/router/rollups.py),
+# which are caught up by tailing only the new part of the log; recent rows come
+# from the incremental stats store. Neither re-parses the whole log.
+from services.router.contextual import MODEL_PATH as CONTEXTUAL_MODEL_PATH, ROUTER_POLICY
+from services.router.log_backend import read_since
+from services.router.logger import LOG_PATH, ROUTE_SCHEMA
+from services.router.rollups import get_rollups
+from services.router.stats import get_route_stats
+
+RANGES = {
+    "Last 15 minutes": (15 * 60, "minute"),
+    "Last hour": (3600, "minute"),
+    "Last 6 hours": (6 * 3600, "minute"),
+    "Last 24 hours": (24 * 3600, "minute"),
+    "Last 7 days": (7 * 86400, "hour"),
+    "Last 30 days": (30 * 86400, "hour"),
+    "All time": (None, "hour"),
+}
+
 # --- Load data ---
 if not log_path.exists():
     st.warning("No route log file found yet! Run some queries in Auto mode first.")
 else:
-    df = pd.read_csv(log_path)
+    rollups = get_rollups(refresh=True)
+    stats = get_route_stats(refresh=True)
 
     st.subheader("Log Overview")
 
-    # Decision filter (graph/vector/math)
-    dec = st.multiselect(
-        "Filter decisions",
-        ["graph", "vector", "math"],
-        default=["graph", "vector", "math"]
-    )
-    df_show = df[df["decision"].isin(dec)]
-
-    # Show filtered data (last 10 rows)
-    st.dataframe(df_show.tail(10), use_container_width=True)
-
-    # Download filtered CSV
+    col1, col2 = st.columns(2)
+    with col1:
+        span_label = st.selectbox("Time range", list(RANGES), index=3)
+    with col2:
+        pct = st.radio("Latency percentile", ["p50_ms", "p95_ms", "p99_ms"], index=1, horizontal=True,
+                       format_func=lambda c: c.split("_")[0])
+    span_s, res = RANGES[span_label]
+    start = time.time() - span_s if span_s else None
+
+    # Decision filter
+    all_decisions = rollups.decisions()
+    if not all_decisions:
+        st.info("No routed questions logged yet.")
+        st.stop()
+    dec = st.multiselect("Filter decisions", all_decisions, default=all_decisions)
+
+    summary = rollups.summary(res, start=start, decisions=dec)
+    series = rollups.series(res, start=start, decisions=dec)
+    if summary.empty:
+        st.info(f"No routed questions in the selected range ({span_label.lower()}).")
+        st.stop()
+    df_show = summary.set_index("decision")
+
+    # Most recent rows (kept by the stats store)
+    recent = pd.DataFrame(list(stats.recent))
+    if not recent.empty:
+        recent["ts"] = pd.to_datetime(recent["ts"], unit="s")
+        st.dataframe(recent[recent["decision"].isin(dec)].tail(10), use_container_width=True)
+
+    # The filtered rollups are already in memory; the raw log is only read when asked for
     st.download_button(
-        "⬇️ Download logs CSV",
-        df_show.to_csv(index=False),
-        "route_log.csv",
+        f"⬇️ Download {res} rollups CSV",
+        series.to_csv(index=False).encode("utf-8"),
+        f"route_rollups_{res}.csv",
         "text/csv"
     )
+    if st.button("Prepare raw log download"):
+        # every segment (rotated, compacted and the active file), oldest first
+        raw, _, _ = read_since(LOG_PATH, ROUTE_SCHEMA)
+        raw = raw if raw is not None else pd.DataFrame(columns=ROUTE_SCHEMA.columns)
+        st.download_button(
+            "⬇️ Download logs CSV",
+            raw.to_csv(index=False).encode("utf-8"),
+            "route_log.csv",
+            "text/csv"
+        )
 
     # Quick KPIs
-    st.metric("Total Queries", len(df_show))
-    st.metric("Unique Decisions", df_show["decision"].nunique())
+    st.metric("Total Queries", int(df_show["n"].sum()))
+    st.metric("Unique Decisions", len(df_show))
+
+    st.subheader(f"Per-decision summary ({res} rollups)")
+    st.dataframe(df_show.round(2), use_container_width=True)
+
+    # Charts (computed from the filtered rollups)
+    st.subheader(f"Queries per {res}")
+    st.line_chart(series.pivot(index="time", columns="decision", values="n").fillna(0))
 
-    # Charts (computed from the filtered view)
-    st.subheader("Decisions Breakdown")
-    st.bar_chart(df_show["decision"].value_counts())
+    st.subheader(f"Latency {pct.split('_')[0]} (ms) per {res}")
+    st.line_chart(series.pivot(index="time", columns="decision", values=pct))
+
+    st.subheader("Latency percentiles (ms) by Decision")
+    st.bar_chart(df_show[["p50_ms", "p95_ms", "p99_ms"]])
 
     st.subheader("Average Latency (ms) by Decision")
-    avg_latency = df_show.groupby("decision")["latency_ms"].mean().sort_values()
-    st.bar_chart(avg_latency)
+    st.bar_chart(df_show["mean_latency_ms"].sort_values())
 
     st.subheader("Success Rate by Decision")
-    success = df_show.groupby("decision")["had_answer"].mean().round(2)
-    st.bar_chart(success)
-
-# --- Bandit Model ---
-if not model_path.exists():
+    st.bar_chart(df_show["success_rate"].round(2))
+    st.line_chart(series.pivot(index="time", columns="decision", values="success_rate"))
+
+# --- Router Model ---
+if ROUTER_POLICY in ("linucb", "thompson"):
+    # the epsilon-greedy bandit is not routing; show the contextual router's state instead
+    ctx_path = Path(CONTEXTUAL_MODEL_PATH)
+    if not ctx_path.exists():
+        st.warning(f"No {ctx_path.name} found! Run a few queries in Auto mode.")
+    else:
+        st.subheader(f"Contextual Router State ({ROUTER_POLICY})")
+        with np.load(ctx_path) as z:
+            meta = json.loads(str(z["meta"]))
+            n = z["n"]
+        st.write("Observations per tool:")
+        st.json({a: int(c) for a, c in zip(meta.get("arms", []), n)})
+        st.caption(f"{len(meta.get('features', []))} question features per tool")
+elif not model_path.exists():
     st.warning("No router_bandit.json found! Run a few queries in Auto mode.")
 else:
     st.subheader("Bandit Learning State")
@@ -1,4 +1,3 @@
-import os
 from pathlib import Path
 import streamlit as st
 
@@ -7,9 +6,10 @@ st.title("🔎 Health / Diagnostics")
 
 # --- TF-IDF index check ---
 st.subheader("TF-IDF Index")
-idx_path = Path(__file__).resolve().parents[3] / "data" / "tfidf_index.pkl"
-if idx_path.exists():
-    st.success(f"✅ Found TF-IDF index at {idx_path}")
+idx_path = Path(__file__).resolve().parents[3] / "data" / "tfidf_index"
+idx_version = (idx_path / "CURRENT").read_text().strip() if (idx_path / "CURRENT").exists() else None
+if idx_version:
+    st.success(f"✅ Found TF-IDF index at {idx_path} (version {idx_version})")
 else:
     st.error("❌ TF-IDF index NOT found.\nRun inside container:\n`python services/vector/ingest_tfidf.py`")
 
@@ -26,21 +26,67 @@ except Exception as e:
 # --- Neo4j check ---
 st.subheader("Neo4j Connectivity")
 try:
-    from neo4j import GraphDatabase
-    URI = os.getenv("NEO4J_URI", "bolt://graph:7687")
-    USER = os.getenv("NEO4J_USER", "neo4j")
-    PWD = os.getenv("NEO4J_PASSWORD", "testtest")
-
-    drv = GraphDatabase.driver(URI, auth=(USER, PWD))
-    with drv.session(database="neo4j") as s:
-        c = s.run("MATCH (n) RETURN count(n) AS c").single()["c"]
-        st.success(f"✅ Connected to Neo4j — {c} nodes found.")
-        rows = s.run("MATCH (p:Person)-[:CEO_OF]->(c:Company) RETURN p.name AS person, c.name AS company LIMIT 5").data()
-        if rows:
-            st.write("Sample CEO edges:")
-            for r in rows:
-                st.write(f"• {r['person']} → CEO_OF → {r['company']}")
-        else:
-            st.info("No CEO edges found.")
+    from services.graph import client
+
+    c = client.read("MATCH (n) RETURN count(n) AS c")[0]["c"]
+    st.success(f"✅ Connected to Neo4j — {c} nodes found.")
+    rows = client.read("MATCH (p:Person)-[:CEO_OF]->(c:Company) RETURN p.name AS person, c.name AS company LIMIT 5")
+    if rows:
+        st.write("Sample CEO edges:")
+        for r in rows:
+            st.write(f"• {r['person']} → CEO_OF → {r['company']}")
+    else:
+        st.info("No CEO edges found.")
+    st.caption(f"Pool: max {client.POOL_SIZE} connections, acquire timeout {client.ACQUIRE_TIMEOUT}s, "
+               f"query timeout {client.QUERY_TIMEOUT}s")
 except Exception as e:
     st.error(f"❌ Neo4j connection failed: {e}")
+
+# --- Graph snapshot ---
+st.subheader("Graph Snapshot (in-process)")
+try:
+    from services.graph.snapshot import get_snapshot
+    snap = get_snapshot()
+    if snap is None:
+        st.info("Snapshot disabled (GRAPH_SNAPSHOT=0).")
+    else:
+        stats = snap.stats()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Edges", stats["edges"])
+        c2.metric("Hits / Misses", f"{stats['hits']} / {stats['misses']}")
+        c3.metric("Hit rate", f"{stats['hit_rate']:.0%}")
+        st.caption(f"Relations: {', '.join(stats['relations'])} · version: {stats['version']}")
+except Exception as e:
+    st.error(f"❌ Graph snapshot unavailable: {e}")
+
+# --- OCR cache ---
+st.subheader("OCR Cache")
+try:
+    from services.tools.ocr_cache import get_ocr_cache
+    ocr = get_ocr_cache().stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Memory hits", ocr["memory_hits"])
+    c2.metric("Disk hits", ocr["disk_hits"])
+    c3.metric("Misses", ocr["misses"])
+    c4.metric("Hit rate", f"{ocr['hit_rate']:.0%}")
+    st.caption(f"{ocr['memory_entries']} in memory · {ocr['disk_entries']} on disk "
+               f"({ocr['disk_mb']:.2f} / {ocr['max_mb']:.0f} MB) · {ocr['evictions']} evicted")
+except Exception as e:
+    st.error(f"❌ OCR cache unavailable: {e}")
+
+# --- Answer cache ---
+st.subheader("Answer Cache (in-process)")
+try:
+    from services.agent.answer_cache import get_answer_cache
+    cache = get_answer_cache()
+    if cache is None:
+        st.info("Answer cache disabled (ANSWER_CACHE=0).")
+    else:
+        ac = cache.stats()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Entries", f"{ac['size']} / {ac['maxsize']}")
+        c2.metric("Hits / Misses", f"{ac['hits']} / {ac['misses']}")
+        c3.metric("Hit rate", f"{ac['hit_rate']:.0%}")
+        st.caption(f"TTL {ac['ttl_s']:.0f}s · {ac['invalidated']} dropped after an index / graph version change")
+except Exception as e:
+    st.error(f"❌ Answer cache unavailable: {e}")
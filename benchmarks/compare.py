@@ -0,0 +1,100 @@
+# benchmarks/compare.py
+"""
+Compare two benchmark result files and flag regressions.
+
+  python -m benchmarks.compare baseline.json current.json [--threshold 0.25]
+
+Rows are matched on their identity fields (suite, n_docs, k, expr, ...).
+Metrics ending in _s/_ms/_us/_mb are lower-is-better, *qps higher-is-better;
+a change beyond --threshold (relative) in the bad direction is a regression.
+Values under the per-unit noise floor are ignored and tail percentiles (p99)
+get twice the threshold. Exit code 1 on regression.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+ID_KEYS = ("n_docs", "k", "expr", "megapixels", "module")
+LOWER_BETTER = {"_s": 0.005, "_ms": 0.05, "_us": 2.0, "_mb": 2.0}     # suffix -> noise floor
+HIGHER_BETTER = ("qps",)
+TAIL = ("p99_ms",)
+THRESHOLD = 0.25
+
+
+def _direction(metric: str):
+    """(+1 lower is better | -1 higher is better | None not a metric, noise floor)."""
+    if metric.endswith(HIGHER_BETTER):
+        return -1, 0.0
+    for suffix, floor in LOWER_BETTER.items():
+        if metric.endswith(suffix) and not metric.startswith("rss_before"):
+            return 1, floor
+    return None, 0.0
+
+
+def flatten(node, path: str = "") -> Dict[str, float]:
+    """{"query.tfidf[n_docs=1000,k=4].p50_ms": 0.41, ...} for every numeric metric."""
+    out = {}
+    if isinstance(node, dict):
+        if "skipped" in node:
+            return out
+        for key, val in node.items():
+            if key == "meta":
+                continue
+            if isinstance(val, (int, float)) and not isinstance(val, bool):
+                out[f"{path}.{key}" if path else key] = float(val)
+            else:
+                out.update(flatten(val, f"{path}.{key}" if path else key))
+    elif isinstance(node, list):
+        for row in node:
+            if isinstance(row, dict):
+                ident = ",".join(f"{k}={row[k]}" for k in ID_KEYS if k in row)
+                out.update(flatten({k: v for k, v in row.items() if k not in ID_KEYS}, f"{path}[{ident}]"))
+    return out
+
+
+def compare(baseline: dict, current: dict, threshold: float = THRESHOLD) -> Tuple[List[dict], List[dict]]:
+    """(regressions, improvements), each [{"metric", "baseline", "current", "change"}]."""
+    base, cur = flatten(baseline), flatten(current)
+    regressions, improvements = [], []
+    for name in sorted(set(base) & set(cur)):
+        sign, floor = _direction(name.rsplit(".", 1)[-1])
+        b, c = base[name], cur[name]
+        if sign is None or not b or max(abs(b), abs(c)) < floor:
+            continue
+        change = (c - b) / abs(b)
+        limit = threshold * 2 if name.endswith(TAIL) else threshold
+        row = {"metric": name, "baseline": b, "current": c, "change": round(change, 4)}
+        if sign * change > limit:
+            regressions.append(row)
+        elif sign * change < -limit:
+            improvements.append(row)
+    return regressions, improvements
+
+
+def report(regressions: List[dict], improvements: List[dict]) -> str:
+    lines = []
+    for title, rows in (("REGRESSIONS", regressions), ("improvements", improvements)):
+        if rows:
+            lines.append(f"{title} ({len(rows)}):")
+            lines += [f"  {r['metric']}: {r['baseline']:g} -> {r['current']:g} ({r['change']:+.0%})" for r in rows]
+    return "\n".join(lines) or "no significant changes"
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("baseline")
+    ap.add_argument("current")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = ap.parse_args(argv)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions, improvements = compare(baseline, current, args.threshold)
+    print(report(regressions, improvements))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# benchmarks/corpus.py
+"""
+Synthetic corpora shaped like data/raw: short .txt files of one-fact
+sentences about companies, people, drugs and earnings, plus questions that
+hit them. Deterministic for a given (n_docs, seed).
+
+  python -m benchmarks.corpus out_dir 1000
+"""
+import os
+import random
+import sys
+from typing import List
+
+FIRST = ["Elon", "Tim", "Satya", "Sundar", "Lisa", "Mary", "Jensen", "Andy", "Susan", "Arvind",
+         "Ginni", "Safra", "Reed", "Brian", "Jane", "Marc", "Ruth", "Indra", "Pat", "Shantanu"]
+LAST = ["Musk", "Cook", "Nadella", "Pichai", "Su", "Barra", "Huang", "Jassy", "Wojcicki", "Krishna",
+        "Rometty", "Catz", "Hastings", "Chesky", "Fraser", "Benioff", "Porat", "Nooyi", "Gelsinger", "Narayen"]
+CO_A = ["Tesla", "Apple", "Nova", "Helio", "Quanta", "Vertex", "Orbit", "Lumen", "Cobalt", "Zenith",
+        "Atlas", "Pioneer", "Summit", "Beacon", "Harbor", "Crest", "Polar", "Silver", "Granite", "Aurora"]
+CO_B = ["Motors", "Systems", "Labs", "Energy", "Health", "Foods", "Networks", "Robotics", "Pharma", "Capital"]
+PRODUCTS = ["electric vehicles", "smartphones", "cloud software", "batteries", "solar panels", "chips",
+            "medical devices", "streaming services", "payment terminals", "wind turbines"]
+DRUGS = ["Ibuprofen", "Aspirin", "Metformin", "Acetaminophen", "Naproxen", "Warfarin", "Lisinopril",
+         "Atorvastatin", "Omeprazole", "Amoxicillin", "Sertraline", "Prednisone"]
+EFFECTS = ["nausea", "diarrhea", "stomach upset", "dizziness", "headache", "gastrointestinal bleeding",
+           "drowsiness", "rash", "fatigue", "dry mouth"]
+TOPICS = ["deliveries", "margin pressure", "energy storage growth", "pricing", "supply chain costs",
+          "subscription revenue", "capital expenditure", "guidance", "share buybacks", "headcount"]
+
+FACTS = [
+    "{person} is the CEO of {company}.",
+    "{company} manufactures {product}.",
+    "{company} trades as {ticker}.",
+    "In {year}, {company} reported revenue of ${amount}B, up {pct}% year over year.",
+    "In {year}, analysts on the {company} earnings call focused on {topic} and {topic2}.",
+    "{drug} can interact with {drug2}.",
+    "{drug} is a medication; common side effects include {effect} and {effect2}.",
+    "Taking {drug} with {drug2} may increase the risk of {effect}. Consult a clinician before combining.",
+]
+QUESTIONS = [
+    "Who is the CEO of {company}?",
+    "What does {company} manufacture?",
+    "What was {company} revenue in {year}?",
+    "Can {drug} interact with {drug2}?",
+    "What are the side effects of {drug}?",
+    "What did analysts discuss on the {company} earnings call?",
+]
+
+
+def _slots(rng: random.Random) -> dict:
+    company = f"{rng.choice(CO_A)} {rng.choice(CO_B)}"
+    d1, d2 = rng.sample(DRUGS, 2)
+    e1, e2 = rng.sample(EFFECTS, 2)
+    t1, t2 = rng.sample(TOPICS, 2)
+    return {
+        "person": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+        "company": company,
+        "ticker": "".join(w[0] for w in company.split()) + "".join(rng.choice("ABCDEFGHKLMNPRSTXZ") for _ in range(2)),
+        "product": rng.choice(PRODUCTS),
+        "year": rng.randint(2015, 2025),
+        "amount": round(rng.uniform(0.5, 400), 1),
+        "pct": rng.randint(1, 60),
+        "topic": t1, "topic2": t2,
+        "drug": d1, "drug2": d2,
+        "effect": e1, "effect2": e2,
+    }
+
+
+def make_doc(rng: random.Random, sentences: int) -> str:
+    slots = _slots(rng)     # one subject per file, like data/raw
+    lines = []
+    for _ in range(sentences):
+        if rng.random() < 0.3:
+            slots.update({k: v for k, v in _slots(rng).items() if k not in ("company", "drug")})
+        lines.append(rng.choice(FACTS).format(**slots))
+    return "\n".join(lines) + "\n"
+
+
+def make_corpus(out_dir: str, n_docs: int, sentences: int = 8, seed: int = 0) -> int:
+    """Write n_docs .txt files into out_dir; returns total bytes written."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    total = 0
+    for i in range(n_docs):
+        text = make_doc(rng, rng.randint(max(1, sentences // 2), sentences * 2))
+        with open(os.path.join(out_dir, f"doc_{i:06d}.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        total += len(text.encode("utf-8"))
+    return total
+
+
+def make_questions(n: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    return [rng.choice(QUESTIONS).format(**_slots(rng)) for _ in range(n)]
+
+
+if __name__ == "__main__":
+    out, n = sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    print(f"wrote {make_corpus(out, n)} bytes to {out}")
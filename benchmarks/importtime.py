@@ -0,0 +1,111 @@
+# benchmarks/importtime.py
+"""
+Import-time report: what each module costs to import, from `python -X importtime`
+in a fresh interpreter per entry point (best of --repeat runs).
+
+  python -m benchmarks.importtime                          # every ENTRYPOINTS module
+  python -m benchmarks.importtime services.api.server --top 30
+  python -m benchmarks.importtime --json > imports.json
+
+Per entry point it prints the total, the most expensive top-level packages
+(self time summed over all their submodules) and the slowest single modules.
+`python -m benchmarks.run --suites imports` records the totals for --compare.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+ENTRYPOINTS = [
+    "services.api.client",              # what the UI script imports
+    "services.api.server",
+    "services.agent.orchestrator",
+    "services.vector.query_tfidf",
+    "services.vector.query_embed",
+    "services.graph.graph_qa",
+    "services.tools.ocr",
+]
+LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+REPEAT = 3
+TOP = 15
+
+
+def _run(module: str) -> List[dict]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                       cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    if p.returncode != 0:
+        err = (p.stderr.strip().splitlines() or ["import failed"])[-1]
+        raise ImportError(err)
+    rows = []
+    for line in p.stderr.splitlines():
+        m = LINE_RE.match(line)
+        if m:
+            rows.append({"module": m.group(4), "self_us": int(m.group(1)), "cumulative_us": int(m.group(2)),
+                         "depth": len(m.group(3)) // 2})
+    return rows
+
+
+def measure(module: str, repeat: int = REPEAT, top: int = TOP) -> dict:
+    """{"module", "import_ms", "modules", "packages": [...], "slowest": [...]} or {"skipped": reason}."""
+    best = None
+    for _ in range(repeat):
+        try:
+            rows = _run(module)
+        except (ImportError, subprocess.TimeoutExpired) as e:
+            return {"module": module, "skipped": str(e)[:300]}
+        total = next((r["cumulative_us"] for r in rows if r["module"] == module), 0)
+        if best is None or total < best[0]:
+            best = (total, rows)
+    total, rows = best
+    packages: Dict[str, int] = defaultdict(int)
+    for r in rows:
+        packages[r["module"].split(".")[0]] += r["self_us"]
+    return {
+        "module": module,
+        "import_ms": round(total / 1000, 2),
+        "modules": len(rows),
+        "packages": [{"package": p, "self_ms": round(us / 1000, 2)}
+                     for p, us in sorted(packages.items(), key=lambda kv: -kv[1])[:top]],
+        "slowest": [{"module": r["module"], "self_ms": round(r["self_us"] / 1000, 2),
+                     "cumulative_ms": round(r["cumulative_us"] / 1000, 2)}
+                    for r in sorted(rows, key=lambda r: -r["self_us"])[:top]],
+    }
+
+
+def render(results: List[dict]) -> str:
+    out = []
+    for res in results:
+        if "skipped" in res:
+            out.append(f"{res['module']}: skipped ({res['skipped']})\n")
+            continue
+        out.append(f"{res['module']}: {res['import_ms']:.1f} ms, {res['modules']} modules")
+        out.append("  by package (self ms)")
+        out += [f"    {p['self_ms']:9.2f}  {p['package']}" for p in res["packages"]]
+        out.append("  slowest modules (self / cumulative ms)")
+        out += [f"    {m['self_ms']:9.2f} {m['cumulative_ms']:9.2f}  {m['module']}" for m in res["slowest"]]
+        out.append("")
+    return "\n".join(out)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("modules", nargs="*", default=ENTRYPOINTS, help="modules to import (default: ENTRYPOINTS)")
+    ap.add_argument("--repeat", type=int, default=REPEAT, help="fresh interpreters per module, best one kept")
+    ap.add_argument("--top", type=int, default=TOP, help="rows per table")
+    ap.add_argument("--json", action="store_true", help="print JSON instead of tables")
+    args = ap.parse_args(argv)
+    results = [measure(m, args.repeat, args.top) for m in args.modules]
+    print(json.dumps(results, indent=2) if args.json else render(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
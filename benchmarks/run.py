@@ -0,0 +1,245 @@
+# benchmarks/run.py
+"""
+Offline, CPU-only benchmark suite.
+
+  python -m benchmarks.run                                   # default sizes -> data/bench/bench_<ts>.json
+  python -m benchmarks.run --sizes 100,1000,10000 --ks 1,4,16 --suites tfidf,math
+  python -m benchmarks.run --out data/bench/baseline.json    # save a baseline
+  python -m benchmarks.run --compare data/bench/baseline.json   # exit 1 on regression
+
+Suites:
+  tfidf     ingest_tfidf build time / peak RSS / index size, query_vector latency
+            (p50/p95/p99, qps) and batched throughput, per corpus size and k
+  chroma    services/vector/ingest.py build (Chroma default ONNX embedder)
+  semantic  ingest_embed build, query_vector_semantic latency per size and k
+  hybrid    query_vector_hybrid latency (TF-IDF candidates re-scored with the
+            semantic build's cached embeddings); needs both builds
+  math      eval_math and parse_human_number, microseconds per call
+  ocr       extract_text on synthetic text images, ms per megapixel
+  imports   cold import time of each entry point (benchmarks/importtime.py)
+
+Corpora are generated from data/raw-like templates (benchmarks/corpus.py) into
+a scratch dir per size; builds and queries run in fresh child processes
+(benchmarks/worker.py) with HF_HUB_OFFLINE=1, so suites whose model or binary
+is not available locally are reported as {"skipped": reason}, never downloaded.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+from benchmarks.compare import THRESHOLD, compare, report
+from benchmarks.corpus import make_corpus, make_questions
+from benchmarks.importtime import ENTRYPOINTS, measure
+
+ROOT = Path(__file__).resolve().parents[1]
+OUT_DIR = os.path.join("data", "bench")
+SIZES = [100, 1000, 5000]
+KS = [1, 4, 16]
+SUITES = ["tfidf", "chroma", "semantic", "hybrid", "math", "ocr", "imports"]
+N_QUESTIONS = 200
+CHILD_TIMEOUT_S = 1800
+
+MATH_EXPRS = [
+    "100 - 20",
+    "97B + 20%",
+    "97B - 20%",
+    "12M + 3.5B",
+    "(1.5M * 12) / 4 + 250K",
+    "2 * (3 + 4) * (5 - 1) / 7",
+    "Who is the CEO of Tesla?",                 # non-math input: should be rejected fast
+    "What was Tesla revenue in 2024 and how did margins change?",
+]
+NUMBERS = ["97B", "$12.3M", "5k", "1,234,567", "3.14", "revenue was $97B in 2024", "no number here"]
+OCR_MEGAPIXELS = [0.25, 1.0, 4.0]
+
+
+def _child_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")])),
+        "TFIDF_INDEX_DIR": os.path.join(workdir, "data", "tfidf_index"),
+        "CHROMA_PATH": os.path.join(workdir, "data", "chroma"),
+        "EMBED_CACHE_PATH": os.path.join(workdir, "data", "cache", "embeddings.sqlite"),
+        "HF_HUB_OFFLINE": "1",
+        "TRANSFORMERS_OFFLINE": "1",
+        "TRACING": "0",
+    })
+    return env
+
+
+def _child(workdir: str, *argv) -> dict:
+    """Run benchmarks.worker in a fresh interpreter; {"skipped": reason} if it fails."""
+    try:
+        p = subprocess.run([sys.executable, "-m", "benchmarks.worker", *argv], cwd=workdir, env=_child_env(workdir),
+                           capture_output=True, text=True, timeout=CHILD_TIMEOUT_S)
+    except subprocess.TimeoutExpired:
+        return {"skipped": f"timeout after {CHILD_TIMEOUT_S}s"}
+    lines = p.stdout.strip().splitlines()
+    if p.returncode != 0 or not lines:
+        err = (p.stderr.strip().splitlines() or ["no output"])[-1]
+        return {"skipped": err[:300]}
+    return json.loads(lines[-1])
+
+
+def _progress(msg: str):
+    print(msg, file=sys.stderr, flush=True)
+
+
+# ---------------- retrieval ----------------
+def bench_retrieval(suites, sizes, ks, n_questions, keep: bool) -> dict:
+    builders = [s for s in ("tfidf", "chroma", "semantic") if s in suites or (s != "chroma" and "hybrid" in suites)]
+    ingest = {b: [] for b in builders}
+    query = {b: [] for b in builders if b != "chroma"}
+    if "hybrid" in suites:
+        query["hybrid"] = []
+    questions = list(dict.fromkeys(make_questions(n_questions * 2)))[:n_questions]
+    for n in sizes:
+        workdir = tempfile.mkdtemp(prefix=f"bench_{n}_")
+        try:
+            nbytes = make_corpus(os.path.join(workdir, "data", "raw"), n)
+            for b in builders:
+                _progress(f"[{b}] build {n} docs")
+                ingest[b].append({"n_docs": n, "corpus_mb": round(nbytes / 2 ** 20, 3), **_child(workdir, "build", b)})
+                if b in query and "skipped" not in ingest[b][-1]:
+                    _progress(f"[{b}] query {n} docs, k={ks}")
+                    res = _child(workdir, "query", b, json.dumps({"ks": ks, "questions": questions}))
+                    rows = res.get("rows") or [{"k": k, **res} for k in ks]
+                    query[b] += [{"n_docs": n, **r} for r in rows]
+            if "hybrid" in query and all("skipped" not in ingest[b][-1] for b in ("tfidf", "semantic")):
+                _progress(f"[hybrid] query {n} docs, k={ks}")
+                res = _child(workdir, "query", "hybrid", json.dumps({"ks": ks, "questions": questions}))
+                rows = res.get("rows") or [{"k": k, **res} for k in ks]
+                query["hybrid"] += [{"n_docs": n, **r} for r in rows]
+        finally:
+            if keep:
+                _progress(f"kept {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+    return {"ingest": ingest, "query": query}
+
+
+# ---------------- tools ----------------
+def _per_call_us(fn, arg) -> float:
+    number, took = timeit.Timer(lambda: fn(arg)).autorange()
+    best = min([took] + timeit.Timer(lambda: fn(arg)).repeat(repeat=2, number=number))
+    return round(best / number * 1e6, 3)
+
+
+def bench_math() -> dict:
+    from services.tools.math_eval import eval_math
+    from services.tools.num_parse import parse_human_number
+    return {
+        "eval_math": [{"expr": e, "per_call_us": _per_call_us(eval_math, e), "result": eval_math(e)}
+                      for e in MATH_EXPRS],
+        "parse_human_number": [{"expr": s, "per_call_us": _per_call_us(parse_human_number, s),
+                                "result": parse_human_number(s)} for s in NUMBERS],
+    }
+
+
+def _text_image(megapixels: float) -> bytes:
+    from PIL import Image, ImageDraw
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(megapixels * 1e6 / w)
+    img = Image.new("L", (w, h), 255)
+    draw = ImageDraw.Draw(img)
+    lines = make_questions(200, seed=7)
+    y, i = 10, 0
+    while y < h - 20:
+        draw.text((10, y), lines[i % len(lines)], fill=0)
+        y, i = y + 16, i + 1
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def bench_ocr(repeat: int = 3) -> dict:
+    try:
+        from services.tools.ocr import extract_text
+        extract_text(_text_image(0.05))
+    except Exception as e:
+        return {"skipped": f"{type(e).__name__}: {e}"[:300]}
+    rows = []
+    for mp in OCR_MEGAPIXELS:
+        data = _text_image(mp)
+        ms = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            text, _ = extract_text(data)
+            ms.append((time.perf_counter() - t0) * 1000)
+        best = min(ms)
+        rows.append({"megapixels": mp, "best_ms": round(best, 2), "per_megapixel_ms": round(best / mp, 2),
+                     "chars": len(text)})
+    return {"extract_text": rows}
+
+
+def _meta(args) -> dict:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True, timeout=10).stdout.strip()
+    except Exception:
+        rev = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_rev": rev,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": {"sizes": args.sizes, "ks": args.ks, "suites": args.suites, "questions": args.questions},
+    }
+
+
+def _ints(s: str) -> list:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=_ints, default=SIZES, help="corpus sizes in docs, e.g. 100,1000,10000")
+    ap.add_argument("--ks", type=_ints, default=KS, help="top-k values for query benchmarks")
+    ap.add_argument("--suites", type=lambda s: s.split(","), default=SUITES, help=",".join(SUITES))
+    ap.add_argument("--questions", type=int, default=N_QUESTIONS, help="queries per (size, k)")
+    ap.add_argument("--out", help="result path (default data/bench/bench_<timestamp>.json)")
+    ap.add_argument("--compare", metavar="BASELINE", help="compare against a saved result; exit 1 on regression")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD, help="relative change counted as regression")
+    ap.add_argument("--keep", action="store_true", help="keep the scratch corpora / indexes")
+    args = ap.parse_args(argv)
+
+    result = {"meta": _meta(args)}
+    result.update(bench_retrieval(args.suites, args.sizes, args.ks, args.questions, args.keep))
+    if "math" in args.suites:
+        _progress("[math]")
+        result["math"] = bench_math()
+    if "ocr" in args.suites:
+        _progress("[ocr]")
+        result["ocr"] = bench_ocr()
+    if "imports" in args.suites:
+        _progress("[imports]")
+        result["imports"] = [{k: v for k, v in measure(m).items() if k not in ("packages", "slowest")}
+                             for m in ENTRYPOINTS]
+
+    out = args.out or os.path.join(OUT_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2, default=str)
+    print(f"wrote {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions, improvements = compare(baseline, result, args.threshold)
+        print(report(regressions, improvements))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+# benchmarks/worker.py
+"""
+Child-process side of benchmarks.run. Each task runs in a fresh interpreter
+(cwd = a scratch dir holding data/raw) so module-level paths, caches and peak
+RSS belong to that task alone. Prints one JSON object on the last stdout line.
+
+  python -m benchmarks.worker build tfidf|chroma|semantic
+  python -m benchmarks.worker query tfidf|semantic|hybrid '{"ks": [1, 4], "questions": [...]}'
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+from statistics import mean
+
+try:
+    import resource
+except ImportError:     # not on Windows
+    resource = None
+
+BUILDERS = {
+    "tfidf": "services.vector.ingest_tfidf",
+    "chroma": "services.vector.ingest",
+    "semantic": "services.vector.ingest_embed",
+}
+WARMUP = 5
+BATCH_REPEAT = 3
+
+
+def rss_mb(who: str = "self") -> float:
+    if resource is None:
+        return 0.0
+    r = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    return r.ru_maxrss / 1024.0     # KiB on Linux
+
+
+def dir_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total / 2 ** 20
+
+
+def build(kind: str) -> dict:
+    import importlib
+    mod = importlib.import_module(BUILDERS[kind])
+    if kind == "semantic":      # paths are anchored at the repo, not cwd
+        from pathlib import Path
+        data = Path.cwd() / "data"
+        mod.RAW_DIR, mod.CHROMA_DIR = data / "raw", data / "chroma"
+        mod.MANIFEST_PATH = str(mod.CHROMA_DIR / f"manifest_{mod.COLLECTION_NAME}.json")
+    before = rss_mb()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        mod.main()
+    out = {
+        "build_s": round(time.perf_counter() - t0, 4),
+        "rss_before_mb": round(before, 1),
+        "peak_rss_mb": round(rss_mb(), 1),
+        "peak_rss_children_mb": round(rss_mb("children"), 1),
+        "index_mb": round(dir_mb("data/tfidf_index" if kind == "tfidf" else "data/chroma"), 2),
+    }
+    if kind == "tfidf":
+        from services.vector.tfidf_store import load_index
+        idx = load_index()
+        out["passages"] = int(idx.matrix.shape[0])
+        out["terms"] = int(idx.matrix.shape[1])
+    return out
+
+
+def _latency_row(k: int, lat_s: list) -> dict:
+    lat = sorted(lat_s)
+    pick = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))]   # noqa: E731
+    return {
+        "k": k,
+        "n_queries": len(lat),
+        "mean_ms": round(mean(lat) * 1000, 4),
+        "p50_ms": round(pick(0.5) * 1000, 4),
+        "p95_ms": round(pick(0.95) * 1000, 4),
+        "p99_ms": round(pick(0.99) * 1000, 4),
+        "qps": round(len(lat) / sum(lat), 1) if sum(lat) else None,
+    }
+
+
+def query(kind: str, args: dict) -> dict:
+    if kind == "tfidf":
+        from services.vector.query_tfidf import query_vector as fn, get_engine
+    elif kind == "hybrid":
+        from services.vector.query_hybrid import query_vector_hybrid as fn
+        err = fn(args["questions"][0], k=1, with_timing=True)[3]["error"]
+        if err:     # would silently time the TF-IDF fallback
+            raise RuntimeError(err)
+    else:
+        from services.vector.query_embed import query_vector_semantic as fn
+    questions, rows = args["questions"], []
+    for q in questions[:WARMUP]:
+        fn(q, k=max(args["ks"]))
+    for k in args["ks"]:
+        lat = []
+        for q in questions:
+            t0 = time.perf_counter()
+            fn(q, k=k)
+            lat.append(time.perf_counter() - t0)
+        row = _latency_row(k, lat)
+        if kind == "tfidf":     # whole question set as one sparse matmul, best of BATCH_REPEAT
+            took = []
+            for _ in range(BATCH_REPEAT):
+                t0 = time.perf_counter()
+                get_engine().query_batch(questions, k=k, collapse=True)
+                took.append(time.perf_counter() - t0)
+            row["batch_qps"] = round(len(questions) / min(took), 1)
+        rows.append(row)
+    return {"rows": rows, "peak_rss_mb": round(rss_mb(), 1)}
+
+
+def main(argv):
+    task, kind = argv[0], argv[1]
+    args = json.loads(argv[2]) if len(argv) > 2 else {}
+    out = build(kind) if task == "build" else query(kind, args)
+    print(json.dumps(out))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
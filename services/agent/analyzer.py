@@ -0,0 +1,189 @@
+# services/agent/analyzer.py
+"""
+Single-pass question analyzer shared by the planner, router, math and graph tools.
+
+analyze(q) lowercases the question once, runs one Aho-Corasick scan over it for
+every intent synonym and entity alias in lexicon.json, and one regex pass for
+numbers/years, and returns an immutable Features record. Results are memoised,
+so every consumer of the same question reuses the same record.
+"""
+import os
+import re
+import json
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from services.tools.num_parse import parse_human_number
+
+LEXICON_PATH = os.getenv("LEXICON_PATH", os.path.join(os.path.dirname(__file__), "lexicon.json"))
+
+YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+# looks like an arithmetic expression or contains a percent with a number
+MATH_HINT = re.compile(r'\d[\d\.\,\s]*([kmbtKMBT])?(\s*[+\-*/×÷^]\s*\d|\s*\%)')
+NUMBER_RE = re.compile(r"[$]?\d[\d,]*(?:\.\d+)?(?:\s*([kmbtKMBT])(?![A-Za-z]))?(\s*%)?")
+# canonical form: words / numbers (keeping "3.5", "1,000", "$", "%") and arithmetic operators
+TOKEN_RE = re.compile(r"[\w$%]+(?:[.,]\w+)*|[-+*/^×÷]")
+STOPWORDS = frozenset("a an the of is are was were be been to for in on at by with what who whom which how "
+                      "does do did please tell me about".split())
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton: every phrase occurrence in one left-to-right scan."""
+
+    def __init__(self, phrases: Dict[str, list]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, list]]] = [[]]
+        for phrase, payload in phrases.items():
+            node = 0
+            for ch in phrase:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((phrase, payload))
+        # BFS for failure links; outputs of the fail target are inherited
+        q = deque(self._goto[0].values())
+        while q:
+            node = q.popleft()
+            for ch, nxt in self._goto[node].items():
+                q.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def finditer(self, text: str) -> List[Tuple[int, int, str, list]]:
+        """(start, end, phrase, payload) for every occurrence, in order of end position."""
+        hits, node = [], 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for phrase, payload in out[node]:
+                hits.append((i + 1 - len(phrase), i + 1, phrase, payload))
+        return hits
+
+
+@dataclass(frozen=True)
+class NumberSpan:
+    start: int
+    end: int
+    text: str
+    value: Optional[float]
+    unit: str = ""          # K/M/B/T (upper-cased) or ""
+    percent: bool = False
+    year: bool = False
+
+
+@dataclass(frozen=True)
+class Features:
+    text: str
+    lower: str
+    intents: frozenset = frozenset()
+    terms: frozenset = frozenset()          # matched lexicon phrases, e.g. {"ceo", "who is"}
+    entities: Dict[str, Tuple[str, ...]] = field(default_factory=dict)   # kind -> canonical names, in order
+    years: Tuple[int, ...] = ()
+    numbers: Tuple[NumberSpan, ...] = ()
+    has_digits: bool = False
+    has_math: bool = False
+    canonical: str = ""                     # paraphrase-stable key, see _canonical()
+
+    def entity(self, kind: str) -> Optional[str]:
+        names = self.entities.get(kind)
+        return names[0] if names else None
+
+    def has(self, *intents: str) -> bool:
+        return any(i in self.intents for i in intents)
+
+
+class Analyzer:
+    def __init__(self, lexicon: dict):
+        self.lexicon = lexicon
+        self.graph_intents = frozenset(lexicon.get("graph_intents", []))
+        phrases: Dict[str, list] = {}
+        for intent, syns in lexicon.get("intents", {}).items():
+            for s in syns:
+                phrases.setdefault(s.lower(), []).append(("intent", intent))
+        for kind, names in lexicon.get("entities", {}).items():
+            for canon, aliases in names.items():
+                for a in aliases:
+                    phrases.setdefault(a.lower(), []).append((kind, canon))
+        self.matcher = PhraseMatcher(phrases)
+
+    def analyze(self, text: str) -> Features:
+        text = text or ""
+        lower = text.lower()
+        intents, terms = set(), set()
+        entities: Dict[str, List[str]] = {}
+        hits = sorted(self.matcher.finditer(lower))
+        for start, end, phrase, payload in hits:
+            terms.add(phrase)
+            for kind, label in payload:
+                if kind == "intent":
+                    intents.add(label)
+                elif label not in entities.setdefault(kind, []):
+                    entities[kind].append(label)
+
+        years = tuple(int(m.group(0)) for m in YEAR_RE.finditer(lower))
+        numbers = []
+        for m in NUMBER_RE.finditer(text):
+            raw = m.group(0)
+            unit, pct = (m.group(1) or "").upper(), bool(m.group(2))
+            core = raw.rstrip("% ").lstrip("$")
+            is_year = not unit and not pct and bool(YEAR_RE.fullmatch(core))
+            numbers.append(NumberSpan(m.start(), m.end(), raw, parse_human_number(core), unit, pct, is_year))
+
+        return Features(
+            text=text,
+            lower=lower,
+            intents=frozenset(intents),
+            terms=frozenset(terms),
+            entities={k: tuple(v) for k, v in entities.items()},
+            years=years,
+            numbers=tuple(numbers),
+            has_digits=bool(numbers),
+            has_math=bool(MATH_HINT.search(text)),
+            canonical=_canonical(lower, hits),
+        )
+
+
+def _canonical(lower: str, hits) -> str:
+    """
+    Lexicon labels (order-free) + leftover content tokens (in order), so
+    "Who is the CEO of Tesla?" and "tesla ceo" both give "#ceo @company:tesla".
+    Phrases made only of stopwords ("who", "who is") are interrogatives, not content.
+    """
+    labels, spans = set(), []
+    for start, end, phrase, payload in hits:
+        if all(w in STOPWORDS for w in phrase.split()):
+            continue
+        spans.append((start, end))
+        labels.update(f"#{label}" if kind == "intent" else f"@{kind}:{label}" for kind, label in payload)
+    rest = [m.group(0) for m in TOKEN_RE.finditer(lower)
+            if m.group(0) not in STOPWORDS and not any(s <= m.start() and m.end() <= e for s, e in spans)]
+    return " ".join(sorted(labels) + rest)
+
+
+def load_lexicon(path: str = LEXICON_PATH) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=1)
+def get_analyzer() -> Analyzer:
+    return Analyzer(load_lexicon())
+
+
+@lru_cache(maxsize=4096)
+def analyze(text: str) -> Features:
+    """Memoised per question text; the record is shared, don't mutate it."""
+    return get_analyzer().analyze(text)
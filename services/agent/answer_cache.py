@@ -0,0 +1,132 @@
+# services/agent/answer_cache.py
+"""
+End-to-end answer cache for the tool chain (planner -> fan-out -> combine).
+
+Key = (mode, k, canonical form of the rewritten question), the canonical form
+coming from the analyzer: "who is the ceo of tesla?", "Tesla CEO" and "who runs
+tesla" all key on "#ceo @company:tesla". Entries hold the answer, sources and
+deciding tool, expire after ANSWER_CACHE_TTL_S and are LRU-evicted beyond
+ANSWER_CACHE_ITEMS. Only answered questions are stored.
+
+Each entry also remembers the data versions it was computed against:
+
+  TF-IDF   CURRENT version of the index (services/vector/tfidf_store.py)
+  Chroma   mtime/size of the semantic ingest manifest (services/vector/ingest_embed.py)
+  graph    GraphMeta version polled by the graph snapshot (services/graph/snapshot.py)
+
+and a lookup whose versions differ from the current ones is a miss. Without a
+GraphMeta node (or with GRAPH_SNAPSHOT=0) graph edits only show up after the TTL.
+
+The orchestrator logs hits with decision "cache" (won_by = the original tool),
+which the bandit / contextual router ignore. ANSWER_CACHE=0 disables it.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from services.agent.analyzer import analyze
+from services.common.lru import LRUCache
+
+ENABLED = os.getenv("ANSWER_CACHE", "1").lower() in ("1", "true", "yes")
+TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "600"))
+MAX_ITEMS = int(os.getenv("ANSWER_CACHE_ITEMS", "2048"))
+
+
+@dataclass(frozen=True)
+class CachedAnswer:
+    answer: object
+    sources: Tuple[str, ...]
+    won_by: str
+    decision: str
+    router: str
+    tasks: Tuple[str, ...]
+    versions: tuple
+    created: float
+
+
+def _file_sig(path: str):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+def data_versions() -> tuple:
+    """(TF-IDF version, Chroma manifest signature, graph version); cheap enough to read per lookup."""
+    from services.graph.snapshot import peek_snapshot
+    from services.vector.query_embed import CHROMA_PATH, COLLECTION_NAME
+    from services.vector.tfidf_store import INDEX_DIR, current_version
+    snap = peek_snapshot()
+    return (
+        current_version(INDEX_DIR),
+        _file_sig(os.path.join(CHROMA_PATH, f"manifest_{COLLECTION_NAME}.json")),
+        snap.version if snap is not None else None,
+    )
+
+
+class AnswerCache:
+    def __init__(self, maxsize: int = MAX_ITEMS, ttl: float = TTL_S):
+        self.lru = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    @staticmethod
+    def key(q2: str, mode: str, k: int) -> tuple:
+        return mode, int(k), analyze(q2).canonical
+
+    def get(self, q2: str, mode: str, k: int, versions: Optional[tuple] = None) -> Optional[CachedAnswer]:
+        """Fresh entry or None; pass the data_versions() read before running the tools to put() as well."""
+        key = self.key(q2, mode, k)
+        entry = self.lru.get(key)
+        if entry is not None and entry.versions != (versions if versions is not None else data_versions()):
+            self.lru.pop(key)
+            self.invalidated += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, q2: str, mode: str, k: int, answer, sources, won_by: str, decision: str,
+            router: str = "", tasks=(), versions: Optional[tuple] = None):
+        if versions is None:
+            versions = data_versions()
+        self.lru.put(self.key(q2, mode, k), CachedAnswer(
+            answer, tuple(sources or ()), won_by or "", decision, router, tuple(tasks), versions, time.time()
+        ))
+
+    def clear(self):
+        self.lru.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.lru),
+            "maxsize": self.lru.maxsize,
+            "ttl_s": self.lru.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Process-wide cache; None when ANSWER_CACHE=0."""
+    global _cache
+    if not ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
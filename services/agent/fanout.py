@@ -0,0 +1,204 @@
+# services/agent/fanout.py
+"""
+Concurrent, deadline-bounded tool fan-out.
+
+All candidate tools start at once on a shared thread pool (graph calls on
+their own bounded pool, so Neo4j stragglers can't queue vector search behind
+them). The answer of the
+highest-priority tool (position in `tools`) wins as soon as every tool ahead
+of it has come back empty, so a slow or empty graph call no longer delays
+vector search. At the deadline the best usable answer so far wins; queued
+stragglers are cancelled and running ones are ignored. Tools can read the
+time left with remaining_s(); the graph adapter hands it to the Neo4j read so
+a straggler gives up instead of holding its worker.
+
+`launch=n` starts only the first n tools; the rest are fallbacks started once
+everything launched so far has come back without an answer.
+
+Each tool call is a tracing span `tool.<name>`; tools run in a copy of the
+caller's context so their spans (and nested ones, e.g. neo4j.read) join the
+request's trace.
+"""
+import os
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.common.tracing import span
+
+DEADLINE_MS = int(os.getenv("FANOUT_DEADLINE_MS", "3000"))
+# every question in flight (server: ORCH_MAX_CONCURRENCY) can run all its local tools at once
+MAX_WORKERS = int(os.getenv("FANOUT_WORKERS", str(4 * int(os.getenv("ORCH_MAX_CONCURRENCY", "16")))))
+GRAPH_WORKERS = int(os.getenv("FANOUT_GRAPH_WORKERS", "8"))
+SNIPPET_CHARS = 800
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_pool_lock = threading.Lock()
+_deadline: contextvars.ContextVar = contextvars.ContextVar("fanout_deadline", default=None)
+
+
+def _get_pool(tool: str) -> ThreadPoolExecutor:
+    """Graph calls get their own bounded pool; every other tool shares one."""
+    key = "graph" if tool == "graph" else "tool"
+    pool = _pools.get(key)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ThreadPoolExecutor(max_workers=GRAPH_WORKERS if key == "graph" else MAX_WORKERS,
+                                          thread_name_prefix=key)
+                _pools[key] = pool
+    return pool
+
+
+def remaining_s() -> Optional[float]:
+    """Seconds left before the current fan-out's deadline (None outside a fan-out)."""
+    d = _deadline.get()
+    return None if d is None else d - perf_counter()
+
+
+def _snippet(text: str) -> str:
+    return text[:SNIPPET_CHARS] + ("..." if len(text) > SNIPPET_CHARS else "")
+
+
+# ---- tool adapters: (question, k) -> (answer or None, sources) ----
+def _math(q: str, k: int):
+    from services.agent.analyzer import analyze
+    from services.tools.math_eval import eval_math
+    if not analyze(q).has_math:         # same gate as the UI fast path
+        return None, []
+    return eval_math(q), []
+
+def _graph(q: str, k: int):
+    from services.graph.graph_qa import query_graph
+    ans, sources = query_graph(q, timeout=remaining_s())
+    return (ans if ans and str(ans).strip() else None), (sources or [])
+
+def _vector(q: str, k: int):
+    from services.vector.query_tfidf import query_vector
+    docs, metas, ids, _ = query_vector(q, k=k)
+    if docs and str(docs[0]).strip():
+        return _snippet(docs[0]), [m.get("source_file", "") for m in metas]
+    return None, []
+
+def _vector_semantic(q: str, k: int):
+    from services.vector.query_embed import query_vector_semantic
+    docs, metas, ids, _ = query_vector_semantic(q, k=k)
+    if docs and str(docs[0]).strip():
+        return _snippet(docs[0]), [(m or {}).get("source_file", "") for m in metas]
+    return None, []
+
+def _vector_hybrid(q: str, k: int):
+    from services.vector.query_hybrid import query_vector_hybrid
+    docs, metas, ids, _ = query_vector_hybrid(q, k=k)
+    if docs and str(docs[0]).strip():
+        return _snippet(docs[0]), [m.get("source_file", "") for m in metas]
+    return None, []
+
+TOOLS: Dict[str, Callable[[str, int], Tuple[object, List[str]]]] = {
+    "math": _math,
+    "graph": _graph,
+    "vector": _vector,
+    "vector_semantic": _vector_semantic,
+    "vector_hybrid": _vector_hybrid,
+}
+
+
+class FanoutResult:
+    def __init__(self):
+        self.answer = None
+        self.won_by: Optional[str] = None
+        self.sources: List[str] = []
+        self.partials: Dict[str, object] = {}     # tool -> usable answer (finished before return)
+        self.timings: Dict[str, int] = {}         # tool -> ms (finished tools only)
+        self.status: Dict[str, str] = {}          # tool -> ok | empty | error | timeout | cancelled | skipped
+        self.errors: Dict[str, str] = {}
+        self.elapsed_ms = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "won_by": self.won_by,
+            "timings_ms": self.timings,
+            "status": self.status,
+            "elapsed_ms": self.elapsed_ms,
+        }
+
+
+def _timed(name, q, k, deadline):
+    t0 = perf_counter()
+    _deadline.set(deadline)     # this call runs in its own context copy
+    try:
+        with span(f"tool.{name}"):
+            ans, sources = TOOLS[name](q, k)
+        return ans, sources, None, int((perf_counter() - t0) * 1000)
+    except Exception as e:
+        return None, [], f"{type(e).__name__}: {e}", int((perf_counter() - t0) * 1000)
+
+
+def _submit(name: str, q: str, k: int, deadline: float):
+    return _get_pool(name).submit(contextvars.copy_context().run, _timed, name, q, k, deadline)
+
+
+def fan_out(question: str, tools: List[str], k: int = 4, deadline_ms: int = DEADLINE_MS,
+            launch: Optional[int] = None) -> FanoutResult:
+    """Run `tools` concurrently; earlier entries have higher priority."""
+    t0 = perf_counter()
+    res = FanoutResult()
+    tools = [t for t in dict.fromkeys(tools) if t in TOOLS]
+    launch = len(tools) if launch is None else max(1, launch)
+    deadline = t0 + deadline_ms / 1000.0
+    futures = {_submit(t, question, k, deadline): t for t in tools[:launch]}
+    fallbacks = tools[launch:]
+    done_by_tool: Dict[str, bool] = {}
+
+    def decided() -> Optional[str]:
+        # first tool in priority order that answered, with everything ahead of it finished
+        for t in tools:
+            if t in res.partials:
+                return t
+            if not done_by_tool.get(t):
+                return None
+        return None
+
+    pending = set(futures)
+    winner = None
+    while pending:
+        timeout = deadline - perf_counter()
+        if timeout <= 0:
+            break
+        finished, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for fut in finished:
+            t = futures[fut]
+            ans, sources, err, ms = fut.result()
+            done_by_tool[t] = True
+            res.timings[t] = ms
+            if err:
+                res.status[t], res.errors[t] = "error", err
+            elif ans is None:
+                res.status[t] = "empty"
+            else:
+                res.status[t] = "ok"
+                res.partials[t] = (ans, sources)
+        winner = decided()
+        if winner:
+            break
+        if not pending and fallbacks:       # everything launched came back empty
+            more = {_submit(t, question, k, deadline): t for t in fallbacks}
+            futures.update(more)
+            pending, fallbacks = set(more), []
+
+    for fut in pending:
+        res.status[futures[fut]] = "cancelled" if fut.cancel() else "timeout"
+    for t in fallbacks:
+        res.status[t] = "skipped"
+
+    if winner is None:       # deadline hit: best finished answer by priority
+        winner = next((t for t in tools if t in res.partials), None)
+    if winner:
+        res.won_by = winner
+        res.answer, res.sources = res.partials[winner]
+    res.partials = {t: a for t, (a, _) in res.partials.items()}
+    res.elapsed_ms = int((perf_counter() - t0) * 1000)
+    return res
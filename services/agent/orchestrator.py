@@ -0,0 +1,249 @@
+# services/agent/orchestrator.py
+"""
+Headless answer pipeline (previously inline in apps/ui/app.py):
+
+  rewrite_question -> fact lookup -> math fast path -> answer cache -> planner
+  (+ router policy) -> tool fan-out -> combine_answers -> log_route + policy update
+
+The fact lookup (services/tools/facts.py) answers known figures, and
+arithmetic over them, from the ingest-time fact table with no retrieval.
+Repeated / paraphrased questions are served from the answer cache
+(services/agent/answer_cache.py) and logged as decision "cache", which the
+router policy does not learn from.
+
+The router policy is the epsilon-greedy bandit by default, or the contextual
+LinUCB / Thompson router with ROUTER_POLICY=linucb|thompson.
+
+Each answer() is one trace (services/common/tracing.py) with a span per stage;
+the trace id goes into the route log and the result dict.
+
+One Orchestrator per process; answer() is thread-safe and returns a plain
+dict, so the HTTP service (services/api/server.py), batch jobs and the
+Streamlit client all share it.
+"""
+import dataclasses
+import datetime
+import threading
+from pathlib import Path
+from time import perf_counter
+from typing import Optional
+
+from services.agent.analyzer import analyze
+from services.agent.answer_cache import data_versions, get_answer_cache
+from services.agent.fanout import fan_out
+from services.agent.planner import NO_ANSWER, decide_tasks, rewrite_question, combine_answers
+from services.common.tracing import span, trace, trace_spans
+from services.router.contextual import ContextualRouter, load_router_policy
+from services.router.log_backend import LogSchema, get_writer
+from services.router.logger import log_route
+from services.tools.facts import answer_from_facts, names_figure
+from services.tools.math_eval import eval_math
+
+ROOT = Path(__file__).resolve().parents[2]   # -> /app inside the container
+EVENT_LOG = ROOT / "data" / "logs" / "app_events.log"
+EVENT_SCHEMA = LogSchema("app_events", [("timestamp", "datetime"), ("question", "str"), ("mode", "str")],
+                         fmt="jsonl", ts_field="timestamp")
+
+# UI labels and API names both accepted
+MODES = {
+    "Vector (TF-IDF)": "vector",
+    "Vector (Semantic)": "vector_semantic",
+    "Vector (Hybrid)": "vector_hybrid",
+    "Graph (Neo4j)": "graph",
+    "Auto (Router)": "auto",
+}
+
+
+def log_event(question, mode):
+    """Enqueue only; the log backend's flush thread writes and rotates the file."""
+    get_writer(str(EVENT_LOG), EVENT_SCHEMA).enqueue({
+        "timestamp": datetime.datetime.now().isoformat(),
+        "question": question,
+        "mode": mode,
+    })
+
+
+def merge_query(question: str, ocr_text: str = "") -> str:
+    """Typed text + OCR text (if present) -> one query."""
+    if question and ocr_text:
+        return f"{question}\n\n[Image OCR]: {ocr_text}"
+    return ocr_text or question or ""
+
+
+class Orchestrator:
+    def __init__(self, policy=None):
+        # warm-start the router policy from existing logs once per process
+        self.policy = policy or load_router_policy()
+        self._policy_lock = threading.Lock()
+
+    def _learn(self, q2: str, decision: str, had_answer: int, latency_ms: int, row_id=None):
+        # exactly the logged row, so online updates and a replay of the log fit the same model
+        try:
+            with self._policy_lock:
+                self.policy.observe(q2, decision, had_answer, latency_ms, row_id=row_id)
+        except Exception:
+            pass
+
+    def plan(self, q2: str, mode: str):
+        """Return (tasks, router caption, tools to launch at once) for a rewritten question."""
+        mode = MODES.get(mode, mode)
+        if mode == "vector":
+            return ["vector"], "VECTOR (manual)", None
+        if mode == "vector_semantic":
+            return ["vector_semantic"], "SEMANTIC (manual)", None
+        if mode == "vector_hybrid":
+            return ["vector_hybrid"], "HYBRID (manual)", None
+        if mode == "graph":
+            return ["graph"], "GRAPH (manual)", None
+
+        # Auto: planner decides viable tools; the policy picks which goes first
+        with span("planner"):
+            planner_tasks = decide_tasks(q2)
+        if len(planner_tasks) <= 1:
+            return planner_tasks, "AGENT (planner)", None
+        if isinstance(self.policy, ContextualRouter):
+            candidates = planner_tasks + [t for t in ["vector_semantic", "vector_hybrid"] if t not in planner_tasks]
+            with self._policy_lock, span("policy.select"):
+                tasks, n_parallel = self.policy.choose(q2, candidates)
+            return tasks, f"AGENT (contextual {self.policy.mode} → {' + '.join(tasks[:n_parallel])})", n_parallel
+        with self._policy_lock, span("policy.select"):
+            chosen = self.policy.select(q2)
+        if chosen == "vector":      # the bandit's lexical arm runs whichever lexical tool the planner uses
+            lexical = next((t for t in planner_tasks if t.startswith("vector")), "vector")
+            tasks = [lexical] + [t for t in planner_tasks if not t.startswith("vector")]
+        else:
+            tasks = [chosen] + [t for t in planner_tasks if t != chosen]
+        return tasks, f"AGENT (bandit + planner → {chosen})", None
+
+    def answer(self, question: str, mode: str = "auto", k: int = 4, ocr_text: str = "") -> dict:
+        base_query = merge_query(question, ocr_text)
+        if not base_query.strip():
+            return {"answer": None, "had_answer": 0, "error": "empty question"}
+        with trace("answer") as trace_id:
+            out = self._answer(base_query, mode, k)
+            out["trace_id"] = trace_id
+            out["spans"] = trace_spans()
+        return out
+
+    def _answer(self, base_query: str, mode: str, k: int) -> dict:
+        log_event(base_query, mode)
+        t0 = perf_counter()
+        with span("rewrite"):
+            q2 = rewrite_question(base_query)
+        with span("analyze"):
+            features = analyze(q2)   # one scan, shared with planner / graph / math
+
+        # --- FAST PATH: known figures (and math over them) from the fact table ---
+        with span("facts"):
+            hit = answer_from_facts(q2)
+        if hit is not None:
+            latency_ms = int((perf_counter() - t0) * 1000)
+            with span("log"):
+                log_route(base_query, "facts", 1, latency_ms, rewritten=q2, won_by="facts")
+            return {
+                "question": base_query, "rewritten": q2, "answer": hit["answer"], "had_answer": 1,
+                "decision": "facts", "won_by": "facts", "router": "FAST PATH (facts)",
+                "tasks": ["facts"], "sources": sorted({f.source_file for f in hit["facts"]}),
+                "facts": [dataclasses.asdict(f) for f in hit["facts"]], "expression": hit["expression"],
+                "latency_ms": latency_ms, "fanout": None,
+            }
+
+        # --- FAST PATH: pure math gets answered immediately ---
+        # (a figure the fact table couldn't resolve is not arithmetic over its year)
+        if features.has_math and not names_figure(q2):
+            with span("math.fast_path"):
+                res = eval_math(q2)
+            if res is not None:
+                latency_ms = int((perf_counter() - t0) * 1000)
+                with span("log"):
+                    row_id = log_route(base_query, "math", 1, latency_ms, rewritten=q2, won_by="math")
+                    self._learn(q2, "math", 1, latency_ms, row_id)
+                return {
+                    "question": base_query, "rewritten": q2, "answer": res, "had_answer": 1,
+                    "decision": "math", "won_by": "math", "router": "FAST PATH (math)",
+                    "tasks": ["math"], "sources": [], "latency_ms": latency_ms, "fanout": None,
+                }
+
+        # --- answer cache: same canonical question, same mode / k, unchanged indexes ---
+        mode = MODES.get(mode, mode)
+        cache, versions = get_answer_cache(), None
+        if cache is not None:
+            with span("answer_cache"):
+                versions = data_versions()
+                cached = cache.get(q2, mode, k, versions)
+            if cached is not None:
+                latency_ms = int((perf_counter() - t0) * 1000)
+                with span("log"):
+                    log_route(base_query, "cache", 1, latency_ms, rewritten=q2, won_by=cached.won_by)
+                return {
+                    "question": base_query, "rewritten": q2, "answer": cached.answer, "had_answer": 1,
+                    "decision": "cache", "won_by": cached.won_by, "router": f"CACHE ({cached.router})",
+                    "tasks": list(cached.tasks), "sources": list(cached.sources), "cached": True,
+                    "latency_ms": latency_ms, "fanout": None,
+                }
+
+        with span("plan"):
+            tasks, router_caption, launch = self.plan(q2, mode)
+
+        # Launch the candidate tools at once (or the policy's pick first); the
+        # highest-priority usable answer wins
+        with span("fanout"):
+            fan = fan_out(q2, tasks, k=k, launch=launch)
+        decision_used = fan.won_by
+        final_answer = fan.answer  # can be str OR number
+        graph_ans = fan.partials.get("graph")
+        vector_ans = (fan.partials.get("vector") or fan.partials.get("vector_hybrid")
+                      or fan.partials.get("vector_semantic"))
+
+        # OPTIONAL: append math result when graph answered
+        if decision_used == "graph" and features.has_math:
+            math_extra = eval_math(q2)
+            if math_extra is not None:
+                final_answer = (final_answer or "") + f"\n{math_extra}"
+
+        # If nothing answered yet but we have partials, try to combine (optional)
+        if final_answer is None:
+            with span("combine"):
+                final_answer = combine_answers(graph_ans, vector_ans)
+
+        latency_ms = int((perf_counter() - t0) * 1000)
+        if isinstance(final_answer, str):
+            has_answer = bool(final_answer.strip()) and final_answer != NO_ANSWER
+        else:
+            has_answer = final_answer is not None
+
+        decision_to_log = decision_used or ("graph" if tasks == ["graph"] else "vector")
+        with span("log"):
+            row_id = log_route(base_query, decision_to_log, int(has_answer), latency_ms, rewritten=q2,
+                               won_by=fan.won_by, tool_ms=fan.timings)
+            self._learn(q2, decision_to_log, int(has_answer), latency_ms, row_id)
+        if cache is not None and has_answer and fan.won_by is not None:     # only what a tool answered
+            cache.put(q2, mode, k, final_answer, fan.sources, fan.won_by, decision_to_log,
+                      router=router_caption, tasks=tasks, versions=versions)
+
+        return {
+            "question": base_query,
+            "rewritten": q2,
+            "answer": final_answer,
+            "had_answer": int(has_answer),
+            "decision": decision_to_log,
+            "won_by": fan.won_by,
+            "router": router_caption,
+            "tasks": tasks,
+            "sources": fan.sources,
+            "latency_ms": latency_ms,
+            "fanout": fan.as_dict(),
+        }
+
+
+_orchestrator: Optional[Orchestrator] = None
+_lock = threading.Lock()
+
+
+def get_orchestrator() -> Orchestrator:
+    global _orchestrator
+    if _orchestrator is None:
+        with _lock:
+            if _orchestrator is None:
+                _orchestrator = Orchestrator()
+    return _orchestrator
@@ -1,35 +1,11 @@
-import re
+import os
 
-# looks like an arithmetic expression or contains a percent with a number
-MATH_HINT = re.compile(r'\d[\d\.\,\s]*([kmbtKMBT])?(\s*[+\-*/×÷]\s*\d|\s*\%)')
+from services.agent.analyzer import analyze, get_analyzer, MATH_HINT, YEAR_RE  # noqa: F401 (re-exported)
 
-def decide_tasks(q: str) -> list[str]:
-    ql = q.lower()
-
-    # 1) math-first when we spot arithmetic or % patterns
-    if MATH_HINT.search(q):
-        return ["math", "graph", "vector"]
-
-    # 2) graph-y questions
-    if any(x in ql for x in ["ceo", "who is", "side effect", "interact", "revenue"]):
-        return ["graph", "vector"]
-
-    # 3) fallback: vector
-    return ["vector"]
-
-YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
-
-# Simple dictionaries for intent hints
-CEO_SYNS = ["ceo", "chief executive", "who runs", "head of"]
-REV_SYNS = ["revenue", "sales", "turnover", "top line", "income"]
-SIDE_SYNS = ["side effect", "adverse effect", "nausea", "diarrhea", "stomach upset"]
-INTERACT_SYNS = ["interact", "interaction", "contraindication", "safe with"]
-COMPANY_HINTS = ["tesla"]          # add more as needed
-DRUG_HINTS    = ["metformin", "ibuprofen", "aspirin"]
-
-def _contains_any(q: str, terms: list[str]) -> bool:
-    ql = q.lower()
-    return any(t in ql for t in terms)
+# Lexical retriever in the planner's plans: "vector" (TF-IDF) or "vector_hybrid"
+# (TF-IDF candidates re-scored with embeddings, services/vector/query_hybrid.py)
+VECTOR_TOOL = os.getenv("PLANNER_VECTOR_TOOL", "vector")
+NO_ANSWER = "No answer found."      # combine_answers() with nothing to combine; not an answer
 
 def rewrite_question(q: str) -> str:
     """
@@ -38,58 +14,57 @@ def rewrite_question(q: str) -> str:
       - "Tesla 2024"         -> "Tesla revenue 2024"
       - "who runs tesla"     -> "tesla ceo"
       - "metformin and aspirin" -> "does ibuprofen interact with aspirin?" (handled if you expand)
+    All checks read the analyzer's feature record for the original question.
     """
     q2 = (q or "").strip()
-    ql = q2.lower()
+    f = analyze(q2)
 
     # Company + Year -> assume they want revenue for that year
-    if _contains_any(ql, COMPANY_HINTS) and YEAR_RE.search(ql) and not _contains_any(ql, REV_SYNS):
+    if f.entity("company") and f.years and not f.has("revenue"):
         q2 = q2 + " revenue"
 
-    # CEO phrasing
-    if any(s in ql for s in CEO_SYNS) and not _contains_any(ql, ["ceo"]):
-        # normalize to "<company> ceo"
-        for c in COMPANY_HINTS:
-            if c in ql:
-                q2 = f"{c} ceo"
-                break
+    # CEO phrasing -> normalize to "<company> ceo"
+    if f.has("ceo") and "ceo" not in f.terms and f.entity("company"):
+        q2 = f"{f.entity('company')} ceo"
 
-    # Side-effect phrasing
-    if _contains_any(ql, DRUG_HINTS) and _contains_any(ql, ["side effects"]) is False:
-        # if it mentions a known drug + a known side-effect synonym, hint with "side effects"
-        if _contains_any(ql, SIDE_SYNS):
-            for d in DRUG_HINTS:
-                if d in ql:
-                    q2 = f"{d} side effects"
-                    break
+    # Side-effect phrasing: known drug + a known side-effect synonym -> hint with "side effects"
+    if f.entity("drug") and "side effects" not in f.terms and f.has("side_effect"):
+        q2 = f"{f.entity('drug')} side effects"
 
     # Drug-drug interaction hint (very light)
-    if "ibuprofen" in ql and "aspirin" in ql and not _contains_any(ql, INTERACT_SYNS):
+    drugs = f.entities.get("drug", ())
+    if "ibuprofen" in drugs and "aspirin" in drugs and not f.has("interaction"):
         q2 = "does ibuprofen interact with aspirin?"
 
     return q2
 
-from services.router.rl_policy import prefer_order  # if you added learning
-
 def decide_tasks(question: str) -> list[str]:
     """
     Deterministic, simple routing:
-    - If it looks numeric (% or K/M/B/T with digits): math → graph → vector
+    - If it looks like arithmetic (number op number, or a percent): math → graph → vector
     - If it looks like a structured fact: graph → vector → math
     - Else: vector → graph → math
     """
-    ql = (question or "").lower()
+    f = analyze(question or "")
 
-    # math-first: any digit + (% OR K/M/B/T suffix)
-    if any(ch.isdigit() for ch in ql) and ("%" in ql or any(s in ql for s in ["k","m","b","t"])):
-        return ["math", "graph", "vector"]
+    if f.has_math:
+        return ["math", "graph", VECTOR_TOOL]
 
-    # graphy hints (expand as you like)
-    if any(x in ql for x in ["ceo", "who is", "side effect", "interact", "revenue", "earnings"]):
-        return ["graph", "vector", "math"]
+    if f.intents & get_analyzer().graph_intents:
+        return ["graph", VECTOR_TOOL, "math"]
 
     # default: vector first
-    return ["vector", "graph", "math"]
+    return [VECTOR_TOOL, "graph", "math"]
+
+def auto_route_order(question: str) -> list[str]:
+    """Coarse tool order for the UI's auto mode (graph-ish / image-ish / default)."""
+    f = analyze(question or "")
+    if f.has("who", "ceo", "interaction", "relation"):
+        return ["graph", "vector_semantic"]
+    if f.has("image"):
+        return ["ocr", "vector_semantic"]
+    return ["vector_semantic", "graph"]
+
 def combine_answers(graph_ans: str|None, vector_ans: str|None) -> str:
     """
     Prefer graph (facts). If vector adds new info not contained in graph,
@@ -99,4 +74,4 @@ def combine_answers(graph_ans: str|None, vector_ans: str|None) -> str:
     v = (vector_ans or "").strip()
     if g and v and v.lower() not in g.lower():
         return f"{g}\n\n(Additional context)\n{v}"
-    return g or v or "No answer found."
\ No newline at end of file
+    return g or v or NO_ANSWER
@@ -0,0 +1,39 @@
+# services/api/client.py
+"""
+Thin client for the orchestrator service. With ORCHESTRATOR_URL set, questions
+go over HTTP; otherwise they are answered by an in-process Orchestrator (handy
+for `streamlit run` without the service).
+"""
+import os
+import json
+import urllib.request
+from typing import List
+
+ORCHESTRATOR_URL = os.getenv("ORCHESTRATOR_URL", "").rstrip("/")
+TIMEOUT_S = float(os.getenv("ORCHESTRATOR_TIMEOUT", "30"))
+
+
+def _post(path: str, payload: dict) -> dict:
+    req = urllib.request.Request(
+        ORCHESTRATOR_URL + path,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=TIMEOUT_S) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def ask(question: str, mode: str = "auto", k: int = 4, ocr_text: str = "") -> dict:
+    if ORCHESTRATOR_URL:
+        return _post("/ask", {"question": question, "mode": mode, "k": k, "ocr_text": ocr_text})
+    from services.agent.orchestrator import get_orchestrator
+    return get_orchestrator().answer(question, mode, k, ocr_text)
+
+
+def ask_batch(questions: List[str], mode: str = "auto", k: int = 4) -> List[dict]:
+    if ORCHESTRATOR_URL:
+        return _post("/ask_batch", {"questions": questions, "mode": mode, "k": k})["results"]
+    from services.agent.orchestrator import get_orchestrator
+    orch = get_orchestrator()
+    return [orch.answer(q, mode, k) for q in questions]
@@ -0,0 +1,119 @@
+# services/api/server.py
+"""
+Asyncio HTTP front for the orchestrator.
+
+  POST /ask        {"question": "...", "mode": "auto", "k": 4, "ocr_text": ""}
+  POST /ask_batch  {"questions": ["...", ...], "mode": "auto", "k": 4}
+  GET  /healthz    {"ok", "warm"}: up as soon as the app imports; warm once the orchestrator is built
+  GET  /metrics    per-stage span histograms, Prometheus text format
+
+Run:  python -m services.api.server      (ORCH_HOST / ORCH_PORT, default 0.0.0.0:8000)
+
+answer() is blocking (tools, Neo4j, Chroma), so requests run on a bounded
+worker pool; ORCH_MAX_CONCURRENCY caps questions in flight across all requests
+and ORCH_MAX_BATCH caps a single batch.
+"""
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+load_dotenv()
+
+from services.agent.orchestrator import get_orchestrator  # noqa: E402  (after .env is loaded)
+from services.common.tracing import REGISTRY, start_exporter  # noqa: E402
+
+HOST = os.getenv("ORCH_HOST", "0.0.0.0")
+PORT = int(os.getenv("ORCH_PORT", "8000"))
+MAX_CONCURRENCY = int(os.getenv("ORCH_MAX_CONCURRENCY", "16"))
+MAX_BATCH = int(os.getenv("ORCH_MAX_BATCH", "256"))
+
+
+class AskRequest(BaseModel):
+    question: str = ""
+    mode: str = "auto"
+    k: int = Field(4, ge=1, le=50)
+    ocr_text: str = ""
+
+
+class AskBatchRequest(BaseModel):
+    questions: List[str]
+    mode: str = "auto"
+    k: int = Field(4, ge=1, le=50)
+
+
+_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="ask")
+_sem: Optional[asyncio.Semaphore] = None
+_warmup: Optional[asyncio.Future] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # build the orchestrator (router policy warm start: log replay, pandas) in the
+    # background so the port opens right away; early requests wait on its lock
+    global _warmup
+    _warmup = asyncio.get_running_loop().run_in_executor(_pool, get_orchestrator)
+    start_exporter()    # TRACE_PROM_FILE, if set
+    yield
+
+
+app = FastAPI(title="Agentic Swarm orchestrator", lifespan=lifespan)
+
+
+def _semaphore() -> asyncio.Semaphore:
+    global _sem
+    if _sem is None:
+        _sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _sem
+
+
+async def _answer(question: str, mode: str, k: int, ocr_text: str = "") -> dict:
+    async with _semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_pool, get_orchestrator().answer, question, mode, k, ocr_text)
+
+
+@app.get("/healthz")
+async def healthz():
+    warm = _warmup is not None and _warmup.done() and _warmup.exception() is None
+    return {"ok": True, "warm": warm, "max_concurrency": MAX_CONCURRENCY}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/ask")
+async def ask(req: AskRequest):
+    if not req.question.strip() and not req.ocr_text.strip():
+        raise HTTPException(status_code=400, detail="question or ocr_text required")
+    return await _answer(req.question, req.mode, req.k, req.ocr_text)
+
+
+@app.post("/ask_batch")
+async def ask_batch(req: AskBatchRequest):
+    if len(req.questions) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"batch larger than {MAX_BATCH}")
+    results = await asyncio.gather(
+        *(_answer(q, req.mode, req.k) for q in req.questions), return_exceptions=True
+    )
+    return {"results": [
+        r if not isinstance(r, Exception) else {"answer": None, "had_answer": 0, "error": f"{type(r).__name__}: {r}"}
+        for r in results
+    ]}
+
+
+def main():
+    import uvicorn
+    uvicorn.run(app, host=HOST, port=PORT, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
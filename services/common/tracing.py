@@ -0,0 +1,267 @@
+# services/common/tracing.py
+"""
+Lightweight per-stage tracing.
+
+  with trace("answer") as trace_id:          # one per request; sets the trace id
+      with span("rewrite"):
+          ...
+
+  @traced("neo4j.read")                       # decorator form
+  def read(...): ...
+
+Every span's duration goes into an in-process HDR-style histogram for its
+name (log-linear buckets, ~3% relative error, microsecond resolution), and
+into the current trace's span list (trace_spans()) for per-request debugging.
+The trace id and span list live in contextvars; fan_out copies the context
+into its worker threads, so tool spans attach to the request that started them.
+
+Export: render_prometheus() (served at /metrics by services/api/server.py),
+or set TRACE_PROM_FILE to have a background thread rewrite that file every
+TRACE_PROM_INTERVAL_S (node_exporter textfile-collector format).
+TRACING=0 turns spans into no-ops.
+"""
+import os
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+
+TRACING = os.getenv("TRACING", "1") != "0"
+PROM_FILE = os.getenv("TRACE_PROM_FILE", "")
+PROM_INTERVAL_S = float(os.getenv("TRACE_PROM_INTERVAL_S", "15"))
+MAX_SPANS_PER_TRACE = 256
+
+# Prometheus `le` bounds (seconds) for the exported cumulative buckets
+PROM_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.9, 0.99)
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_spans: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("trace_spans", default=None)
+_parent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("span_parent", default=None)
+
+
+class Histogram:
+    """
+    HDR-style histogram of microsecond values: exact below 2^SUB_BITS, then
+    2^SUB_BITS linear sub-buckets per power of two.
+    """
+    SUB_BITS = 5
+    SUB = 1 << SUB_BITS
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def index(cls, v: int) -> int:
+        if v < cls.SUB:
+            return v
+        shift = v.bit_length() - cls.SUB_BITS - 1
+        return (shift + 1) * cls.SUB + ((v >> shift) - cls.SUB)
+
+    @classmethod
+    def bounds(cls, idx: int):
+        """[lo, hi] microseconds covered by bucket idx."""
+        if idx < cls.SUB:
+            return idx, idx
+        shift = idx // cls.SUB - 1
+        sub = idx % cls.SUB + cls.SUB
+        return sub << shift, ((sub + 1) << shift) - 1
+
+    @classmethod
+    def index_array(cls, us):
+        """index() over an integer numpy array."""
+        import numpy as np
+        us = np.maximum(np.asarray(us, dtype=np.int64), 0)
+        shift = np.maximum(np.frexp(us.astype(np.float64))[1] - cls.SUB_BITS - 1, 0)
+        return np.where(us < cls.SUB, us, (shift + 1) * cls.SUB + ((us >> shift) - cls.SUB))
+
+    @classmethod
+    def quantile_of(cls, counts: Dict[int, int], q: float, max_us: Optional[int] = None) -> Optional[float]:
+        """Seconds at quantile q of a {bucket index: count} dict (bucket midpoint), None when empty."""
+        total = sum(counts.values())
+        if not total:
+            return None
+        target, seen = q * total, 0
+        for i in sorted(counts):
+            seen += counts[i]
+            if seen >= target:
+                lo, hi = cls.bounds(i)
+                mid = (lo + hi) / 2
+                return (mid if max_us is None else min(mid, max_us)) / 1e6
+        return (cls.bounds(max(counts))[1] if max_us is None else max_us) / 1e6
+
+    def record(self, seconds: float):
+        us = max(0, int(seconds * 1e6))
+        i = self.index(us)
+        with self._lock:
+            self.counts[i] = self.counts.get(i, 0) + 1
+            self.count += 1
+            self.total_us += us
+            if us > self.max_us:
+                self.max_us = us
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Seconds at quantile q (bucket midpoint), None when empty."""
+        with self._lock:
+            return self.quantile_of(self.counts, q, self.max_us)
+
+    def cumulative(self, bounds_s=PROM_BOUNDS) -> List[int]:
+        """Counts <= each bound (a bucket counts toward a bound when its upper edge fits)."""
+        with self._lock:
+            items = sorted(self.counts.items())
+        out, seen, j = [], 0, 0
+        for b in bounds_s:
+            lim = b * 1e6
+            while j < len(items) and self.bounds(items[j][0])[1] <= lim:
+                seen += items[j][1]
+                j += 1
+            out.append(seen)
+        return out
+
+    def snapshot(self) -> dict:
+        snap = {"count": self.count, "mean_ms": (self.total_us / self.count / 1e3) if self.count else None,
+                "max_ms": self.max_us / 1e3}
+        for q in QUANTILES:
+            v = self.quantile(q)
+            snap[f"p{int(q * 100)}_ms"] = None if v is None else v * 1e3
+        return snap
+
+
+class Registry:
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        h = self.histograms.get(name)
+        if h is None:
+            with self._lock:
+                h = self.histograms.setdefault(name, Histogram())
+        return h
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: h.snapshot() for name, h in sorted(self.histograms.items())}
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP pipeline_span_seconds Duration of pipeline stages (tracing spans).",
+            "# TYPE pipeline_span_seconds histogram",
+        ]
+        quant = [
+            "# HELP pipeline_span_quantile_seconds Span duration quantiles from the in-process HDR histogram.",
+            "# TYPE pipeline_span_quantile_seconds gauge",
+        ]
+        for name, h in sorted(self.histograms.items()):
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for b, c in zip(PROM_BOUNDS, h.cumulative()):
+                lines.append(f'pipeline_span_seconds_bucket{{span="{label}",le="{b}"}} {c}')
+            lines.append(f'pipeline_span_seconds_bucket{{span="{label}",le="+Inf"}} {h.count}')
+            lines.append(f'pipeline_span_seconds_sum{{span="{label}"}} {h.total_us / 1e6:.6f}')
+            lines.append(f'pipeline_span_seconds_count{{span="{label}"}} {h.count}')
+            for q in QUANTILES:
+                v = h.quantile(q)
+                if v is not None:
+                    quant.append(f'pipeline_span_quantile_seconds{{span="{label}",quantile="{q}"}} {v:.6f}')
+        return "\n".join(lines + quant) + "\n"
+
+    def write_prometheus(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+
+
+# ---------------- traces / spans ----------------
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def trace_spans() -> List[dict]:
+    """Spans recorded so far in the current trace: [{"name", "parent", "ms"}, ...]."""
+    return list(_spans.get() or [])
+
+
+def record(name: str, seconds: float):
+    """Add an externally timed duration as a span of the current trace."""
+    if not TRACING:
+        return
+    REGISTRY.histogram(name).record(seconds)
+    spans = _spans.get()
+    if spans is not None and len(spans) < MAX_SPANS_PER_TRACE:
+        spans.append({"name": name, "parent": _parent.get(), "ms": round(seconds * 1000, 3)})
+
+
+@contextmanager
+def span(name: str):
+    if not TRACING:
+        yield
+        return
+    token = _parent.set(name)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        _parent.reset(token)
+        record(name, dt)
+
+
+@contextmanager
+def trace(name: str = "request", trace_id: Optional[str] = None):
+    """Root span of a request; yields the trace id (also visible via current_trace_id())."""
+    t_tok = _trace_id.set(trace_id or new_trace_id())
+    s_tok = _spans.set([])
+    try:
+        with span(name):
+            yield _trace_id.get()
+    finally:
+        _spans.reset(s_tok)
+        _trace_id.reset(t_tok)
+
+
+def traced(name: str):
+    """Decorator: run the function inside span(name)."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ---------------- file exporter ----------------
+_exporter: Optional[threading.Thread] = None
+
+
+def start_exporter(path: str = PROM_FILE, interval_s: float = PROM_INTERVAL_S):
+    """Rewrite `path` with the Prometheus text every interval_s (no-op if path is empty)."""
+    global _exporter
+    if not path or _exporter is not None:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval_s)
+            try:
+                REGISTRY.write_prometheus(path)
+            except Exception:
+                pass
+
+    _exporter = threading.Thread(target=loop, name="prom-export", daemon=True)
+    _exporter.start()
@@ -0,0 +1,137 @@
+# services/graph/client.py
+"""
+Shared Neo4j access layer: one pooled driver per process (sync) plus one async
+driver per event loop, with pool size / acquisition / query timeouts from env.
+Everything that talks to the graph (graph_qa, smoke.py, check_env_and_count.py,
+the Health page) goes through here instead of building its own driver.
+
+Reads run as managed read transactions (routed to readers on a cluster) on a
+session that is reused per thread, so a lookup costs one pooled round trip.
+"""
+import os
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+from neo4j import GraphDatabase, AsyncGraphDatabase, READ_ACCESS, unit_of_work
+
+from services.common.tracing import span
+
+# Read connection from env (compose already sets these)
+URI      = os.getenv("NEO4J_URI", "bolt://graph:7687")
+USER     = os.getenv("NEO4J_USER") or os.getenv("NEO4J_USERNAME", "neo4j")
+PWD      = os.getenv("NEO4J_PASSWORD", "testtest")
+DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+
+POOL_SIZE        = int(os.getenv("NEO4J_POOL_SIZE", "50"))
+ACQUIRE_TIMEOUT  = float(os.getenv("NEO4J_ACQUIRE_TIMEOUT", "2.0"))     # s to wait for a free pooled connection
+CONNECT_TIMEOUT  = float(os.getenv("NEO4J_CONNECT_TIMEOUT", "2.0"))
+QUERY_TIMEOUT    = float(os.getenv("NEO4J_QUERY_TIMEOUT", "3.0"))       # server-side tx timeout
+MAX_CONN_LIFETIME = float(os.getenv("NEO4J_MAX_CONN_LIFETIME", "3600"))
+RETRY_TIME       = float(os.getenv("NEO4J_RETRY_TIME", "2.0"))          # cap on managed-tx retries (driver default: 30s)
+
+
+def _driver_kwargs() -> Dict[str, Any]:
+    return {
+        "auth": (USER, PWD),
+        "max_connection_pool_size": POOL_SIZE,
+        "connection_acquisition_timeout": ACQUIRE_TIMEOUT,
+        "connection_timeout": CONNECT_TIMEOUT,
+        "max_connection_lifetime": MAX_CONN_LIFETIME,
+        "max_transaction_retry_time": RETRY_TIME,
+        "keep_alive": True,
+    }
+
+
+_lock = threading.Lock()
+_driver = None
+_local = threading.local()
+_async_drivers: Dict[asyncio.AbstractEventLoop, Any] = {}
+
+
+def get_driver():
+    """Process-wide sync driver (created on first use)."""
+    global _driver
+    if _driver is None:
+        with _lock:
+            if _driver is None:
+                _driver = GraphDatabase.driver(URI, **_driver_kwargs())
+    return _driver
+
+
+def _session():
+    s = getattr(_local, "session", None)
+    if s is None or s.closed():
+        s = get_driver().session(database=DATABASE, default_access_mode=READ_ACCESS)
+        _local.session = s
+    return s
+
+
+@unit_of_work(timeout=QUERY_TIMEOUT)
+def _read_tx(tx, query: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return tx.run(query, params).data()
+
+
+def read(query: str, *, timeout: Optional[float] = None, **params) -> List[Dict[str, Any]]:
+    """
+    Run a read-only Cypher query; returns records as dicts. `timeout` (seconds,
+    e.g. the caller's remaining deadline) runs one transaction capped at that
+    time instead of the managed retry loop, so a late caller gives up.
+    """
+    if timeout is not None and timeout <= 0:
+        raise TimeoutError("deadline passed before the graph read")
+    try:
+        with span("neo4j.read"):
+            if timeout is None:
+                return _session().execute_read(_read_tx, query, params)
+            with _session().begin_transaction(timeout=min(timeout, QUERY_TIMEOUT)) as tx:
+                return tx.run(query, params).data()
+    except Exception:
+        # drop a session that may be in a bad state; the next call opens a fresh one
+        s = getattr(_local, "session", None)
+        _local.session = None
+        if s is not None:
+            try:
+                s.close()
+            except Exception:
+                pass
+        raise
+
+
+def get_async_driver():
+    """Async driver bound to the running event loop (created on first use)."""
+    loop = asyncio.get_running_loop()
+    drv = _async_drivers.get(loop)
+    if drv is None:
+        drv = AsyncGraphDatabase.driver(URI, **_driver_kwargs())
+        _async_drivers[loop] = drv
+    return drv
+
+
+@unit_of_work(timeout=QUERY_TIMEOUT)
+async def _read_tx_async(tx, query: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    res = await tx.run(query, params)
+    return await res.data()
+
+
+async def read_async(query: str, **params) -> List[Dict[str, Any]]:
+    """Async read-only Cypher query. Async sessions are cheap and not shareable
+    across tasks, so one is opened per call on top of the shared pool."""
+    with span("neo4j.read"):
+        async with get_async_driver().session(database=DATABASE, default_access_mode=READ_ACCESS) as s:
+            return await s.execute_read(_read_tx_async, query, params)
+
+
+def close():
+    global _driver
+    with _lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+    _local.session = None
+
+
+async def close_async():
+    drv = _async_drivers.pop(asyncio.get_running_loop(), None)
+    if drv is not None:
+        await drv.close()
@@ -1,63 +1,109 @@
-import os, re
-from typing import Tuple, List
-from neo4j import GraphDatabase
-
-# Read connection from env (compose already sets these)
-URI  = os.getenv("NEO4J_URI", "bolt://graph:7687")
-USER = os.getenv("NEO4J_USER", "neo4j")
-PWD  = os.getenv("NEO4J_PASSWORD", "testtest")
-
-_driver = GraphDatabase.driver(URI, auth=(USER, PWD))
-
-def _ceo_of(company: str) -> Tuple[str, List[str]]:
-    q = """
-    MATCH (p:Person)-[:CEO_OF]->(c:Company {name:$company})
-    RETURN p.name AS ceo, c.name AS company
-    LIMIT 1
-    """
-    with _driver.session(database="neo4j") as s:
-        rec = s.run(q, company=company.title()).single()
-        if not rec:
-            return "", []
-        return f"{rec['ceo']} is the CEO of {rec['company']}.", [
-            f"Neo4j: (Person)-[:CEO_OF]->(Company name='{company.title()}')"
-        ]
-
-def _company_led_by(person: str) -> Tuple[str, List[str]]:
-    q = """
-    MATCH (p:Person {name:$person})-[:CEO_OF]->(c:Company)
-    RETURN p.name AS person, c.name AS company
-    LIMIT 1
-    """
-    with _driver.session(database="neo4j") as s:
-        rec = s.run(q, person=person.title()).single()
-        if not rec:
-            return "", []
-        return f"{rec['person']} leads {rec['company']}.", [
-            f"Neo4j: (Person name='{person.title()}')-[:CEO_OF]->(Company)"
-        ]
-
-def query_graph(question: str) -> Tuple[str, List[str]]:
-    qn = (question or "").strip().lower()
-    if not qn:
+import re
+from typing import Tuple, List, Optional
+
+from services.agent.analyzer import analyze
+from services.graph import client
+from services.graph.snapshot import get_snapshot
+
+CEO_OF_Q = """
+MATCH (p:Person)-[:CEO_OF]->(c:Company {name:$company})
+RETURN p.name AS ceo, c.name AS company
+LIMIT 1
+"""
+
+COMPANY_LED_BY_Q = """
+MATCH (p:Person {name:$person})-[:CEO_OF]->(c:Company)
+RETURN p.name AS person, c.name AS company
+LIMIT 1
+"""
+
+def _ceo_answer(rows, company: str) -> Tuple[str, List[str]]:
+    if not rows:
         return "", []
+    rec = rows[0]
+    return f"{rec['ceo']} is the CEO of {rec['company']}.", [
+        f"Neo4j: (Person)-[:CEO_OF]->(Company name='{company.title()}')"
+    ]
 
-    # CEO of company (cover: "ceo of X", "who runs X", "who is the ceo of X")
-    m = (
-        re.search(r"ceo\s+of\s+([a-z&\-\s]+)\??$", qn)
-        or re.search(r"who\s+runs\s+([a-z&\-\s]+)\??$", qn)
-        or re.search(r"who\s+is\s+the\s+ceo\s+of\s+([a-z&\-\s]+)\??$", qn)
-    )
-    if m:
-        return _ceo_of(m.group(1).strip())
+def _led_by_answer(rows, person: str) -> Tuple[str, List[str]]:
+    if not rows:
+        return "", []
+    rec = rows[0]
+    return f"{rec['person']} leads {rec['company']}.", [
+        f"Neo4j: (Person name='{person.title()}')-[:CEO_OF]->(Company)"
+    ]
+
+def _ceo_of(company: str, timeout: Optional[float] = None) -> Tuple[str, List[str]]:
+    return _ceo_answer(client.read(CEO_OF_Q, timeout=timeout, company=company.title()), company)
+
+def _company_led_by(person: str, timeout: Optional[float] = None) -> Tuple[str, List[str]]:
+    return _led_by_answer(client.read(COMPANY_LED_BY_Q, timeout=timeout, person=person.title()), person)
 
+# One compiled pass instead of six sequential searches. CEO phrasings come first,
+# so they win when both could match (same priority as before).
+GRAPH_RE = re.compile(
+    # CEO of company (cover: "ceo of X", "who runs X", "who is the ceo of X")
+    r"ceo\s+of\s+(?P<c1>[a-z&\-\s]+)\??$"
+    r"|who\s+runs\s+(?P<c2>[a-z&\-\s]+)\??$"
     # company led by person (cover both word orders)
-    m = (
-        re.search(r"(?:which|what)\s+company\s+does\s+([a-z\-\s]+)\s+lead\??", qn)
-        or re.search(r"([a-z\-\s]+)\s+leads\s+(?:which|what)\s+company\??", qn)
-        or re.search(r"which\s+company\s+is\s+([a-z\-\s]+)\s+(?:the\s+)?ceo\s+of\??", qn)
-    )
-    if m:
-        return _company_led_by(m.group(1).strip())
-
-    return "", []
+    r"|(?:which|what)\s+company\s+does\s+(?P<p1>[a-z\-\s]+)\s+lead\??"
+    r"|(?P<p2>[a-z\-\s]+)\s+leads\s+(?:which|what)\s+company\??"
+    r"|which\s+company\s+is\s+(?P<p3>[a-z\-\s]+?)\s+(?:the\s+)?ceo\s+of\??"
+)
+
+def _parse(question: str) -> Optional[Tuple[str, str]]:
+    """Return ("ceo_of", company) / ("led_by", person) or None."""
+    f = analyze(question or "")
+    # cheap gate from the shared feature record: no CEO/who/lead wording -> no regex at all
+    if not f.has("ceo", "who", "lead"):
+        return None
+    m = GRAPH_RE.search(f.lower.strip())
+    if not m:
+        return None
+    for g in ("p3", "c1", "c2", "p1", "p2"):
+        if m.group(g):
+            return ("ceo_of" if g[0] == "c" else "led_by"), m.group(g).strip()
+    return None
+
+def _from_snapshot(kind: str, arg: str) -> Optional[Tuple[str, List[str]]]:
+    """Answer from the in-process CEO_OF snapshot; None on a miss (or when disabled)."""
+    snap = get_snapshot()
+    if snap is None:
+        return None
+    if kind == "ceo_of":
+        edge = snap.by_dst("CEO_OF", arg)
+        if edge:
+            return f"{edge[0]} is the CEO of {edge[1]}.", [
+                f"Neo4j snapshot: (Person)-[:CEO_OF]->(Company name='{edge[1]}')"
+            ]
+    else:
+        edge = snap.by_src("CEO_OF", arg)
+        if edge:
+            return f"{edge[0]} leads {edge[1]}.", [
+                f"Neo4j snapshot: (Person name='{edge[0]}')-[:CEO_OF]->(Company)"
+            ]
+    return None
+
+def query_graph(question: str, timeout: Optional[float] = None) -> Tuple[str, List[str]]:
+    """`timeout` (s) bounds the Neo4j round trip, e.g. the fan-out's remaining deadline."""
+    parsed = _parse(question)
+    if parsed is None:
+        return "", []
+    kind, arg = parsed
+    hit = _from_snapshot(kind, arg)
+    if hit is not None:
+        return hit
+    return _ceo_of(arg, timeout) if kind == "ceo_of" else _company_led_by(arg, timeout)
+
+async def query_graph_async(question: str) -> Tuple[str, List[str]]:
+    """Same as query_graph, on the async driver, so callers can await it next to other tools."""
+    parsed = _parse(question)
+    if parsed is None:
+        return "", []
+    kind, arg = parsed
+    hit = _from_snapshot(kind, arg)
+    if hit is not None:
+        return hit
+    if kind == "ceo_of":
+        return _ceo_answer(await client.read_async(CEO_OF_Q, company=arg.title()), arg)
+    return _led_by_answer(await client.read_async(COMPANY_LED_BY_Q, person=arg.title()), arg)
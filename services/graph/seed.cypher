@@ -15,3 +15,6 @@ MERGE (met)-[:HAS_SIDE_EFFECT]->(nausea);
 MERGE (ibuprofen)-[:INTERACTS_WITH]->(aspirin);
 MERGE (tsla)-[:HAS_CEO]->(musk);
 MERGE (tsla)-[:REPORTS]->(rev2024);
+
+// bump on every data change so in-process snapshots (services/graph/snapshot.py) reload
+MERGE (meta:GraphMeta {name:"graph"}) SET meta.version = timestamp();
@@ -0,0 +1,167 @@
+# services/graph/snapshot.py
+"""
+In-process snapshot of small, read-mostly relations (default: CEO_OF).
+
+Edges are pulled once into a compact adjacency index keyed by normalised
+names, in both directions, so graph_qa can answer "ceo of X" / "what does Y
+lead" from a dict lookup and only falls back to Cypher on a miss.
+
+The first load runs on the background thread too, so no request waits on
+Neo4j (two retry cycles when it is down); until it lands every lookup is a
+miss and graph_qa goes to Cypher as before.
+
+Freshness: the same daemon thread polls the optional version property
+  MATCH (m:GraphMeta {name:'graph'}) RETURN m.version
+every GRAPH_SNAPSHOT_CHECK seconds and reloads when it changes, and reloads
+unconditionally every GRAPH_SNAPSHOT_REFRESH seconds.
+"""
+import os
+import re
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+from services.graph import client
+
+ENABLED     = os.getenv("GRAPH_SNAPSHOT", "1").lower() in ("1", "true", "yes")
+RELATIONS   = tuple(r.strip() for r in os.getenv("GRAPH_SNAPSHOT_RELS", "CEO_OF").split(",") if r.strip())
+REFRESH_S   = float(os.getenv("GRAPH_SNAPSHOT_REFRESH", "600"))
+CHECK_S     = float(os.getenv("GRAPH_SNAPSHOT_CHECK", "15"))
+
+VERSION_Q = "MATCH (m:GraphMeta {name:'graph'}) RETURN m.version AS version LIMIT 1"
+
+_REL_NAME = re.compile(r"^[A-Z_][A-Z0-9_]*$")
+_NON_WORD = re.compile(r"[^a-z0-9&]+")
+
+
+def norm_name(name: str) -> str:
+    return _NON_WORD.sub(" ", (name or "").lower()).strip()
+
+
+class GraphSnapshot:
+    def __init__(self, relations: Tuple[str, ...] = RELATIONS, refresh_s: float = REFRESH_S, check_s: float = CHECK_S):
+        for r in relations:
+            if not _REL_NAME.match(r):
+                raise ValueError(f"Bad relation type for snapshot: {r!r}")
+        self.relations = relations
+        self.refresh_s = refresh_s
+        self.check_s = check_s
+        # rel -> normalised name -> (src name, dst name); swapped in whole on reload
+        self._out: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        self._in: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        self.version = None
+        self.loaded_at = 0.0
+        self.edges = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ---------- loading ----------
+    def _read_version(self):
+        try:
+            rows = client.read(VERSION_Q)
+            return rows[0]["version"] if rows else None
+        except Exception:
+            return None
+
+    def load(self) -> bool:
+        try:
+            out, inc, n = {}, {}, 0
+            version = self._read_version()
+            for rel in self.relations:
+                rows = client.read(f"MATCH (a)-[:`{rel}`]->(b) RETURN a.name AS src, b.name AS dst")
+                o, i = {}, {}
+                for r in rows:
+                    if r["src"] is None or r["dst"] is None:
+                        continue
+                    edge = (r["src"], r["dst"])
+                    o.setdefault(norm_name(r["src"]), edge)
+                    i.setdefault(norm_name(r["dst"]), edge)
+                    n += 1
+                out[rel], inc[rel] = o, i
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            return False
+        with self._lock:
+            self._out, self._in = out, inc
+            self.version, self.edges, self.loaded_at = version, n, time.time()
+        return True
+
+    def _refresher(self):
+        self.load()
+        while not self._stop.wait(self.check_s):
+            stale = time.time() - self.loaded_at > self.refresh_s
+            if stale or self._read_version() != self.version:
+                self.load()
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at > 0
+
+    def start(self):
+        """Background thread: initial load, then refreshes (idempotent, returns at once)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refresher, name="graph-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------- lookups ----------
+    def _lookup(self, index, rel: str, name: str) -> Optional[Tuple[str, str]]:
+        edge = index.get(rel, {}).get(norm_name(name))
+        with self._lock:
+            if edge is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return edge
+
+    def by_dst(self, rel: str, dst: str) -> Optional[Tuple[str, str]]:
+        """(src, dst) edge of `rel` pointing at dst, e.g. CEO_OF into a company."""
+        return self._lookup(self._in, rel, dst)
+
+    def by_src(self, rel: str, src: str) -> Optional[Tuple[str, str]]:
+        return self._lookup(self._out, rel, src)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "relations": list(self.relations),
+            "ready": self.ready,
+            "edges": self.edges,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "load_errors": self.errors,
+        }
+
+
+_snapshot: Optional[GraphSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot() -> Optional[GraphSnapshot]:
+    """Process-wide snapshot, loading in the background from first use; None when GRAPH_SNAPSHOT=0."""
+    global _snapshot
+    if not ENABLED:
+        return None
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                s = GraphSnapshot()
+                s.start()
+                _snapshot = s
+    return _snapshot
+
+
+def peek_snapshot() -> Optional[GraphSnapshot]:
+    """The snapshot if something already started it; never connects to Neo4j."""
+    return _snapshot
@@ -1,61 +1,161 @@
 import os
 import json
+import time
+import atexit
 import random
-import pandas as pd
+import weakref
+
+from services.router.log_backend import Tail
+from services.router.logger import LOG_PATH, ROUTE_SCHEMA
 
-LOG_PATH = "data/logs/route_log.csv"
 MODEL_PATH = "data/models/router_bandit.json"
 
+# debounced persistence: write at most every SAVE_INTERVAL_S seconds or SAVE_EVERY updates
+SAVE_INTERVAL_S = float(os.getenv("BANDIT_SAVE_INTERVAL_S", "5"))
+SAVE_EVERY = int(os.getenv("BANDIT_SAVE_EVERY", "50"))
+# tools that fill an arm's slot in the plan (PLANNER_VECTOR_TOOL) count for that arm
+ARM_ALIASES = {"vector_hybrid": "vector"}
+
+# policies with unsaved updates; one exit hook for all of them, and no hook keeps one alive
+_live = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all():
+    for policy in list(_live):
+        policy.flush()
+
+
+def flush_at_exit(policy):
+    """Have `policy.flush()` run at interpreter exit while it is still alive."""
+    _live.add(policy)
+
 
 class EpsGreedyBandit:
     """
     Simple epsilon-greedy multi-armed bandit to pick best tool.
     Arms = ["vector", "graph", "math"]
     Reward = had_answer - latency_ms * 0.001 (so faster = better)
+
+    The model is a fold of the route log: `tail` holds the log cursor and the
+    ids of rows already applied online, so a warm start only replays rows
+    appended since the last save and never counts a row twice.
     """
 
     def __init__(self, arms=None, epsilon=0.2):
         self.arms = arms or ["vector", "graph", "math"]
         self.epsilon = epsilon
-        self.counts = {a: 1 for a in self.arms}
-        self.values = {a: 0.0 for a in self.arms}
+        self._reset()
+        self._dirty = 0
+        self._last_save = time.monotonic()
         # try to load existing model so learning persists
         self._load()
+        flush_at_exit(self)
+
+    def _reset(self):
+        self.counts = {a: 1 for a in self.arms}
+        self.values = {a: 0.0 for a in self.arms}
+        self.tail = Tail(LOG_PATH, ROUTE_SCHEMA)
 
     def _load(self):
         if os.path.exists(MODEL_PATH) and os.path.getsize(MODEL_PATH) > 0:
             try:
-                d = json.loads(open(MODEL_PATH, "r").read())
+                with open(MODEL_PATH, "r") as f:
+                    d = json.load(f)
                 self.counts.update(d.get("counts", {}))
                 self.values.update(d.get("values", {}))
                 self.epsilon = d.get("epsilon", self.epsilon)
+                self.tail = Tail(LOG_PATH, ROUTE_SCHEMA, d.get("log"))
             except Exception:
                 pass
 
     def _save(self):
         os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-        with open(MODEL_PATH, "w") as f:
+        tmp = f"{MODEL_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
             json.dump(
-                {"counts": self.counts, "values": self.values, "epsilon": self.epsilon},
+                {
+                    "counts": self.counts,
+                    "values": self.values,
+                    "epsilon": self.epsilon,
+                    "log": self.tail.state(),
+                },
                 f,
                 indent=2,
             )
+        os.replace(tmp, MODEL_PATH)   # readers never see a half-written file
+        self._dirty = 0
+        self._last_save = time.monotonic()
+
+    def _maybe_save(self):
+        self._dirty += 1
+        if self._dirty >= SAVE_EVERY or time.monotonic() - self._last_save >= SAVE_INTERVAL_S:
+            self._catch_up()
+            self._save()
 
-    def select(self) -> str:
+    def flush(self):
+        """Persist pending updates now (also runs at interpreter exit)."""
+        if self._dirty:
+            self._catch_up()
+            try:
+                self._save()
+            except Exception:
+                pass
+
+    def select(self, question: str = None) -> str:
+        # context-free: `question` is accepted for parity with ContextualRouter
         # explore
         if random.random() < self.epsilon:
             return random.choice(self.arms)
         # exploit
         return max(self.arms, key=lambda a: self.values.get(a, 0.0))
 
-    def update(self, arm: str, reward: float):
-        if arm not in self.arms:
-            return
-        self.counts[arm] += 1
-        n = self.counts[arm]
-        old = self.values[arm]
-        self.values[arm] = old + (reward - old) / n  # incremental mean
-        self._save()
+    def update(self, arm: str, reward: float, row_id: str = None):
+        """Online update. `row_id` (from log_route) is skipped when the log is read back."""
+        if not self.tail.mark(row_id):
+            return      # already folded in from the log
+        arm = ARM_ALIASES.get(arm, arm)
+        if arm in self.arms:
+            self.counts[arm] += 1
+            n = self.counts[arm]
+            old = self.values[arm]
+            self.values[arm] = old + (reward - old) / n  # incremental mean
+        self._maybe_save()
+
+    def observe(self, question: str, arm: str, had_answer: int, latency_ms: int, row_id: str = None):
+        """Router-policy interface shared with ContextualRouter."""
+        self.update(arm, reward_from_row({"had_answer": had_answer, "latency_ms": latency_ms}), row_id=row_id)
+
+    def merge(self, counts: dict, sums: dict):
+        """Fold many rewards at once: same result as calling update() once per reward."""
+        for arm, m in counts.items():
+            if arm not in self.arms or not m:
+                continue
+            c0, v0 = self.counts[arm], self.values[arm]
+            self.counts[arm] = c0 + int(m)
+            self.values[arm] = (c0 * v0 + float(sums[arm])) / self.counts[arm]
+
+    def _fold(self, df, reset: bool):
+        if reset:
+            self.counts = {a: 1 for a in self.arms}      # cursor lost: rebuild from every row
+            self.values = {a: 0.0 for a in self.arms}
+        if df is not None and len(df):
+            arm = df["decision"].astype(str).str.lower().replace(ARM_ALIASES)
+            agg = rewards_from_frame(df).groupby(arm).agg(["count", "sum"])
+            self.merge(agg["count"].to_dict(), agg["sum"].to_dict())
+
+    def _catch_up(self):
+        try:
+            self._fold(*self.tail.read())
+        except Exception:
+            pass
+
+    def sync(self) -> int:
+        """Replay log rows appended since the cursor (all rows if it was lost). Returns rows read."""
+        df, reset = self.tail.read()
+        self._fold(df, reset)
+        self._dirty += 1
+        return 0 if df is None else len(df)
 
 
 def reward_from_row(row) -> float:
@@ -65,18 +165,31 @@ def reward_from_row(row) -> float:
     return max(-1.0, min(1.0, base - 0.001 * lat))
 
 
-def offline_learn_from_csv(path: str = LOG_PATH) -> EpsGreedyBandit:
-    """Warm-start from existing logs (safe to call at app startup)."""
+def rewards_from_frame(df: "pd.DataFrame") -> "pd.Series":
+    """reward_from_row over a whole frame."""
+    import pandas as pd
+    had = pd.to_numeric(df["had_answer"], errors="coerce").fillna(0).ne(0).astype(float)
+    lat = pd.to_numeric(df["latency_ms"], errors="coerce").fillna(0.0)
+    return (had - 0.001 * lat).clip(-1.0, 1.0)
+
+
+def offline_learn_from_csv() -> EpsGreedyBandit:
+    """
+    Warm-start (safe to call at app startup), writes once. Per-arm totals come
+    from the routing stats store (services/router/stats.py); without it, replay
+    only the log rows appended since the saved cursor.
+    """
     b = EpsGreedyBandit()
-    if not os.path.exists(path):
-        return b
     try:
-        df = pd.read_csv(path)
-        for _, row in df.iterrows():
-            a = str(row.get("decision", "")).lower()
-            if a not in b.arms:
-                continue
-            b.update(a, reward_from_row(row))
+        from services.router.stats import get_route_stats
+        state = get_route_stats().bandit_state(b.arms)
+        b.counts, b.values = state["counts"], state["values"]
+        b.tail = Tail(LOG_PATH, ROUTE_SCHEMA, state["log"])
+        b._dirty += 1
     except Exception:
-        pass
-    return b
\ No newline at end of file
+        try:
+            b.sync()
+        except Exception:
+            pass
+    b.flush()
+    return b
@@ -0,0 +1,259 @@
+# services/router/contextual.py
+"""
+Contextual, latency-aware router policy (drop-in next to EpsGreedyBandit).
+
+Each arm keeps a ridge regression over question features (analyzer intents,
+entity kinds, digits/math/year flags, length):
+
+  success  p(x)   = theta_s . x              (clipped to [0, 1])
+  latency  ms(x)  = expm1(theta_l . x)       (fit on log1p(ms))
+
+Both targets share the design matrix, so one A = lambda*I + sum x x^T per arm
+(kept with its inverse via Sherman-Morrison) serves both. Exploration is LinUCB
+(alpha * sqrt(x^T A^-1 x) on p) or Thompson sampling (theta_s ~ N(mu, v^2 A^-1)).
+
+utility = p - LATENCY_WEIGHT * ms / budget, minus 1 if ms exceeds the budget.
+choose() also says when the runner-up is worth launching in parallel: the best
+arm is unsure (p < PARALLEL_BELOW), the pair adds at least PARALLEL_GAIN to
+P(any answer), and the runner-up is expected to fit the budget.
+
+Selected with ROUTER_POLICY=linucb|thompson (default egreedy keeps the bandit).
+Persists to data/models/router_contextual.npz and, like the bandit, keeps a
+log_backend.Tail so warm starts only replay rows it has not seen.
+"""
+import io
+import os
+import json
+import time
+import numpy as np
+
+from services.agent.analyzer import analyze, get_analyzer
+from services.router.bandit import flush_at_exit, offline_learn_from_csv
+from services.router.log_backend import Tail
+from services.router.logger import LOG_PATH, ROUTE_SCHEMA
+
+MODEL_PATH = "data/models/router_contextual.npz"
+
+ROUTER_POLICY = os.getenv("ROUTER_POLICY", "egreedy").lower()
+ARMS = ["vector", "vector_semantic", "vector_hybrid", "graph", "math"]
+LATENCY_BUDGET_MS = float(os.getenv("ROUTER_LATENCY_BUDGET_MS", "1500"))
+LATENCY_WEIGHT = float(os.getenv("ROUTER_LATENCY_WEIGHT", "0.25"))
+ALPHA = float(os.getenv("ROUTER_ALPHA", "0.5"))            # LinUCB width
+TS_SCALE = float(os.getenv("ROUTER_TS_SCALE", "0.3"))      # Thompson posterior scale
+RIDGE = 1.0
+PARALLEL_BELOW = float(os.getenv("ROUTER_PARALLEL_BELOW", "0.8"))
+PARALLEL_GAIN = float(os.getenv("ROUTER_PARALLEL_GAIN", "0.1"))
+PRIOR_LATENCY_MS = 300.0
+
+SAVE_INTERVAL_S = float(os.getenv("BANDIT_SAVE_INTERVAL_S", "5"))
+SAVE_EVERY = int(os.getenv("BANDIT_SAVE_EVERY", "50"))
+
+
+def feature_names() -> list:
+    lex = get_analyzer().lexicon
+    return (["bias", "has_math", "has_digits", "has_year", "log_len"]
+            + [f"entity:{k}" for k in sorted(lex.get("entities", {}))]
+            + [f"intent:{i}" for i in sorted(lex.get("intents", {}))])
+
+
+def featurize(question: str, names: list) -> np.ndarray:
+    f = analyze(question or "")
+    on = {"bias", "has_math"} if f.has_math else {"bias"}
+    if f.has_digits:
+        on.add("has_digits")
+    if f.years:
+        on.add("has_year")
+    on.update(f"entity:{k}" for k in f.entities)
+    on.update(f"intent:{i}" for i in f.intents)
+    x = np.array([1.0 if n in on else 0.0 for n in names])
+    x[names.index("log_len")] = np.log1p(len(f.lower.split())) / np.log(64.0)
+    return x
+
+
+class ContextualRouter:
+    def __init__(self, arms=None, mode: str = "linucb", seed=None):
+        self.arms = list(arms or ARMS)
+        self.mode = mode
+        self.names = feature_names()
+        self.rng = np.random.default_rng(seed)
+        self.tail = Tail(LOG_PATH, ROUTE_SCHEMA)
+        self._reset()
+        self._dirty = 0
+        self._last_save = time.monotonic()
+        self._load()
+        flush_at_exit(self)
+
+    # ---------- state ----------
+    def _reset(self):
+        n, d = len(self.arms), len(self.names)
+        self.A = np.tile(np.eye(d) * RIDGE, (n, 1, 1))
+        self.A_inv = np.tile(np.eye(d) / RIDGE, (n, 1, 1))
+        self.b_succ = np.zeros((n, d))
+        self.b_lat = np.zeros((n, d))
+        self.b_lat[:, 0] = RIDGE * np.log1p(PRIOR_LATENCY_MS)   # prior: bias term ~ PRIOR_LATENCY_MS
+        self.n = np.zeros(n, dtype=np.int64)
+
+    def _load(self):
+        if not os.path.exists(MODEL_PATH):
+            return
+        try:
+            with np.load(MODEL_PATH) as z:
+                meta = json.loads(str(z["meta"]))
+                if meta.get("arms") != self.arms or meta.get("features") != self.names:
+                    return      # lexicon or arm set changed: relearn from the log
+                self.A, self.b_succ, self.b_lat, self.n = z["A"], z["b_succ"], z["b_lat"], z["n"]
+            self.A_inv = np.linalg.inv(self.A)
+            self.tail = Tail(LOG_PATH, ROUTE_SCHEMA, meta.get("log"))
+        except Exception:
+            self._reset()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+        meta = {"arms": self.arms, "features": self.names, "mode": self.mode, "log": self.tail.state()}
+        buf = io.BytesIO()
+        np.savez(buf, A=self.A, b_succ=self.b_succ, b_lat=self.b_lat, n=self.n, meta=np.array(json.dumps(meta)))
+        tmp = f"{MODEL_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(buf.getvalue())
+        os.replace(tmp, MODEL_PATH)
+        self._dirty = 0
+        self._last_save = time.monotonic()
+
+    def _maybe_save(self):
+        self._dirty += 1
+        if self._dirty >= SAVE_EVERY or time.monotonic() - self._last_save >= SAVE_INTERVAL_S:
+            self._catch_up()
+            self._save()
+
+    def flush(self):
+        if self._dirty:
+            try:
+                self._catch_up()
+                self._save()
+            except Exception:
+                pass
+
+    # ---------- prediction ----------
+    def predict(self, question: str, arms=None) -> dict:
+        """arm -> {"p": success prob, "latency_ms": expected ms, "width": uncertainty}."""
+        x = featurize(question, self.names)
+        out = {}
+        for a in (arms or self.arms):
+            if a not in self.arms:
+                continue
+            i = self.arms.index(a)
+            Ainv_x = self.A_inv[i] @ x
+            p = float(np.clip(Ainv_x @ self.b_succ[i], 0.0, 1.0))
+            lat = float(np.expm1(max(0.0, Ainv_x @ self.b_lat[i])))
+            out[a] = {"p": p, "latency_ms": lat, "width": float(np.sqrt(max(0.0, x @ Ainv_x)))}
+        return out
+
+    def _optimistic_p(self, i: int, x: np.ndarray, pred: dict) -> float:
+        if self.mode == "thompson":
+            mu = self.A_inv[i] @ self.b_succ[i]
+            theta = self.rng.multivariate_normal(mu, TS_SCALE ** 2 * self.A_inv[i], method="cholesky")
+            return float(np.clip(theta @ x, 0.0, 1.0))
+        return min(1.0, pred["p"] + ALPHA * pred["width"])
+
+    @staticmethod
+    def utility(p: float, latency_ms: float, budget_ms: float) -> float:
+        u = p - LATENCY_WEIGHT * latency_ms / budget_ms
+        return u - 1.0 if latency_ms > budget_ms else u
+
+    def rank(self, question: str, candidates=None, budget_ms: float = LATENCY_BUDGET_MS) -> list:
+        """Candidates sorted by (exploratory) utility: [(arm, utility, prediction), ...]."""
+        x = featurize(question, self.names)
+        preds = self.predict(question, candidates)
+        scored = [(a, self.utility(self._optimistic_p(self.arms.index(a), x, pr), pr["latency_ms"], budget_ms), pr)
+                  for a, pr in preds.items()]
+        return sorted(scored, key=lambda s: s[1], reverse=True)
+
+    def choose(self, question: str, candidates=None, budget_ms: float = LATENCY_BUDGET_MS):
+        """
+        (ordered arms, n_parallel): launch the first n_parallel (1 or 2) at once;
+        the rest are fallbacks.
+        """
+        ranked = self.rank(question, candidates, budget_ms)
+        order = [a for a, _, _ in ranked]
+        if len(ranked) < 2:
+            return order, len(order)
+        p1, p2 = ranked[0][2]["p"], ranked[1][2]["p"]
+        gain = (1 - (1 - p1) * (1 - p2)) - p1
+        fits = ranked[1][2]["latency_ms"] <= budget_ms
+        return order, (2 if p1 < PARALLEL_BELOW and gain >= PARALLEL_GAIN and fits else 1)
+
+    def select(self, question: str = None) -> str:
+        return self.rank(question or "")[0][0]
+
+    # ---------- learning ----------
+    def _fit(self, i: int, X: np.ndarray, succ: np.ndarray, lat_ms: np.ndarray):
+        """Batch ridge update for one arm (rows of X)."""
+        if len(X) == 1:
+            x = X[0]
+            Ainv_x = self.A_inv[i] @ x
+            self.A_inv[i] -= np.outer(Ainv_x, Ainv_x) / (1.0 + x @ Ainv_x)
+        self.A[i] += X.T @ X
+        if len(X) > 1:
+            self.A_inv[i] = np.linalg.inv(self.A[i])
+        self.b_succ[i] += X.T @ succ
+        self.b_lat[i] += X.T @ np.log1p(np.maximum(lat_ms, 0.0))
+        self.n[i] += len(X)
+
+    def observe(self, question: str, arm: str, had_answer: int, latency_ms: int, row_id: str = None):
+        if not self.tail.mark(row_id):      # marked rows are skipped when the log is read back
+            return
+        if arm in self.arms:
+            x = featurize(question, self.names)[None, :]
+            self._fit(self.arms.index(arm), x, np.array([float(bool(had_answer))]), np.array([float(latency_ms)]))
+        self._maybe_save()
+
+    def _fold(self, df, reset: bool):
+        """Batched fit per arm over route-log rows."""
+        if reset:
+            self._reset()
+        if df is None or not len(df):
+            return
+        rw = df["rewritten"]
+        q = rw.where(rw != "", df["question"])      # online updates featurize the rewritten question too
+        arm = df["decision"].str.lower()
+        succ = df["had_answer"].ne(0).to_numpy(dtype=float)
+        lat = df["latency_ms"].to_numpy(dtype=float)
+        X = np.stack([featurize(s, self.names) for s in q])
+        for i, a in enumerate(self.arms):
+            m = (arm == a).to_numpy()
+            if m.any():
+                self._fit(i, X[m], succ[m], lat[m])
+
+    def _catch_up(self):
+        try:
+            self._fold(*self.tail.read())
+        except Exception:
+            pass
+
+    def sync(self) -> int:
+        """Fold route-log rows appended since the cursor (every row if it was lost). Returns rows read."""
+        df, reset = self.tail.read()
+        self._fold(df, reset)
+        self._dirty += 1
+        return 0 if df is None else len(df)
+
+    def stats(self) -> dict:
+        return {a: {"n": int(self.n[i])} for i, a in enumerate(self.arms)}
+
+
+def learn_contextual_from_csv(mode: str = "linucb") -> ContextualRouter:
+    """Warm start: replays only rows appended since the saved cursor, writes once."""
+    r = ContextualRouter(mode=mode)
+    try:
+        r.sync()
+    except Exception:
+        pass
+    r.flush()
+    return r
+
+
+def load_router_policy(kind: str = ROUTER_POLICY):
+    """egreedy -> EpsGreedyBandit; linucb / thompson -> ContextualRouter. Same select/observe/flush interface."""
+    if kind in ("linucb", "thompson"):
+        return learn_contextual_from_csv(mode=kind)
+    return offline_learn_from_csv()
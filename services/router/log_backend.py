@@ -0,0 +1,459 @@
+# services/router/log_backend.py
+"""
+Buffered, rotating log backend for the route log (CSV) and app event log (JSONL).
+
+Writers: enqueue() only appends to an in-memory buffer. One background thread
+per log drains it every LOG_FLUSH_INTERVAL_S or LOG_FLUSH_ROWS rows and writes
+the whole batch with a single O_APPEND write under an flock, so concurrent
+processes never interleave partial rows.
+
+Files, for data/logs/route_log.csv:
+  route_log.csv                          active segment
+  route_log.<stamp>.csv                  rotated (size LOG_ROTATE_MB, age LOG_ROTATE_HOURS,
+                                         or a header that no longer matches the schema)
+  route_log.<stamp>.parquet / .csv.gz    compacted: rotated segments beyond
+                                         LOG_KEEP_SEGMENTS merged into one typed file
+                                         (Parquet when pyarrow is installed)
+
+LOG_SINK=sqlite also inserts every batch into a typed table in LOG_SQLITE_PATH
+(WAL); LOG_SINK=parquet prefers Parquet for compaction (the default when
+pyarrow is available anyway).
+
+Readers: read_since(path, schema, cursor) returns typed rows appended after
+`cursor` across rotation/compaction; Tail wraps that for incremental consumers
+(stats store, bandit, contextual router) that also apply rows online.
+"""
+import os
+import io
+import csv
+import glob
+import gzip
+import json
+import time
+import atexit
+import fcntl
+import sqlite3
+import threading
+from collections import deque, namedtuple
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# pandas is imported where frames are built: writing rows (the request path)
+# never needs it, so importing the logger stays cheap
+try:
+    import pyarrow  # noqa: F401  (optional: Parquet compaction)
+    HAVE_PARQUET = True
+except ImportError:
+    HAVE_PARQUET = False
+
+LOG_DIR = os.path.join("data", "logs")
+FLUSH_ROWS = int(os.getenv("LOG_FLUSH_ROWS", "256"))
+FLUSH_INTERVAL_S = float(os.getenv("LOG_FLUSH_INTERVAL_S", "0.5"))
+MAX_BUFFER = int(os.getenv("LOG_MAX_BUFFER", "100000"))
+ROTATE_BYTES = int(float(os.getenv("LOG_ROTATE_MB", "64")) * 1024 * 1024)
+ROTATE_S = float(os.getenv("LOG_ROTATE_HOURS", "24")) * 3600
+KEEP_SEGMENTS = int(os.getenv("LOG_KEEP_SEGMENTS", "4"))
+SINK = os.getenv("LOG_SINK", "").lower()            # "" | sqlite | parquet
+SQLITE_PATH = os.getenv("LOG_SQLITE_PATH", os.path.join(LOG_DIR, "logs.sqlite"))
+
+_SQL_TYPES = {"int": "INTEGER", "float": "REAL", "str": "TEXT", "datetime": "TEXT"}
+
+
+class LogSchema:
+    """Ordered, typed columns (int | float | str | datetime) of one log."""
+
+    def __init__(self, name: str, fields: List[Tuple[str, str]], fmt: str = "csv", ts_field: str = "ts"):
+        self.name = name
+        self.fields = fields
+        self.columns = [c for c, _ in fields]
+        self.fmt = fmt              # csv | jsonl
+        self.ts_field = ts_field
+
+    def coerce(self, df: "pd.DataFrame") -> "pd.DataFrame":
+        """Typed frame with exactly the schema's columns (missing ones filled)."""
+        import pandas as pd
+        out = {}
+        for col, typ in self.fields:
+            s = df[col] if col in df else pd.Series([None] * len(df), index=df.index, dtype=object)
+            if typ == "int":
+                s = pd.to_numeric(s, errors="coerce").fillna(0).astype("int64")
+            elif typ == "float":
+                s = pd.to_numeric(s, errors="coerce").astype("float64")
+            elif typ == "datetime":
+                s = pd.to_datetime(s, errors="coerce")
+            else:
+                s = s.where(s.notna(), "").astype(str)
+            out[col] = s
+        return pd.DataFrame(out, index=df.index)
+
+
+# ---------------- segments ----------------
+Segment = namedtuple("Segment", "stamp kind file inode size")   # kind: raw | parquet | gz
+ACTIVE = "~"                                                     # sorts after every stamp
+
+
+def _split(path: str) -> Tuple[str, str]:
+    base, ext = os.path.splitext(path)
+    return base, ext
+
+
+def _stamp() -> str:
+    return datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+
+
+def segments(path: str) -> List[Segment]:
+    """All segments of a log, oldest first; the active file (if any) is last."""
+    base, ext = _split(path)
+    out = []
+    for f in glob.glob(glob.escape(base) + ".*"):
+        rest = f[len(base) + 1:]
+        stamp, _, suffix = rest.partition(".")
+        if len(stamp) != 21 or not stamp[:8].isdigit():
+            continue
+        if "." + suffix == ext:
+            kind = "raw"
+        elif suffix == "parquet":
+            kind = "parquet"
+        elif suffix == "csv.gz":
+            kind = "gz"
+        else:
+            continue
+        try:
+            st = os.stat(f)
+        except FileNotFoundError:
+            continue
+        out.append(Segment(stamp, kind, f, st.st_ino, st.st_size))
+    out.sort()
+    if os.path.exists(path):
+        st = os.stat(path)
+        out.append(Segment(ACTIVE, "raw", path, st.st_ino, st.st_size))
+    return out
+
+
+def _read_raw(file: str, schema: LogSchema, offset: int = 0):
+    """
+    (typed rows after byte `offset` or None, offset just past the last complete
+    row). A trailing partial line (a writer mid-append) is left for next time.
+    """
+    import pandas as pd
+    with open(file, "rb") as f:
+        header_line = f.readline() if schema.fmt == "csv" else b""
+        f.seek(max(offset, f.tell()))
+        chunk = f.read()
+        start = f.tell() - len(chunk)
+    cut = chunk.rfind(b"\n") + 1
+    if not cut:
+        return None, start
+    if schema.fmt == "csv":
+        header = next(csv.reader([header_line.decode("utf-8")]), [])
+        df = pd.read_csv(io.BytesIO(chunk[:cut]), names=header, header=None, dtype=str, keep_default_na=False)
+    else:
+        df = pd.DataFrame([json.loads(line) for line in chunk[:cut].splitlines() if line.strip()])
+    return schema.coerce(df), start + cut
+
+
+def _read_compacted(seg: Segment, schema: LogSchema) -> "pd.DataFrame":
+    import pandas as pd
+    if seg.kind == "parquet":
+        return schema.coerce(pd.read_parquet(seg.file))
+    return schema.coerce(pd.read_csv(seg.file, compression="gzip", dtype=str, keep_default_na=False))
+
+
+def read_since(path: str, schema: LogSchema, cursor: Optional[dict] = None):
+    """
+    (typed DataFrame of rows after `cursor` or None, new cursor, reset).
+
+    cursor = {"inode", "offset"} of the last raw segment read; rotation keeps
+    the inode, so reading resumes in the rotated file and continues through
+    newer segments. reset=True means the cursor was unknown (first read, or its
+    segment was compacted away) and every row of the log was returned.
+    """
+    import pandas as pd
+    for attempt in range(3):        # a concurrent compaction can delete a segment mid-read
+        try:
+            segs = segments(path)
+            start, offset, reset = 0, 0, True
+            if cursor:
+                for i, s in enumerate(segs):
+                    if s.kind == "raw" and s.inode == cursor.get("inode") and s.size >= cursor.get("offset", 0):
+                        start, offset, reset = i, int(cursor.get("offset", 0)), False
+                        break
+            frames, new_cursor = [], (None if reset else cursor)
+            for i, s in enumerate(segs[start:]):
+                if s.kind == "raw":
+                    df, end = _read_raw(s.file, schema, offset if i == 0 else 0)
+                    new_cursor = {"inode": s.inode, "offset": end}
+                else:
+                    df = _read_compacted(s, schema)
+                if df is not None and len(df):
+                    frames.append(df)
+            df = pd.concat(frames, ignore_index=True) if frames else None
+            return df, new_cursor, reset
+        except FileNotFoundError:
+            if attempt == 2:
+                raise
+    return None, cursor, False
+
+
+class Tail:
+    """
+    Incremental reader state for a consumer that also applies rows online:
+    ids of rows applied via the request path are skipped when read back, and
+    a row the reader got to first is refused by mark(). state() / Tail(state=...)
+    round-trip through the consumer's own model file.
+
+    Pending ids of rows the writer dropped (MAX_BUFFER) never come back, so
+    at most PENDING are kept, oldest evicted first.
+    """
+    SEEN = 50000
+    PENDING = 2 * MAX_BUFFER
+
+    def __init__(self, path: str, schema: LogSchema, state: Optional[dict] = None):
+        self.path = path
+        self.schema = schema
+        state = state or {}
+        self.cursor = state.get("cursor")
+        self.pending = dict.fromkeys(state.get("pending", []))     # insertion-ordered set
+        self._seen = deque(maxlen=self.SEEN)     # ids recently read from the log
+        self._seen_set = set()
+
+    def mark(self, row_id: str) -> bool:
+        """Claim a row for an online update; False if it was already read from the log."""
+        if not row_id:
+            return True
+        if row_id in self._seen_set:
+            return False
+        self.pending[row_id] = None
+        if len(self.pending) > self.PENDING:
+            del self.pending[next(iter(self.pending))]
+        return True
+
+    def read(self):
+        """(rows not yet applied or None, reset). On reset the consumer must rebuild from these rows."""
+        df, self.cursor, reset = read_since(self.path, self.schema, self.cursor)
+        if reset:
+            self.pending.clear()
+        if df is None or not len(df):
+            return None, reset
+        if "row_id" in df:
+            seen = df["row_id"].isin(self.pending.keys())
+            for rid in df.loc[seen, "row_id"]:
+                self.pending.pop(rid, None)
+            df = df[~seen]
+            for rid in df["row_id"].tail(self.SEEN):
+                if rid:
+                    if len(self._seen) == self.SEEN:
+                        self._seen_set.discard(self._seen[0])
+                    self._seen.append(rid)
+                    self._seen_set.add(rid)
+        return df, reset
+
+    def state(self) -> dict:
+        return {"cursor": self.cursor, "pending": list(self.pending)}
+
+
+# ---------------- writer ----------------
+class LogWriter:
+    def __init__(self, path: str, schema: LogSchema, sink: str = SINK):
+        self.path = path
+        self.schema = schema
+        self.sink = sink
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self._buf = deque()
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._checked_inode = None       # active file whose header matched the schema
+        self._birth: Dict[int, float] = {}
+        self._sql: Optional[sqlite3.Connection] = None
+        atexit.register(self.close)
+
+    # --- request path ---
+    def enqueue(self, row: dict):
+        with self._cond:
+            if len(self._buf) >= MAX_BUFFER:
+                self._buf.popleft()
+                self.dropped += 1
+            self._buf.append(row)
+            if len(self._buf) >= FLUSH_ROWS:
+                self._cond.notify()
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name=f"log-{self.schema.name}", daemon=True)
+                self._thread.start()
+
+    # --- background ---
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._buf) >= FLUSH_ROWS or self._closed, timeout=FLUSH_INTERVAL_S)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception:
+                pass
+            if closed:
+                return
+
+    def flush(self):
+        """Write everything buffered so far (also called at exit)."""
+        with self._io_lock:
+            with self._cond:
+                rows = list(self._buf)
+                self._buf.clear()
+            if not rows:
+                return
+            self._write(rows)
+            if self.sink == "sqlite":
+                self._write_sqlite(rows)
+            self.written += len(rows)
+            self.flushes += 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def _encode(self, rows: List[dict]) -> bytes:
+        if self.schema.fmt == "jsonl":
+            return "".join(json.dumps({c: r.get(c) for c in self.schema.columns}, default=str) + "\n"
+                           for r in rows).encode("utf-8")
+        buf = io.StringIO()
+        w = csv.DictWriter(buf, fieldnames=self.schema.columns, extrasaction="ignore")
+        w.writerows(rows)
+        return buf.getvalue().encode("utf-8")
+
+    def _header(self) -> bytes:
+        if self.schema.fmt != "csv":
+            return b""
+        buf = io.StringIO()
+        csv.writer(buf).writerow(self.schema.columns)
+        return buf.getvalue().encode("utf-8")
+
+    def _write(self, rows: List[dict]):
+        data = self._encode(rows)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._maybe_rotate(len(data))
+                fresh = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+                with open(self.path, "ab", buffering=0) as f:
+                    f.write((self._header() if fresh else b"") + data)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # --- rotation / compaction (under the file lock) ---
+    def _first_ts(self, inode: int) -> float:
+        if inode not in self._birth:
+            born = time.time()
+            try:
+                with open(self.path, "rb") as f:
+                    lines = [f.readline(), f.readline()] if self.schema.fmt == "csv" else [b"", f.readline()]
+                if lines[1].strip():
+                    if self.schema.fmt == "csv":
+                        header = next(csv.reader([lines[0].decode("utf-8")]))
+                        row = dict(zip(header, next(csv.reader([lines[1].decode("utf-8")]))))
+                    else:
+                        row = json.loads(lines[1])
+                    import pandas as pd
+                    ts = pd.to_datetime(row.get(self.schema.ts_field), errors="coerce")
+                    if pd.notna(ts):
+                        born = (ts - pd.Timestamp(0)).total_seconds()
+            except Exception:
+                pass
+            self._birth = {inode: born}
+        return self._birth[inode]
+
+    def _maybe_rotate(self, incoming: int):
+        if not os.path.exists(self.path):
+            return
+        st = os.stat(self.path)
+        if st.st_size == 0:
+            return
+        reason = None
+        if self.schema.fmt == "csv" and self._checked_inode != st.st_ino:
+            with open(self.path, newline="") as f:
+                header = next(csv.reader(f), [])
+            if header != self.schema.columns:
+                reason = "schema"
+            else:
+                self._checked_inode = st.st_ino
+        if reason is None and st.st_size + incoming > ROTATE_BYTES:
+            reason = "size"
+        if reason is None and time.time() - self._first_ts(st.st_ino) > ROTATE_S:
+            reason = "age"
+        if reason:
+            base, ext = _split(self.path)
+            os.rename(self.path, f"{base}.{_stamp()}{ext}")
+            self._checked_inode = None
+            self._compact()
+
+    def _compact(self):
+        raw = [s for s in segments(self.path) if s.kind == "raw" and s.stamp != ACTIVE]
+        if len(raw) <= KEEP_SEGMENTS:
+            return
+        merge = raw[:len(raw) - KEEP_SEGMENTS]
+        import pandas as pd
+        df = pd.concat([_read_raw(s.file, self.schema)[0] for s in merge
+                        if os.path.getsize(s.file)], ignore_index=True)
+        base, _ = _split(self.path)
+        use_parquet = HAVE_PARQUET and self.sink in ("", "parquet")
+        out = f"{base}.{merge[0].stamp}." + ("parquet" if use_parquet else "csv.gz")
+        tmp = out + ".tmp"
+        if use_parquet:
+            df.to_parquet(tmp, index=False)
+        else:
+            with gzip.open(tmp, "wt", encoding="utf-8", newline="") as f:
+                df.to_csv(f, index=False)
+        os.replace(tmp, out)
+        for s in merge:
+            os.remove(s.file)
+
+    # --- optional SQLite sink ---
+    def _write_sqlite(self, rows: List[dict]):
+        if self._sql is None:
+            os.makedirs(os.path.dirname(SQLITE_PATH) or ".", exist_ok=True)
+            self._sql = sqlite3.connect(SQLITE_PATH, check_same_thread=False)
+            self._sql.execute("PRAGMA journal_mode=WAL")
+            self._sql.execute("PRAGMA synchronous=NORMAL")
+            cols = ", ".join(f'"{c}" {_SQL_TYPES[t]}' for c, t in self.schema.fields)
+            self._sql.execute(f'CREATE TABLE IF NOT EXISTS "{self.schema.name}" ({cols})')
+            have = {r[1] for r in self._sql.execute(f'PRAGMA table_info("{self.schema.name}")')}
+            for c, t in self.schema.fields:     # schema grew: add the new columns
+                if c not in have:
+                    self._sql.execute(f'ALTER TABLE "{self.schema.name}" ADD COLUMN "{c}" {_SQL_TYPES[t]}')
+        import pandas as pd
+        typed = self.schema.coerce(pd.DataFrame(rows))
+        for c, t in self.schema.fields:
+            if t == "datetime":
+                typed[c] = typed[c].astype(str)
+        marks = ", ".join("?" for _ in self.schema.columns)
+        with self._sql:
+            names = ", ".join(f'"{c}"' for c in self.schema.columns)
+            self._sql.executemany(f'INSERT INTO "{self.schema.name}" ({names}) VALUES ({marks})',
+                                  typed.astype(object).where(typed.notna(), None).itertuples(index=False, name=None))
+
+    def stats(self) -> dict:
+        return {"buffered": len(self._buf), "written": self.written, "flushes": self.flushes, "dropped": self.dropped}
+
+
+_writers: Dict[str, LogWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path: str, schema: LogSchema) -> LogWriter:
+    """One writer (and flush thread) per log file per process."""
+    w = _writers.get(path)
+    if w is None:
+        with _writers_lock:
+            w = _writers.get(path)
+            if w is None:
+                w = _writers[path] = LogWriter(path, schema)
+    return w
@@ -1,29 +1,57 @@
 # services/router/logger.py
-import csv
+import json
 import os
+import time
+import uuid
 from datetime import datetime
 
+from services.common.tracing import current_trace_id
+from services.router.log_backend import LogSchema, get_writer
+
 LOG_DIR = os.path.join("data", "logs")
 LOG_PATH = os.path.join(LOG_DIR, "route_log.csv")
 
-FIELDS = ["ts", "question", "rewritten", "decision", "had_answer", "latency_ms"]
-
-def _ensure_header():
-    os.makedirs(LOG_DIR, exist_ok=True)
-    if not os.path.exists(LOG_PATH) or os.path.getsize(LOG_PATH) == 0:
-        with open(LOG_PATH, "w", newline="") as f:
-            csv.writer(f).writerow(FIELDS)
+# won_by / tool_ms come from the fan-out executor: which tool's answer was used,
+# and per-tool wall time as JSON ({"graph": 41, "vector": 7, ...}).
+# row_id lets consumers that apply rows online skip them when reading the log back.
+# trace_id joins the row to its tracing spans (services/common/tracing.py).
+ROUTE_SCHEMA = LogSchema("route_log", [
+    ("ts", "datetime"),
+    ("row_id", "str"),
+    ("question", "str"),
+    ("rewritten", "str"),
+    ("decision", "str"),
+    ("had_answer", "int"),
+    ("latency_ms", "int"),
+    ("won_by", "str"),
+    ("tool_ms", "str"),
+    ("trace_id", "str"),
+])
+FIELDS = ROUTE_SCHEMA.columns
 
-def log_route(question: str, decision: str, had_answer: int, latency_ms: int, rewritten: str = ""):
-    _ensure_header()
-    ts = datetime.utcnow().isoformat()
-    with open(LOG_PATH, "a", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=FIELDS)
-        w.writerow({
-            "ts": ts,
-            "question": question,
-            "rewritten": rewritten or "",
-            "decision": decision,
-            "had_answer": had_answer,
-            "latency_ms": latency_ms,
-        })
\ No newline at end of file
+def log_route(question: str, decision: str, had_answer: int, latency_ms: int, rewritten: str = "",
+              won_by: str = "", tool_ms: dict | None = None, trace_id: str | None = None) -> str:
+    """
+    Enqueue one row for the background log writer (services/router/log_backend.py)
+    and fold it into the routing stats store; returns the row's id.
+    """
+    now = time.time()
+    row_id = uuid.uuid4().hex
+    get_writer(LOG_PATH, ROUTE_SCHEMA).enqueue({
+        "ts": datetime.utcfromtimestamp(now).isoformat(),
+        "row_id": row_id,
+        "question": question,
+        "rewritten": rewritten or "",
+        "decision": decision,
+        "had_answer": had_answer,
+        "latency_ms": latency_ms,
+        "won_by": won_by or "",
+        "tool_ms": json.dumps(tool_ms, separators=(",", ":")) if tool_ms else "",
+        "trace_id": trace_id or current_trace_id() or "",
+    })
+    try:
+        from services.router.stats import get_route_stats
+        get_route_stats().record(decision, had_answer, latency_ms, ts=now, question=question, row_id=row_id)
+    except Exception:
+        pass
+    return row_id
@@ -1,27 +1,16 @@
 # services/router/rl_policy.py
-import csv, os
-from collections import defaultdict
+from services.router.stats import get_route_stats
 
-LOG_PATH = os.path.join("data", "logs", "route_log.csv")
+def success_rate(decision: str, view: str = "all") -> float:
+    """
+    Return success rate for 'graph' or 'vector' from the routing stats store
+    (view: all | window | ewma). 0.5 (neutral) when the decision has no rows.
+    """
+    return get_route_stats().success_rate(decision, view=view, default=0.5)
 
-def success_rate(decision: str) -> float:
-    """Return success rate for 'graph' or 'vector' based on route_log.csv."""
-    if not os.path.exists(LOG_PATH):
-        return 0.5  # neutral default
-    total = wins = 0
-    with open(LOG_PATH) as f:
-        r = csv.DictReader(f)
-        for row in r:
-            if row.get("decision") == decision:
-                total += 1
-                # had_answer may be '1'/'0' or 'True'/'False'
-                had = str(row.get("had_answer", "0")).strip().lower()
-                wins += 1 if had in ("1","true","yes") else 0
-    return (wins / total) if total else 0.5
-
-def prefer_order():
+def prefer_order(view: str = "all"):
     """Return ['graph','vector'] or ['vector','graph'] based on observed success."""
-    g = success_rate("graph")
-    v = success_rate("vector")
+    g = success_rate("graph", view)
+    v = success_rate("vector", view)
     # tie-break: prefer graph
-    return ["graph","vector"] if g >= v else ["vector","graph"]
\ No newline at end of file
+    return ["graph","vector"] if g >= v else ["vector","graph"]
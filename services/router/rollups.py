@@ -0,0 +1,205 @@
+# services/router/rollups.py
+"""
+Time-bucketed route-log rollups for the Router Dashboard.
+
+Per (resolution, bucket start, decision): count, successes, latency sum and a
+latency histogram (the tracing.Histogram buckets, via services/router/stats.py), so
+p50/p95/p99 can be computed for any range by merging histograms.
+Resolutions: minute (kept ROLLUP_MINUTE_DAYS) and hour (kept ROLLUP_HOUR_DAYS).
+
+update() tails the route log from the cursor stored next to the rollups
+(data/logs/route_rollups.sqlite) and folds only new rows, all in one
+transaction, so any number of processes can call it without double counting.
+
+  python -m services.router.rollups        # catch up once (e.g. from cron)
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.router.log_backend import Tail
+from services.router.logger import LOG_PATH, ROUTE_SCHEMA
+from services.router.stats import HIST_FORMAT, bucket_array, hist_quantile, migrate_hist
+
+ROLLUP_PATH = os.getenv("ROLLUP_PATH", os.path.join("data", "logs", "route_rollups.sqlite"))
+RESOLUTIONS = {"minute": 60, "hour": 3600}
+RETENTION_DAYS = {
+    "minute": float(os.getenv("ROLLUP_MINUTE_DAYS", "7")),
+    "hour": float(os.getenv("ROLLUP_HOUR_DAYS", "365")),
+}
+PERCENTILES = (0.5, 0.95, 0.99)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup (
+    res TEXT NOT NULL,
+    bucket INTEGER NOT NULL,          -- bucket start, unix seconds (UTC)
+    decision TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    ok INTEGER NOT NULL,
+    lat_sum REAL NOT NULL,
+    hist TEXT NOT NULL,               -- {"latency bucket": count}
+    PRIMARY KEY (res, bucket, decision)
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class Rollups:
+    def __init__(self, path: str = ROLLUP_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    # ---------- writes ----------
+    def update(self) -> int:
+        """Fold route-log rows appended since the stored cursor. Returns rows folded."""
+        with self._lock:
+            c = self._conn
+            c.execute("BEGIN IMMEDIATE")        # one updater at a time, across processes
+            try:
+                self._migrate(c)
+                row = c.execute("SELECT value FROM meta WHERE key = 'tail'").fetchone()
+                tail = Tail(LOG_PATH, ROUTE_SCHEMA, json.loads(row[0]) if row else None)
+                df, reset = tail.read()
+                if reset:
+                    c.execute("DELETE FROM rollup")
+                n = self._fold(df) if df is not None else 0
+                c.execute("INSERT OR REPLACE INTO meta VALUES ('tail', ?)", (json.dumps(tail.state()),))
+                self._expire()
+                c.execute("COMMIT")
+                return n
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _migrate(c: sqlite3.Connection):
+        """Re-bucket histograms written before HIST_FORMAT (inside update()'s transaction)."""
+        row = c.execute("SELECT value FROM meta WHERE key = 'hist'").fetchone()
+        if row and row[0] == HIST_FORMAT:
+            return
+        for res, bucket, decision, hist in c.execute("SELECT res, bucket, decision, hist FROM rollup").fetchall():
+            h = migrate_hist({int(b): n for b, n in json.loads(hist).items()})
+            c.execute("UPDATE rollup SET hist=? WHERE res=? AND bucket=? AND decision=?",
+                      (json.dumps({str(b): n for b, n in h.items()}), res, bucket, decision))
+        c.execute("INSERT OR REPLACE INTO meta VALUES ('hist', ?)", (HIST_FORMAT,))
+
+    def _fold(self, df: pd.DataFrame) -> int:
+        df = df[df["ts"].notna()]
+        if not len(df):
+            return 0
+        secs = ((df["ts"] - pd.Timestamp(0)).dt.total_seconds()).to_numpy().astype(np.int64)
+        frame = pd.DataFrame({
+            "decision": df["decision"].str.lower().to_numpy(),
+            "ok": df["had_answer"].ne(0).to_numpy(dtype=np.int64),
+            "lat": df["latency_ms"].to_numpy(dtype=float),
+            "lb": bucket_array(df["latency_ms"].to_numpy(dtype=float)),
+        })
+        for res, width in RESOLUTIONS.items():
+            frame["bucket"] = secs // width * width
+            totals = frame.groupby(["bucket", "decision"]).agg(n=("ok", "size"), ok=("ok", "sum"), lat=("lat", "sum"))
+            hists = {}
+            for (bucket, decision, lb), cnt in frame.groupby(["bucket", "decision", "lb"]).size().items():
+                hists.setdefault((bucket, decision), {})[str(int(lb))] = int(cnt)
+            # existing rows for the touched range, fetched in one query and merged in memory
+            old = {(b, d): r for b, d, *r in self._conn.execute(
+                "SELECT bucket, decision, n, ok, lat_sum, hist FROM rollup WHERE res=? AND bucket BETWEEN ? AND ?",
+                (res, int(frame["bucket"].min()), int(frame["bucket"].max())))}
+            out = []
+            for (bucket, decision), t in zip(totals.index, totals.itertuples(index=False)):
+                key = (int(bucket), decision)
+                n, ok, lat_sum, hist = int(t.n), int(t.ok), float(t.lat), hists[(bucket, decision)]
+                if key in old:
+                    o_n, o_ok, o_lat, o_hist = old[key]
+                    merged = json.loads(o_hist)
+                    for b, cnt in hist.items():
+                        merged[b] = merged.get(b, 0) + cnt
+                    n, ok, lat_sum, hist = o_n + n, o_ok + ok, o_lat + lat_sum, merged
+                out.append((res, key[0], decision, n, ok, lat_sum, json.dumps(hist, separators=(",", ":"))))
+            self._conn.executemany("INSERT OR REPLACE INTO rollup VALUES (?, ?, ?, ?, ?, ?, ?)", out)
+        return len(df)
+
+    def _expire(self):
+        now = time.time()
+        for res, days in RETENTION_DAYS.items():
+            self._conn.execute("DELETE FROM rollup WHERE res=? AND bucket < ?", (res, int(now - days * 86400)))
+
+    # ---------- reads ----------
+    def _rows(self, res: str, start: Optional[float], end: Optional[float], decisions: Optional[Iterable[str]]):
+        # ranges snap to whole buckets: the bucket containing `start` is included
+        width = RESOLUTIONS[res]
+        q = "SELECT bucket, decision, n, ok, lat_sum, hist FROM rollup WHERE res=? AND bucket >= ? AND bucket < ?"
+        args = [res, int(start or 0) // width * width, int(end or 2 ** 62)]
+        if decisions is not None:
+            decisions = list(decisions)
+            if not decisions:
+                return []
+            q += f" AND decision IN ({','.join('?' * len(decisions))})"
+            args += decisions
+        with self._lock:
+            return self._conn.execute(q + " ORDER BY bucket", args).fetchall()
+
+    @staticmethod
+    def _row(n, ok, lat_sum, hist) -> dict:
+        out = {"n": n, "success_rate": ok / n if n else None, "mean_latency_ms": lat_sum / n if n else None}
+        for p in PERCENTILES:
+            out[f"p{int(p * 100)}_ms"] = hist_quantile(hist, p)
+        return out
+
+    def series(self, res: str = "minute", start: Optional[float] = None, end: Optional[float] = None,
+               decisions: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """One row per (bucket, decision): n, success_rate, mean/p50/p95/p99 latency."""
+        rows = []
+        for bucket, decision, n, ok, lat_sum, hist in self._rows(res, start, end, decisions):
+            h = {int(b): c for b, c in json.loads(hist).items()}
+            rows.append({"time": pd.Timestamp(bucket, unit="s"), "decision": decision, **self._row(n, ok, lat_sum, h)})
+        return pd.DataFrame(rows)
+
+    def summary(self, res: str = "minute", start: Optional[float] = None, end: Optional[float] = None,
+                decisions: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """One row per decision over [start, end), histograms merged across buckets."""
+        acc = {}
+        for _, decision, n, ok, lat_sum, hist in self._rows(res, start, end, decisions):
+            a = acc.setdefault(decision, [0, 0, 0.0, {}])
+            a[0] += n
+            a[1] += ok
+            a[2] += lat_sum
+            for b, c in json.loads(hist).items():
+                a[3][int(b)] = a[3].get(int(b), 0) + c
+        return pd.DataFrame([{"decision": d, **self._row(*a)} for d, a in sorted(acc.items())])
+
+    def decisions(self) -> list:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT DISTINCT decision FROM rollup ORDER BY decision")]
+
+
+_rollups: Optional[Rollups] = None
+_lock = threading.Lock()
+
+
+def get_rollups(refresh: bool = True) -> Rollups:
+    """Process-wide store; refresh=True folds in new log rows first."""
+    global _rollups
+    if _rollups is None:
+        with _lock:
+            if _rollups is None:
+                _rollups = Rollups()
+    if refresh:
+        _rollups.update()
+    return _rollups
+
+
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    n = get_rollups(refresh=False).update()
+    print(f"folded {n} rows in {(time.perf_counter() - t0) * 1000:.0f} ms")
@@ -0,0 +1,316 @@
+# services/router/stats.py
+"""
+Incremental routing statistics (replaces rescanning route_log.csv).
+
+Per decision it keeps running totals (count, successes, latency sum, reward
+sum), a latency histogram for percentiles (tracing.Histogram buckets), exponentially decayed
+counters (ROUTE_STATS_HALF_LIFE_S) and per-minute buckets for a sliding
+window (ROUTE_STATS_WINDOW_MIN), plus a short ring of recent rows.
+
+log_route() feeds every row in O(1). The store keeps a log_backend.Tail (log
+cursor + ids of rows applied online), so a fresh process, or rows written by
+another process, are folded in from the log in one vectorised pass, and
+nothing is counted twice. Persisted as compact JSON with debounced, atomic
+writes; every save first catches up with the log.
+"""
+import os
+import json
+import time
+import atexit
+import threading
+from collections import deque
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from services.common.tracing import Histogram
+from services.router.bandit import ARM_ALIASES, reward_from_row, rewards_from_frame
+from services.router.log_backend import Tail
+from services.router.logger import LOG_PATH, ROUTE_SCHEMA
+
+STATS_PATH = os.path.join("data", "logs", "route_stats.json")
+HALF_LIFE_S = float(os.getenv("ROUTE_STATS_HALF_LIFE_S", "3600"))
+WINDOW_MIN = int(os.getenv("ROUTE_STATS_WINDOW_MIN", "60"))
+RECENT = 50
+SAVE_INTERVAL_S = float(os.getenv("ROUTE_STATS_SAVE_INTERVAL_S", "5"))
+SAVE_EVERY = int(os.getenv("ROUTE_STATS_SAVE_EVERY", "100"))
+
+# latency histogram: the HDR buckets of services/common/tracing.Histogram over
+# microseconds, so the dashboard and /metrics compute quantiles the same way
+HIST_FORMAT = "hdr-us"
+_LEGACY_GROWTH = 1.2      # older files: bucket 0 is < 1 ms, bucket b covers [1.2^(b-1), 1.2^b) ms
+
+
+def bucket(ms: float) -> int:
+    return Histogram.index(max(0, int(ms * 1000)))
+
+
+def bucket_array(ms: np.ndarray) -> np.ndarray:
+    """bucket() over an array."""
+    return Histogram.index_array((np.maximum(ms, 0.0) * 1000).astype(np.int64))
+
+
+def hist_quantile(hist: dict, q: float) -> Optional[float]:
+    """Approximate quantile (ms) of a {bucket: count} histogram (within ~3%)."""
+    s = Histogram.quantile_of(hist, q)
+    return None if s is None else s * 1e3
+
+
+def migrate_hist(hist: dict) -> dict:
+    """Re-bucket a histogram written with the old 1.2x ms buckets, at each bucket's midpoint."""
+    out = {}
+    for b, c in hist.items():
+        i = bucket(0.5 if int(b) == 0 else _LEGACY_GROWTH ** (int(b) - 0.5))
+        out[i] = out.get(i, 0) + c
+    return out
+
+
+def _new_agg() -> dict:
+    return {"n": 0, "ok": 0, "lat_sum": 0.0, "reward_sum": 0.0, "hist": {},
+            "ew_t": 0.0, "ew_n": 0.0, "ew_ok": 0.0, "ew_lat": 0.0, "win": {}}
+
+
+class RouteStats:
+    def __init__(self, path: str = STATS_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._reset()
+        self._dirty = 0
+        self._last_save = time.monotonic()
+        self._load()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self.decisions = {}
+        self.recent = deque(maxlen=RECENT)
+        self.tail = Tail(LOG_PATH, ROUTE_SCHEMA)
+
+    # ---------- persistence ----------
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                d = json.load(f)
+            for dec, a in d.get("decisions", {}).items():
+                a["hist"] = {int(k): v for k, v in a.get("hist", {}).items()}
+                if d.get("hist_format") != HIST_FORMAT:
+                    a["hist"] = migrate_hist(a["hist"])
+                a["win"] = {int(k): v for k, v in a.get("win", {}).items()}
+                self.decisions[dec] = {**_new_agg(), **a}
+            self.recent.extend(d.get("recent", []))
+            self.tail = Tail(LOG_PATH, ROUTE_SCHEMA, d.get("log"))
+        except Exception:
+            self._reset()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        d = {"hist_format": HIST_FORMAT, "log": self.tail.state(),
+             "decisions": self.decisions, "recent": list(self.recent)}
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(d, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        self._dirty = 0
+        self._last_save = time.monotonic()
+
+    def _maybe_save(self):
+        self._dirty += 1
+        if self._dirty >= SAVE_EVERY or time.monotonic() - self._last_save >= SAVE_INTERVAL_S:
+            self._catch_up()
+            self._save()
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                try:
+                    self._catch_up()
+                    self._save()
+                except Exception:
+                    pass
+
+    # ---------- updates ----------
+    @staticmethod
+    def _prune(win: dict, latest_min: int):
+        if len(win) > WINDOW_MIN + 1:
+            for m in [m for m in win if m < latest_min - WINDOW_MIN]:
+                del win[m]
+
+    def _add(self, decision: str, ok: int, latency_ms: float, reward: float, ts: float, question: str = ""):
+        a = self.decisions.setdefault(decision, _new_agg())
+        a["n"] += 1
+        a["ok"] += ok
+        a["lat_sum"] += latency_ms
+        a["reward_sum"] += reward
+        b = bucket(latency_ms)
+        a["hist"][b] = a["hist"].get(b, 0) + 1
+        # decayed counters are kept as of time ew_t
+        if ts >= a["ew_t"]:
+            decay = 0.5 ** ((ts - a["ew_t"]) / HALF_LIFE_S)
+            w = 1.0
+            a["ew_n"], a["ew_ok"], a["ew_lat"], a["ew_t"] = a["ew_n"] * decay, a["ew_ok"] * decay, a["ew_lat"] * decay, ts
+        else:
+            w = 0.5 ** ((a["ew_t"] - ts) / HALF_LIFE_S)
+        a["ew_n"] += w
+        a["ew_ok"] += w * ok
+        a["ew_lat"] += w * latency_ms
+        minute = int(ts // 60)
+        slot = a["win"].setdefault(minute, [0, 0, 0.0])
+        slot[0] += 1
+        slot[1] += ok
+        slot[2] += latency_ms
+        self._prune(a["win"], minute)
+        self.recent.append({"ts": ts, "decision": decision, "had_answer": ok,
+                            "latency_ms": latency_ms, "question": (question or "")[:200]})
+
+    def record(self, decision: str, had_answer: int, latency_ms: float, ts: Optional[float] = None,
+               question: str = "", row_id: str = ""):
+        """O(1) update for one routed question (called by log_route)."""
+        ts = time.time() if ts is None else ts
+        ok = 1 if int(had_answer) else 0
+        with self._lock:
+            if not self.tail.mark(row_id):
+                return      # already folded in from the log
+            self._add(str(decision).lower(), ok, float(latency_ms),
+                      reward_from_row({"had_answer": ok, "latency_ms": latency_ms}), ts, question)
+            self._maybe_save()
+
+    def _catch_up(self):
+        try:
+            self._fold(*self.tail.read())
+        except Exception:
+            pass
+
+    def sync(self) -> int:
+        """Fold log rows appended since the cursor (every row if it was lost). Returns rows read."""
+        with self._lock:
+            df, reset = self.tail.read()
+            self._fold(df, reset)
+            if df is not None and len(df):
+                self._maybe_save()
+            return 0 if df is None else len(df)
+
+    def _fold(self, df: Optional[pd.DataFrame], reset: bool):
+        if reset:
+            self.decisions = {}
+            self.recent.clear()
+        if df is None or not len(df):
+            return
+        secs = (df["ts"] - pd.Timestamp(0)).dt.total_seconds().fillna(time.time()).to_numpy()
+        frame = pd.DataFrame({
+            "decision": df["decision"].str.lower(),
+            "ok": df["had_answer"].ne(0).astype(int),
+            "lat": df["latency_ms"].astype(float),
+            "reward": rewards_from_frame(df),
+            "ts": secs,
+        })
+        for dec, g in frame.groupby("decision"):
+            self._add_frame(dec, g)
+        for r in frame.join(df["question"]).tail(RECENT).itertuples(index=False):
+            self.recent.append({"ts": r.ts, "decision": r.decision, "had_answer": int(r.ok),
+                                "latency_ms": r.lat, "question": r.question[:200]})
+
+    def _add_frame(self, dec: str, g: pd.DataFrame):
+        a = self.decisions.setdefault(dec, _new_agg())
+        ok, lat, ts = g["ok"].to_numpy(), g["lat"].to_numpy(), g["ts"].to_numpy()
+        a["n"] += len(g)
+        a["ok"] += int(ok.sum())
+        a["lat_sum"] += float(lat.sum())
+        a["reward_sum"] += float(g["reward"].sum())
+        for b, c in zip(*np.unique(bucket_array(lat), return_counts=True)):
+            a["hist"][int(b)] = a["hist"].get(int(b), 0) + int(c)
+        t_new = max(float(ts.max()), a["ew_t"])
+        decay = 0.5 ** ((t_new - a["ew_t"]) / HALF_LIFE_S)
+        w = 0.5 ** ((t_new - ts) / HALF_LIFE_S)
+        a["ew_n"] = a["ew_n"] * decay + float(w.sum())
+        a["ew_ok"] = a["ew_ok"] * decay + float((w * ok).sum())
+        a["ew_lat"] = a["ew_lat"] * decay + float((w * lat).sum())
+        a["ew_t"] = t_new
+        minutes = (ts // 60).astype(np.int64)
+        latest = int(minutes.max())
+        keep = minutes >= latest - WINDOW_MIN
+        per_min = pd.DataFrame({"m": minutes[keep], "ok": ok[keep], "lat": lat[keep]}).groupby("m")
+        for m, row in per_min.agg(n=("ok", "size"), ok=("ok", "sum"), lat=("lat", "sum")).iterrows():
+            slot = a["win"].setdefault(int(m), [0, 0, 0.0])
+            slot[0] += int(row["n"])
+            slot[1] += int(row["ok"])
+            slot[2] += float(row["lat"])
+        self._prune(a["win"], latest)
+
+    # ---------- views ----------
+    def view(self, decision: str, view: str = "all", now: Optional[float] = None) -> dict:
+        """{"n", "success_rate", "mean_latency_ms"} for view = all | window | ewma."""
+        a = self.decisions.get(decision)
+        if not a:
+            return {"n": 0, "success_rate": None, "mean_latency_ms": None}
+        now = time.time() if now is None else now
+        if view == "window":
+            lo = int(now // 60) - WINDOW_MIN
+            slots = [s for m, s in a["win"].items() if m >= lo]
+            n, ok, lat = sum(s[0] for s in slots), sum(s[1] for s in slots), sum(s[2] for s in slots)
+        elif view == "ewma":
+            decay = 0.5 ** (max(0.0, now - a["ew_t"]) / HALF_LIFE_S)
+            n, ok, lat = a["ew_n"] * decay, a["ew_ok"] * decay, a["ew_lat"] * decay
+        else:
+            n, ok, lat = a["n"], a["ok"], a["lat_sum"]
+        return {"n": n, "success_rate": ok / n if n else None, "mean_latency_ms": lat / n if n else None}
+
+    def success_rate(self, decision: str, view: str = "all", default: float = 0.5) -> float:
+        r = self.view(decision, view)["success_rate"]
+        return default if r is None else r
+
+    def latency_quantile(self, decision: str, q: float) -> Optional[float]:
+        """Approximate latency quantile (ms) from the latency histogram (within ~3%)."""
+        a = self.decisions.get(decision)
+        return hist_quantile(a["hist"], q) if a else None
+
+    def summary(self, view: str = "all") -> list:
+        """One row per decision, for the dashboard."""
+        with self._lock:
+            rows = []
+            for dec in sorted(self.decisions):
+                v = self.view(dec, view)
+                rows.append({"decision": dec, **v,
+                             "p50_ms": self.latency_quantile(dec, 0.5),
+                             "p95_ms": self.latency_quantile(dec, 0.95),
+                             "mean_reward": self.decisions[dec]["reward_sum"] / max(1, self.decisions[dec]["n"])})
+            return rows
+
+    def bandit_state(self, arms) -> dict:
+        """counts / values an EpsGreedyBandit would reach by replaying the log (prior: count 1, value 0)."""
+        with self._lock:
+            n, reward = dict.fromkeys(arms, 0), dict.fromkeys(arms, 0.0)
+            for d, agg in self.decisions.items():
+                a = ARM_ALIASES.get(d.lower(), d.lower())       # same folding as EpsGreedyBandit._fold
+                if a in n:
+                    n[a] += agg.get("n", 0)
+                    reward[a] += agg.get("reward_sum", 0.0)
+            counts = {a: 1 + n[a] for a in arms}
+            values = {a: reward[a] / counts[a] for a in arms}
+            return {"counts": counts, "values": values, "log": self.tail.state()}
+
+
+_stats: Optional[RouteStats] = None
+_lock = threading.Lock()
+
+
+def get_route_stats(refresh: bool = False) -> RouteStats:
+    """Process-wide store, caught up with the log on first use (or when refresh=True)."""
+    global _stats
+    if _stats is None:
+        with _lock:
+            if _stats is None:
+                s = RouteStats()
+                try:
+                    s.sync()
+                except Exception:
+                    pass
+                _stats = s
+                return s
+    if refresh:
+        try:
+            _stats.sync()
+        except Exception:
+            pass
+    return _stats
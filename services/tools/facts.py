@@ -0,0 +1,300 @@
+# services/tools/facts.py
+"""
+Numeric fact index: (entity, metric, period) -> value, built at ingest time by
+services/vector/ingest_facts.py and stored in one indexed SQLite table
+(data/facts.sqlite, FACTS_PATH).
+
+The orchestrator tries answer_from_facts() before any retrieval:
+
+  "What was Tesla revenue in 2024?"   -> the stored figure
+  "Tesla 2024 revenue + 20%"          -> eval_math("97700000000.0 + 20%")
+
+Each operand segment of the question (text between arithmetic operators) that
+names a known entity is replaced by its figure; the metric and period carry
+over from the previous segment ("Tesla 2024 revenue / Apple"), and so does the
+entity when a segment only changes the period ("Tesla revenue 2024 - 2023" is
+revenue 2024 minus revenue 2023). Years are always periods, never operands.
+A question naming an entity and a metric the table can't resolve gets no
+answer, and names_figure() tells the orchestrator not to treat it as plain
+arithmetic ("Tesla 2024 + 5", with no metric, still goes to math).
+The table is small, so each process keeps it as a dict and reloads when the
+file changes.
+"""
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.agent.analyzer import PhraseMatcher, YEAR_RE, get_analyzer
+from services.tools.math_eval import eval_math
+from services.tools.num_parse import format_human_number, parse_human_number
+
+FACTS_PATH = os.getenv("FACTS_PATH", os.path.join("data", "facts.sqlite"))
+
+# metric -> phrases that name it (lower case)
+METRICS = {
+    "revenue": ["revenue", "revenues", "sales", "turnover", "top line"],
+    "net_income": ["net income", "net profit", "profit", "earnings"],
+    "operating_income": ["operating income", "operating profit"],
+    "eps": ["eps", "earnings per share"],
+    "gross_margin": ["gross margin"],
+    "operating_margin": ["operating margin"],
+    "free_cash_flow": ["free cash flow"],
+    "capex": ["capex", "capital expenditure", "capital expenditures"],
+    "deliveries": ["deliveries", "vehicles delivered", "units delivered"],
+    "market_cap": ["market cap", "market capitalization", "market value"],
+    "employees": ["employees", "headcount"],
+}
+PCT_METRICS = {"gross_margin", "operating_margin"}      # only these take "18%" as their value
+
+SCALE_WORDS = {"thousand": "K", "million": "M", "mn": "M", "billion": "B", "bn": "B", "trillion": "T"}
+FIGURE_RE = re.compile(r"""
+    (?<![\w.])(?P<cur>[$€£])?\s*
+    (?P<num>\d[\d,]*(?:\.\d+)?)
+    (?:\s*(?P<unit>[kmbtKMBT])(?![A-Za-z])|\s+(?P<word>thousand|million|billion|trillion|bn|mn)\b)?
+    (?P<pct>\s*%|\s+percent\b)?
+""", re.X | re.I)
+QUARTER_RE = re.compile(r"\bQ([1-4])\s*(?:FY\s*)?'?((?:19|20)\d{2})\b", re.I)
+OPERATOR_RE = re.compile(r"[+*/^×÷()]|(?<![A-Za-z])-|-(?![A-Za-z])")     # not the hyphen of "Coca-Cola"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    entity TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    period TEXT NOT NULL,             -- "2024", "2024Q3" or "" when unknown
+    value REAL NOT NULL,
+    unit TEXT NOT NULL,               -- "$", "%" or ""
+    source_file TEXT NOT NULL,
+    sentence TEXT NOT NULL,
+    PRIMARY KEY (entity, metric, period, source_file)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass(frozen=True)
+class Figure:
+    start: int
+    end: int
+    value: float
+    unit: str
+
+
+@dataclass(frozen=True)
+class Fact:
+    entity: str
+    metric: str
+    period: str
+    value: float
+    unit: str = ""
+    source_file: str = ""
+
+    def label(self) -> str:
+        v = f"{self.value:g}%" if self.unit == "%" else f"{self.unit}{format_human_number(self.value)}"
+        return f"{self.entity.title()} {self.metric.replace('_', ' ')} ({self.period or 'latest'}): {v}"
+
+
+# ---------------- text helpers (shared with the ingest stage) ----------------
+_metric_matcher = PhraseMatcher({p: [m] for m, syns in METRICS.items() for p in syns})
+
+
+def _words(lower: str, hits) -> List[Tuple[int, int, object]]:
+    """Whole-word hits, longest first on overlap: [(start, end, label)]."""
+    out, taken = [], []
+    for s, e, _, payload in sorted(hits, key=lambda h: (h[0], -(h[1] - h[0]))):
+        if (s and lower[s - 1].isalnum()) or (e < len(lower) and lower[e].isalnum()):
+            continue
+        if any(s < te and e > ts for ts, te in taken):
+            continue
+        taken.append((s, e))
+        out.append((s, e, payload[0]))
+    return out
+
+
+def find_metrics(lower: str) -> List[Tuple[int, int, str]]:
+    return _words(lower, _metric_matcher.finditer(lower))
+
+
+def find_entities(lower: str, extra: Optional[PhraseMatcher] = None) -> List[Tuple[int, int, str]]:
+    """Lexicon entities (any kind) plus `extra` names, as canonical lower-case names."""
+    hits = [(s, e, p, [canon]) for s, e, p, payload in get_analyzer().matcher.finditer(lower)
+            for kind, canon in payload if kind != "intent"]
+    if extra is not None:
+        hits += extra.finditer(lower)
+    return _words(lower, hits)
+
+
+def find_period(text: str) -> str:
+    m = QUARTER_RE.search(text)
+    if m:
+        return f"{m.group(2)}Q{m.group(1)}"
+    m = YEAR_RE.search(text)
+    return m.group(0) if m else ""
+
+
+def find_figures(text: str) -> List[Figure]:
+    """Money / counts / percents with K-M-B-T or million-billion scales; bare years skipped."""
+    out = []
+    for m in FIGURE_RE.finditer(text):
+        num, unit, word = m.group("num").rstrip(",."), m.group("unit"), m.group("word")
+        scale = (unit or SCALE_WORDS.get((word or "").lower(), "")).upper()
+        if not (m.group("cur") or scale or m.group("pct")) and YEAR_RE.fullmatch(num):
+            continue
+        value = parse_human_number(num + scale)
+        if value is None:
+            continue
+        out.append(Figure(m.start("num"), m.end(), value, "%" if m.group("pct") else (m.group("cur") or "")))
+    return out
+
+
+# ---------------- store ----------------
+def write_facts(rows: List[tuple], path: str = FACTS_PATH) -> int:
+    """Replace the table with rows of (entity, metric, period, value, unit, source_file, sentence)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(_SCHEMA)
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO facts VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        n = conn.execute("SELECT COUNT(*) FROM facts").fetchone()[0]
+    finally:
+        conn.close()
+    os.replace(tmp, path)     # readers notice the new inode and reload
+    return n
+
+
+class FactStore:
+    def __init__(self, path: str = FACTS_PATH):
+        self.path = path
+        self._sig = None
+        self._facts: Dict[Tuple[str, str], Dict[str, Fact]] = {}
+        self._names: Optional[PhraseMatcher] = None
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_ino, st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _refresh(self):
+        sig = self._signature()
+        if sig == self._sig:
+            return
+        with self._lock:
+            if sig == self._sig:
+                return
+            facts: Dict[Tuple[str, str], Dict[str, Fact]] = {}
+            if sig is not None:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+                try:
+                    rows = conn.execute("SELECT entity, metric, period, value, unit, source_file FROM facts "
+                                        "ORDER BY source_file").fetchall()
+                finally:
+                    conn.close()
+                for row in rows:      # first source file (by name) wins per period
+                    f = Fact(*row)
+                    facts.setdefault((f.entity, f.metric), {}).setdefault(f.period, f)
+            self._facts = facts
+            names = {e for e, _ in facts}
+            self._names = PhraseMatcher({n: [n] for n in names}) if names else None
+            self._sig = sig
+
+    def __len__(self):
+        self._refresh()
+        return sum(len(v) for v in self._facts.values())
+
+    def lookup(self, entity: str, metric: str, period: str = "") -> Optional[Fact]:
+        """Exact period, else (no period asked) the latest known one."""
+        self._refresh()
+        by_period = self._facts.get((entity.lower(), metric))
+        if not by_period:
+            return None
+        if period:
+            return by_period.get(period) or by_period.get(period[:4])
+        return by_period[max(by_period)]
+
+    def resolve(self, question: str) -> List[Tuple[int, int, Fact]]:
+        """
+        [(segment start, end, fact)] for operand segments of the question naming a
+        figure; [] if any named figure is unknown (a partial substitution would be wrong).
+        """
+        self._refresh()
+        if not self._facts:
+            return []
+        out, entity, metric, period = [], None, None, ""
+        bounds = [0] + [i for m in OPERATOR_RE.finditer(question) for i in (m.start(), m.end())] + [len(question)]
+        for s, e in zip(bounds[::2], bounds[1::2]):
+            seg = question[s:e]
+            lower = seg.lower()
+            metrics = find_metrics(lower)
+            seg_period = find_period(seg)
+            ents = find_entities(lower, self._names)
+            metric = metrics[0][2] if metrics else metric
+            period = seg_period or period
+            if ents:
+                entity = ents[0][2]
+            elif not (metrics or seg_period):
+                continue        # a plain operand: "+ 20%", "* 2"
+            elif entity is None:
+                return []       # a metric or year of nobody
+            if metric is None:
+                continue        # an entity, but no figure named yet
+            fact = self.lookup(entity, metric, period)
+            if fact is None:
+                return []
+            out.append((s, e, fact))
+        return out
+
+    def names_figure(self, question: str) -> bool:
+        """True if the question names an entity and a metric, i.e. asks about a figure, not bare arithmetic."""
+        self._refresh()
+        lower = (question or "").lower()
+        return bool(find_metrics(lower)) and bool(find_entities(lower, self._names))
+
+
+def answer_from_facts(question: str, store: Optional["FactStore"] = None) -> Optional[dict]:
+    """
+    {"answer", "facts", "expression"} when the question is a known figure or
+    arithmetic over known figures; None otherwise (fall through to retrieval).
+    """
+    store = store or get_fact_store()
+    hits = store.resolve(question or "")
+    if not hits:
+        return None
+    parts, pos = [], 0
+    for s, e, fact in hits:
+        parts += [question[pos:s], f" {np.format_float_positional(fact.value, trim='-')} "]
+        pos = e
+    expr = "".join(parts + [question[pos:]])
+    facts = [f for _, _, f in hits]
+    value = eval_math(expr)
+    if value is not None:
+        return {"answer": value, "facts": facts, "expression": expr.strip()}
+    if len(facts) == 1:
+        return {"answer": facts[0].label(), "facts": facts, "expression": None}
+    return None
+
+
+def names_figure(question: str, store: Optional["FactStore"] = None) -> bool:
+    return (store or get_fact_store()).names_figure(question)
+
+
+_store: Optional[FactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_fact_store() -> FactStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FactStore()
+    return _store
@@ -4,107 +4,279 @@
 #   "97B + 20%"  -> 116400000000.0
 #   "97B - 20%"  -> 77600000000.0
 #   "12M + 3.5B" -> 3512000000.0
+#   "2^10"       -> 1024.0
+#
+# One regex pass tokenizes; a recursive-descent parser compiles the tokens once
+# into a constant or a closure tree, cached by token string, so repeated
+# questions cost one scan and one cache hit. No eval().
+#
+# Grammar (loosest first):
+#   expr  := term (("+" | "-") term)*      A ± B%  ->  A * (1 ± B/100)
+#   term  := unary (("*" | "/") unary)*    A * B%, A / B%  ->  plain X% = X/100
+#   unary := ("-" | "+") unary | power     -2^2 = -4
+#   power := post ("^" unary)?             right-associative; "**" is "^"
+#   post  := atom "%"?
+#   atom  := NUMBER[K|M|B|T] | NAME | "(" expr ")"
+#
+# "x" between two operands ("3 x 4") is multiplication, like "*" and "×".
+#
+# eval_math() reads free text but only evaluates one contiguous arithmetic run
+# in it: a word or stray character between operands ("Tesla 2024 revenue + 20%",
+# "1e5 + 1"), a word glued to the run ("COVID-19") or a year-like operand next
+# to words ("in 2023 - 2024 sales") means it is not math, and it returns None.
+# eval_many() compiles a formula with variables and evaluates it over NumPy
+# arrays (scenario tables).
 
+import math
+import operator
 import re
-from services.tools.num_parse import parse_human_number
+from typing import Callable, Mapping, Optional
+
+import numpy as np
+
+from services.common.lru import LRUCache
+
+_UNIT = {"k": 1e3, "m": 1e6, "b": 1e9, "t": 1e12}
 
-# Tokenize numbers (with optional K/M/B/T and optional %), operators, and parens
 TOKEN_RE = re.compile(r"""
-    \d+(?:\.\d+)?[KMBTkmbt]?%?   # 97B, 20%, 12.5M, 3.2K, 15
-  | [+\-*/()]                    # + - * / ( )
+    (?P<num>(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|\.\d+)    # 97, 1,234,567, 12.5, .5
+    (?:\s*(?P<unit>[kmbtKMBT])(?![A-Za-z]))?               # 97B, 3.2 k (not "5 to")
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<op>\*\*|[-+*/^()%×÷])
 """, re.X)
+# cheap pre-check: a number next to an operator or percent, else not math
+MATH_HINT = re.compile(r"\d\s*[kmbtKMBT]?\s*(?:[-+*/^%×÷]|[xX]\s*[\d.(])|[-+*/^×÷(]\s*\.?\d")
+_OP_ALIAS = {"**": "^", "×": "*", "÷": "/"}
+YEAR_RE = re.compile(r"(?:19|20)\d\d")
+_GAP_RE = re.compile(r"[\s$€£]*")      # allowed between tokens of a free-text expression
+_BINOPS = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv, "^": operator.pow}
 
-def _tokenize(s: str) -> list[str]:
-    """Split an expression into tokens we can rewrite/parse."""
-    return TOKEN_RE.findall(s.replace(' ', ''))
+_cache = LRUCache(maxsize=4096)
 
-def _rewrite_percent(tokens: list[str]) -> list[str]:
-    """
-    Rewrite:
-      A + B%  ->  ( A * ( 1 + B/100 ) )
-      A - B%  ->  ( A * ( 1 - B/100 ) )
-      A * B%  ->  ( A * ( B/100 ) )
-      A / B%  ->  ( A / ( B/100 ) )
-    Emits tokens (not a single string) so _to_python_expr can convert properly.
-    """
-    out = []
-    i = 0
-
-    def is_numlike(t: str) -> bool:
-        return parse_human_number(t) is not None
-
-    while i < len(tokens):
-        t = tokens[i]
-        # Pattern: base op pct%
-        if (
-            i >= 2
-            and t.endswith('%')
-            and tokens[i-1] in ['+', '-', '*', '/']
-            and is_numlike(tokens[i-2])
-        ):
-            base_val = parse_human_number(tokens[i-2])
-            op = tokens[i-1]
-            pct = float(t[:-1]) / 100.0  # "20%" -> 0.2
-
-            # remove the last two tokens we already appended (base and op)
-            out = out[:-2]
-
-            if op == '+':
-                # ( base * ( 1 + pct ) )
-                out.extend(['(', str(base_val), '*', '(', '1', '+', str(pct), ')', ')'])
-            elif op == '-':
-                # ( base * ( 1 - pct ) )
-                out.extend(['(', str(base_val), '*', '(', '1', '-', str(pct), ')', ')'])
-            elif op == '*':
-                # ( base * ( pct ) )
-                out.extend(['(', str(base_val), '*', str(pct), ')'])
-            elif op == '/':
-                # ( base / ( pct ) )
-                if pct == 0:
-                    # will be handled later as eval error; keep a safe non-zero to avoid ZeroDivision here
-                    out.extend(['(', str(base_val), '/', '1e-18', ')'])
-                else:
-                    out.extend(['(', str(base_val), '/', str(pct), ')'])
-            i += 1
-            continue
-
-        out.append(t)
-        i += 1
 
-    return out
+class _Node:
+    """Constant (fn is None) or closure over a variable mapping."""
+    __slots__ = ("value", "fn", "pct")
+
+    def __init__(self, value=None, fn: Optional[Callable] = None, pct: bool = False):
+        self.value, self.fn, self.pct = value, fn, pct
+
+    def __call__(self, env):
+        return self.value if self.fn is None else self.fn(env)
+
+
+def _apply(f, a: _Node, b: _Node) -> Optional[_Node]:
+    """Fold constants now; otherwise build a closure. None if folding fails (1/0, overflow)."""
+    if a.fn is None and b.fn is None:
+        try:
+            v = f(a.value, b.value)
+        except (ArithmeticError, ValueError):
+            return None
+        return _Node(v) if isinstance(v, float) else None   # complex from (-8)^(1/3) etc.
+    return _Node(fn=lambda env: f(a(env), b(env)))
+
+
+def _grow(a, p):
+    return a * (1 + p)
+
+
+def _shrink(a, p):
+    return a * (1 - p)
+
+
+class _Parser:
+    """Recursive descent over [(kind, value)]; every method returns a _Node or None."""
+
+    def __init__(self, tokens):
+        self.toks, self.i = tokens, 0
+
+    def peek(self):
+        return self.toks[self.i] if self.i < len(self.toks) else (None, None)
+
+    def take_op(self, ops) -> Optional[str]:
+        kind, val = self.peek()
+        if kind == "op" and val in ops:
+            self.i += 1
+            return val
+        return None
+
+    def parse(self) -> Optional[_Node]:
+        node = self.expr()
+        return node if node is not None and self.i == len(self.toks) else None
+
+    def expr(self):
+        left = self.term()
+        while left is not None:
+            op = self.take_op("+-")
+            if op is None:
+                return left
+            right = self.term()
+            if right is None:
+                return None
+            if right.pct:       # A + B% -> A * (1 + B/100)
+                left = _apply(_grow if op == "+" else _shrink, left, right)
+            else:
+                left = _apply(_BINOPS[op], left, right)
+        return None
+
+    def term(self):
+        left = self.unary()
+        while left is not None:
+            op = self.take_op("*/")
+            if op is None:
+                return left
+            right = self.unary()
+            left = None if right is None else _apply(_BINOPS[op], left, right)
+        return None
+
+    def unary(self):
+        op = self.take_op("+-")
+        if op is None:
+            return self.power()
+        node = self.unary()
+        if node is None or op == "+":
+            return node
+        if node.fn is None:
+            return _Node(-node.value, pct=node.pct)
+        fn = node.fn
+        return _Node(fn=lambda env: -fn(env), pct=node.pct)
+
+    def power(self):
+        base = self.post()
+        if base is None or not self.take_op("^"):
+            return base
+        exp = self.unary()      # 2^-1
+        return None if exp is None else _apply(operator.pow, base, exp)
+
+    def post(self):
+        node = self.atom()
+        if node is None or not self.take_op("%"):
+            return node
+        if node.fn is None:
+            return _Node(node.value / 100.0, pct=True)
+        fn = node.fn
+        return _Node(fn=lambda env: fn(env) / 100.0, pct=True)
 
-def _to_python_expr(tokens: list[str]) -> str:
-    """Convert tokens to a pure Python expression (numbers and operators)."""
-    py = []
-    for t in tokens:
-        if t in ['+', '-', '*', '/', '(', ')']:
-            py.append(t)
+    def atom(self):
+        kind, val = self.peek()
+        if kind == "num":
+            self.i += 1
+            return _Node(val)
+        if kind == "name":
+            self.i += 1
+            return _Node(fn=lambda env: env[val])
+        if self.take_op("("):
+            node = self.expr()
+            return node if node is not None and self.take_op(")") else None
+        return None
+
+
+class Compiled:
+    """A compiled expression. `variables` are the names it reads; `value` is set when it has none."""
+    __slots__ = ("source", "variables", "value", "_node")
+
+    def __init__(self, source: str, node: _Node, variables: frozenset):
+        self.source, self.variables, self._node = source, variables, node
+        self.value = node.value if node.fn is None else None
+
+    def __call__(self, **env):
+        return self._node(env)
+
+    def __repr__(self):
+        return f"Compiled({self.source!r})"
+
+
+def _lex(text: str):
+    """[(kind, value, start, end)] with numbers already scaled and "x" between operands read as "*"."""
+    out = []
+    for m in TOKEN_RE.finditer(text):
+        num, name, op = m.group("num", "name", "op")
+        if num is not None:
+            unit = m.group("unit")
+            v = float(num.replace(",", ""))
+            out.append(("num", v * _UNIT[unit.lower()] if unit else v, m.start(), m.end()))
+        elif name is not None:
+            out.append(("name", name, m.start(), m.end()))
         else:
-            # number-ish (may still carry K/M/B/T)
-            val = parse_human_number(t) if not t.endswith('%') else None
-            if val is None:
-                # Leftover '%'-style tokens should have been rewritten; if any remains, try a last fallback
-                if t.endswith('%'):
-                    # "X%" -> (X/100)
-                    x = t[:-1]
-                    try:
-                        x_val = float(x) / 100.0
-                        py.append(str(x_val))
-                        continue
-                    except Exception:
-                        raise ValueError(f"Unrecognized percent token: {t}")
-                raise ValueError(f"Unrecognized token: {t}")
-            py.append(str(val))
-    return "".join(py)
+            out.append(("op", _OP_ALIAS.get(op, op), m.start(), m.end()))
+    for i in range(1, len(out) - 1):
+        (pk, pv, _, _), (k, v, s, e), (nk, nv, _, _) = out[i - 1:i + 2]
+        if k == "name" and v in ("x", "X") and (pk == "num" or pv in (")", "%")) and (nk == "num" or nv == "("):
+            out[i] = ("op", "*", s, e)
+    return out
+
+
+def _tokenize(text: str, names: bool):
+    """[(kind, value)] with numbers already scaled; names dropped unless `names`."""
+    return [(k, v) for k, v, _, _ in _lex(text) if names or k != "name"]
+
+
+def _free_text_tokens(text: str):
+    """Tokens of the one arithmetic run in free text, or None if words or stray characters are mixed into it."""
+    lexed = _lex(text)
+    at = [i for i, t in enumerate(lexed) if t[0] != "name"]
+    if not at:
+        return None
+    run = lexed[at[0]:at[-1] + 1]
+    if any(k == "name" for k, _, _, _ in run):
+        return None     # a word between operands, or an unparsed piece such as the "e5" of 1e5
+    if any(not _GAP_RE.fullmatch(text, a[3], b[2]) for a, b in zip(run, run[1:])):
+        return None     # "5 = 3 + 2", "2024/25"-style leftovers
+    start, end = run[0][2], run[-1][3]
+    if (start and text[start - 1].isalnum()) or (end < len(text) and text[end].isalnum()):
+        return None     # glued to a word: "COVID-19", "5+3x"
+    if len(run) < len(lexed) and any(k == "num" and YEAR_RE.fullmatch(text, s, e) for k, _, s, e in run):
+        return None     # "Tesla revenue 2023 + 5%": a year in a sentence is a period, not an operand
+    return [(k, v) for k, v, _, _ in run]
+
+
+def _compile(tokens) -> Optional[Compiled]:
+    source = " ".join(repr(v) if k == "num" else v for k, v in tokens)
+
+    def build():
+        node = _Parser(tokens).parse()
+        if node is None:
+            return None
+        return Compiled(source, node, frozenset(v for k, v in tokens if k == "name"))
+
+    return _cache.get_or_compute(source, build)
+
+
+def compile_expr(text: str, names: bool = True) -> Optional[Compiled]:
+    """Compile (cached) an expression; None if it does not parse. names=False drops words (free text)."""
+    if not isinstance(text, str):
+        return None
+    return _compile(_tokenize(text, names))
+
 
 def eval_math(expr: str):
     """Return a float result if we can evaluate, else None."""
-    try:
-        if not isinstance(expr, str):
-            return None
-        tokens = _tokenize(expr)
-        tokens = _rewrite_percent(tokens)
-        py = _to_python_expr(tokens)
-        return eval(py, {"__builtins__": {}}, {})
-    except Exception:
-        return None
\ No newline at end of file
+    if not isinstance(expr, str) or not MATH_HINT.search(expr):
+        return None
+    tokens = _free_text_tokens(expr)
+    # not math: no number, or nothing to do with it (no operator / percent)
+    if not tokens or not any(k == "num" for k, _ in tokens) or not any(k == "op" and v != "(" and v != ")" for k, v in tokens):
+        return None
+    c = _compile(tokens)
+    if c is None or c.value is None or not math.isfinite(c.value):
+        return None
+    return c.value
+
+
+def eval_many(expr, inputs: Mapping[str, object]) -> np.ndarray:
+    """
+    Evaluate one formula over arrays of inputs (a dict of columns or a DataFrame),
+    broadcasting like NumPy; e.g. eval_many("revenue * (1 + growth%) - 2B", df).
+    Division by zero gives inf/nan instead of raising.
+    """
+    c = expr if isinstance(expr, Compiled) else compile_expr(expr)
+    if c is None:
+        raise ValueError(f"cannot parse expression: {expr!r}")
+    missing = [v for v in c.variables if v not in inputs]
+    if missing:
+        raise ValueError(f"missing inputs for {sorted(missing)}")
+    env = {v: np.asarray(inputs[v], dtype=float) for v in c.variables}
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        out = np.asarray(c(**env), dtype=float)
+    shape = np.broadcast_shapes(*(a.shape for a in env.values())) if env else ()
+    return np.broadcast_to(out, shape).copy() if out.shape != shape else out
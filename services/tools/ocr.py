@@ -1,16 +1,305 @@
-from typing import Tuple
-from services.tools.ocr_agent import extract_text
+# services/tools/ocr.py
+"""
+Tesseract OCR for question images and scanned documents.
+
+  extract_text(data)          -> (text, ms)          one image or a whole document;
+                                                     OcrPageError if any page failed
+  extract_pages(data)         -> [PageResult]        per-page text and timings
+  extract_batch([data, ...])  -> [[PageResult]]      many documents, one shared pool
+
+Every page is preprocessed before Tesseract sees it, as set by its mode (MODES):
+downsampled to the mode's DPI (or to OCR_MAX_MP megapixels when the file has no
+DPI), converted to grayscale and binarized with an Otsu threshold. The mode also
+picks Tesseract's page segmentation (--psm). Multi-page TIFFs and PDFs are split
+into pages. PDFs are rendered at the target DPI and need pdf2image with poppler.
+When there is more than one page, the pages run on a process pool of OCR_WORKERS
+while the parent prepares the next page. A single page runs inline.
+"""
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO
+from itertools import chain, islice
 from time import perf_counter
-from PIL import Image
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
 import pytesseract
-from io import BytesIO
+from PIL import Image, ImageSequence
 
-def extract_text(image_bytes: bytes, *, lang: str = "eng") -> Tuple[str, int]:
-    """Extract text from image bytes and return (text, latency_ms)."""
-    t0 = perf_counter()
+from services.common.tracing import record, traced
+from services.tools.ocr_cache import get_ocr_cache
+
+try:
+    from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+except ImportError:     # optional: only PDF uploads need it
+    convert_from_bytes = pdfinfo_from_bytes = None
+
+TESSERACT_CONFIG = os.getenv("OCR_TESSERACT_CONFIG", "")
+OCR_MODE = os.getenv("OCR_MODE", "document")
+WORKERS = int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_MP = float(os.getenv("OCR_MAX_MP", "12"))
+PAGE_TIMEOUT_S = float(os.getenv("OCR_PAGE_TIMEOUT_S", "120"))
+PDF_FALLBACK_DPI = 200
+
+# use case -> preprocessing + Tesseract page segmentation
+MODES = {
+    "document": {"psm": 3, "dpi": 300, "gray": True, "binarize": True},    # scanned pages, full layout analysis
+    "block": {"psm": 6, "dpi": 300, "gray": True, "binarize": True},       # screenshot: one uniform block of text
+    "line": {"psm": 7, "dpi": 300, "gray": True, "binarize": True},        # a single line (caption, form field)
+    "sparse": {"psm": 11, "dpi": 300, "gray": True, "binarize": False},    # photos/slides: uneven light, scattered text
+    "raw": {"psm": 3, "dpi": None, "gray": False, "binarize": False},      # untouched RGB (the old behaviour)
+}
+
+
+class OcrPageError(RuntimeError):
+    """Some pages failed (Tesseract timeout / error, unreadable file); `text` holds the pages that worked."""
+
+    def __init__(self, text: str, errors: List[str]):
+        super().__init__("; ".join(errors))
+        self.text = text
+        self.errors = errors
+
+
+@dataclass
+class PageResult:
+    page: int               # 1-based
+    text: str
+    ms: int                 # Tesseract
+    prep_ms: int            # decode / render + preprocessing
+    size: Tuple[int, int]   # what Tesseract saw
+    error: str = ""
+
+
+def _mode(mode: str) -> dict:
     try:
-        img = Image.open(BytesIO(image_bytes)).convert("RGB")
+        return MODES[mode]
+    except KeyError:
+        raise ValueError(f"unknown OCR mode {mode!r}, expected one of {sorted(MODES)}") from None
+
+
+def tesseract_config(mode: str = OCR_MODE) -> str:
+    return f"--psm {_mode(mode)['psm']} {TESSERACT_CONFIG}".strip()
+
+
+@lru_cache(maxsize=None)
+def ocr_settings(mode: str = OCR_MODE) -> dict:
+    """Everything besides the image and language that changes the output (part of the cache key)."""
+    try:
+        version = str(pytesseract.get_tesseract_version())
     except Exception:
-        return "", int((perf_counter() - t0) * 1000)
-    text = pytesseract.image_to_string(img, lang=lang) or ""
-    return text.strip(), int((perf_counter() - t0) * 1000)
+        version = ""
+    return {"engine": "tesseract", "version": version, "config": tesseract_config(mode),
+            "mode": mode, **_mode(mode), "max_mp": MAX_MP}
+
+
+# ---------------- pages + preprocessing ----------------
+def _ms(t0: float) -> int:
+    return int((perf_counter() - t0) * 1000)
+
+
+def _is_pdf(data: bytes) -> bool:
+    return data[:1024].lstrip().startswith(b"%PDF-")
+
+
+def iter_pages(data: bytes, mode: str = OCR_MODE) -> Iterator[Tuple[Image.Image, Optional[float]]]:
+    """(page image, its DPI if known) for an image, a multi-page TIFF or a PDF, in order."""
+    if _is_pdf(data):
+        if convert_from_bytes is None:
+            raise RuntimeError("PDF input needs pdf2image (and poppler-utils)")
+        cfg = _mode(mode)
+        dpi = cfg["dpi"] or PDF_FALLBACK_DPI
+        # one page at a time: a rendered page is tens of MB, the document can be hundreds of pages
+        for n in range(1, pdfinfo_from_bytes(data)["Pages"] + 1):
+            page = convert_from_bytes(data, dpi=dpi, first_page=n, last_page=n, grayscale=cfg["gray"])[0]
+            yield page, dpi
+        return
+    img = Image.open(BytesIO(data))
+    for frame in ImageSequence.Iterator(img):
+        dpi = frame.info.get("dpi")
+        yield frame.copy(), (float(dpi[0]) if dpi and dpi[0] else None)    # the iterator reuses one object
+
+
+def otsu_threshold(hist: Sequence[int]) -> int:
+    """Gray level that best separates ink from paper in a 256-bin histogram."""
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    w0 = sum0 = 0
+    best_t, best_var = 127, -1.0
+    for t in range(256):
+        w0 += hist[t]
+        if not w0:
+            continue
+        w1 = total - w0
+        if not w1:
+            break
+        sum0 += t * hist[t]
+        diff = sum0 / w0 - (sum_all - sum0) / w1
+        var = w0 * w1 * diff * diff
+        if var > best_var:
+            best_t, best_var = t, var
+    return best_t
+
+
+def _scale(size: Tuple[int, int], dpi: Optional[float], target_dpi: Optional[int]) -> float:
+    s = target_dpi / dpi if dpi and target_dpi and dpi > target_dpi else 1.0
+    pixels = size[0] * size[1] * s * s
+    if MAX_MP and pixels > MAX_MP * 1e6:      # no (or a bogus) DPI: phone photos, huge scans
+        s *= (MAX_MP * 1e6 / pixels) ** 0.5
+    return s
+
+
+def preprocess(img: Image.Image, dpi: Optional[float] = None, mode: str = OCR_MODE) -> Image.Image:
+    """Downsample to the mode's DPI, grayscale, binarize; "raw" only converts to RGB."""
+    cfg = _mode(mode)
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        # transparent screenshots: dark text on "nothing" would turn black on black
+        img = Image.alpha_composite(Image.new("RGBA", img.size, "white"), img.convert("RGBA"))
+    if not cfg["gray"]:
+        return img.convert("RGB")
+    img = img.convert("L")                    # a third of the pixels to resample and threshold
+    s = _scale(img.size, dpi, cfg["dpi"])
+    if s < 1.0:
+        size = (max(1, round(img.width * s)), max(1, round(img.height * s)))
+        img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if cfg["binarize"]:
+        t = otsu_threshold(img.histogram())
+        img = img.point([0] * (t + 1) + [255] * (255 - t), "1")
+    return img
+
+
+# ---------------- Tesseract (inline or in a pool worker) ----------------
+def _init_worker():
+    # pages already run in parallel; Tesseract's own OpenMP threads would only oversubscribe
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_image(img: Image.Image, lang: str, config: str) -> Tuple[str, int, str]:
+    """(text, ms, error); timeouts and Tesseract failures stay on their page, a missing binary raises."""
+    t0 = perf_counter()
+    try:
+        text = pytesseract.image_to_string(img, lang=lang, config=config, timeout=PAGE_TIMEOUT_S) or ""
+    except (RuntimeError, pytesseract.TesseractError) as e:
+        return "", _ms(t0), f"{type(e).__name__}: {e}"
+    return text.strip(), _ms(t0), ""
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn, not fork: the UI and API processes run threads
+                _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=mp.get_context("spawn"),
+                                            initializer=_init_worker)
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None        # a crashed worker poisons the executor; start fresh next call
+
+
+def _prepared(docs: Sequence[bytes], mode: str) -> Iterator[Tuple[int, PageResult, Optional[Image.Image]]]:
+    """(document index, PageResult without text, preprocessed page or None if the document failed)."""
+    for d, data in enumerate(docs):
+        n, t0 = 0, perf_counter()
+        try:
+            for n, (img, dpi) in enumerate(iter_pages(data, mode), 1):
+                img = preprocess(img, dpi, mode)
+                yield d, PageResult(n, "", 0, _ms(t0), img.size), img
+                t0 = perf_counter()
+        except Exception as e:      # unreadable or unsupported file: the other documents still run
+            yield d, PageResult(n + 1, "", 0, _ms(t0), (0, 0), f"{type(e).__name__}: {e}"), None
+
+
+def extract_batch(docs: Sequence[bytes], *, lang: str = "eng", mode: str = OCR_MODE,
+                  progress: Optional[Callable[[int, int], None]] = None) -> List[List[PageResult]]:
+    """
+    OCR several images / documents; returns their pages in order, per document.
+    progress(done, total) is called after each page.
+    """
+    config = tesseract_config(mode)
+    out: List[List[PageResult]] = [[] for _ in docs]
+    pages = _prepared(docs, mode)
+    head = list(islice(pages, 2))
+    jobs: List[Tuple[int, PageResult, Optional[Image.Image]]] = []
+
+    def finish(d: int, page: PageResult):
+        out[d].append(page)
+        if page.ms:
+            record("ocr.page", page.ms / 1000)
+        if progress is not None:
+            progress(sum(map(len, out)), max(len(jobs), sum(map(len, out))))
+
+    if len(head) < 2 or WORKERS <= 1:
+        # a single page isn't worth the trip to another process
+        for d, page, img in chain(head, pages):
+            jobs.append((d, page, img))
+            if img is not None:
+                page.text, page.ms, err = _ocr_image(img, lang, config)
+                page.error = page.error or err
+            finish(d, page)
+    else:
+        pool, futures = _get_pool(), {}
+        try:
+            for d, page, img in chain(head, pages):     # the next page renders while workers run Tesseract
+                jobs.append((d, page, img))
+                if img is None:
+                    finish(d, page)
+                else:
+                    futures[pool.submit(_ocr_image, img, lang, config)] = (d, page)
+            for fut in as_completed(futures):
+                d, page = futures[fut]
+                page.text, page.ms, page.error = fut.result()
+                finish(d, page)
+        except BrokenProcessPool:
+            _reset_pool()
+            raise
+    for doc in out:
+        doc.sort(key=lambda p: p.page)
+    return out
+
+
+def extract_pages(data: bytes, *, lang: str = "eng", mode: str = OCR_MODE,
+                  progress: Optional[Callable[[int, int], None]] = None) -> List[PageResult]:
+    """Per-page text and timings for one image, multi-page TIFF or PDF."""
+    return extract_batch([data], lang=lang, mode=mode, progress=progress)[0]
+
+
+@traced("ocr")
+def extract_text(image_bytes: bytes, *, lang: str = "eng", mode: str = OCR_MODE,
+                 progress: Optional[Callable[[int, int], None]] = None) -> Tuple[str, int]:
+    """
+    Extract text from an image or document and return (text, latency_ms); pages
+    are joined by blank lines. Raises OcrPageError (with the partial text) if any
+    page failed, so a transient timeout is never mistaken for a blank page.
+    """
+    t0 = perf_counter()
+    pages = extract_pages(image_bytes, lang=lang, mode=mode, progress=progress)
+    text = "\n\n".join(p.text for p in pages if p.text)
+    errors = [f"page {p.page}: {p.error}" for p in pages if p.error]
+    if errors:
+        raise OcrPageError(text, errors)
+    return text, _ms(t0)
+
+
+def extract_text_cached(image_bytes: bytes, *, lang: str = "eng", mode: str = OCR_MODE,
+                        progress: Optional[Callable[[int, int], None]] = None) -> Tuple[str, int]:
+    """
+    extract_text behind the content-addressed cache (services/tools/ocr_cache.py);
+    ms is this call's. Failed extractions raise and are not cached.
+    """
+    text, ms, _ = get_ocr_cache().get_or_compute(
+        image_bytes, lang, ocr_settings(mode),
+        lambda: extract_text(image_bytes, lang=lang, mode=mode, progress=progress),
+    )
+    return text, ms
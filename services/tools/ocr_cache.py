@@ -0,0 +1,148 @@
+# services/tools/ocr_cache.py
+"""
+Content-addressed OCR result cache.
+
+Key = sha256(image bytes, language, OCR settings), so the same upload is only
+run through Tesseract once, across Streamlit reruns and restarts.
+
+  tier 1: in-process LRU (OCR_CACHE_ITEMS entries)
+  tier 2: SQLite under data/cache/ocr.sqlite (OCR_CACHE_PATH), capped at
+          OCR_CACHE_MB of stored text; least recently used rows are evicted
+          down to 90% of the cap
+
+stats() feeds the Health page.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from services.common.lru import LRUCache
+
+CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join("data", "cache", "ocr.sqlite"))
+MEMORY_ITEMS = int(os.getenv("OCR_CACHE_ITEMS", "256"))
+MAX_MB = float(os.getenv("OCR_CACHE_MB", "64"))
+LOW_WATER = 0.9
+
+
+def cache_key(image_bytes: bytes, lang: str, settings: Optional[dict] = None) -> str:
+    h = hashlib.sha256(image_bytes)
+    h.update(b"\0" + lang.encode() + b"\0" + json.dumps(settings or {}, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+class OcrCache:
+    def __init__(self, path: str = CACHE_PATH, memory_items: int = MEMORY_ITEMS, max_mb: float = MAX_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 2 ** 20)
+        self.memory = LRUCache(maxsize=memory_items)
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ocr ("
+            " key TEXT PRIMARY KEY, text TEXT NOT NULL, ms INTEGER NOT NULL,"
+            " size INTEGER NOT NULL, atime REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ocr_atime ON ocr (atime)")
+        self._db.commit()
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM ocr").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Tuple[str, int, str]]:
+        """(text, original OCR ms, "memory" | "disk") or None."""
+        hit = self.memory.get(key)
+        if hit is not None:
+            return hit[0], hit[1], "memory"
+        with self._lock:
+            row = self._db.execute("SELECT text, ms FROM ocr WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE ocr SET atime = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.disk_hits += 1
+        self.memory.put(key, (row[0], row[1]))
+        return row[0], row[1], "disk"
+
+    def put(self, key: str, text: str, ms: int):
+        self.memory.put(key, (text, ms))
+        size = len(text.encode("utf-8")) + len(key)
+        with self._lock:
+            old = self._db.execute("SELECT size FROM ocr WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO ocr VALUES (?, ?, ?, ?, ?)", (key, text, ms, size, time.time()))
+            self._bytes += size - (old[0] if old else 0)
+            if self._bytes > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        target = self.max_bytes * LOW_WATER
+        # another process may share the file: recount before deleting anything
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM ocr").fetchone()[0]
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM ocr ORDER BY atime"):
+            if self._bytes <= target:
+                break
+            doomed.append((key,))
+            self._bytes -= size
+        self._db.executemany("DELETE FROM ocr WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+        for (key,) in doomed:
+            self.memory.pop(key)
+
+    def get_or_compute(self, image_bytes: bytes, lang: str, settings: Optional[dict],
+                       fn: Callable[[], Tuple[str, int]]) -> Tuple[str, int, str]:
+        """(text, ms for this call, "memory" | "disk" | "miss")."""
+        t0 = time.perf_counter()
+        key = cache_key(image_bytes, lang, settings)
+        hit = self.get(key)
+        if hit is not None:
+            return hit[0], int((time.perf_counter() - t0) * 1000), hit[2]
+        text, ms = fn()
+        self.put(key, text, ms)
+        return text, ms, "miss"
+
+    def stats(self) -> dict:
+        mem = self.memory.stats()
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM ocr").fetchone()[0]
+        lookups = mem["hits"] + self.disk_hits + self.misses
+        return {
+            "memory_hits": mem["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((mem["hits"] + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_entries": mem["size"],
+            "disk_entries": entries,
+            "disk_mb": round(self._bytes / 2 ** 20, 3),
+            "max_mb": round(self.max_bytes / 2 ** 20, 3),
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        self.memory.clear()
+        with self._lock:
+            self._db.execute("DELETE FROM ocr")
+            self._db.commit()
+            self._bytes = 0
+
+
+_cache: Optional[OcrCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> OcrCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = OcrCache()
+    return _cache
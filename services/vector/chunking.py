@@ -0,0 +1,24 @@
+# services/vector/chunking.py
+"""Character-window chunking shared by the Chroma and TF-IDF ingesters."""
+from typing import List, Tuple
+
+# Approx chunk ~400 tokens via ~1600 chars; overlap to keep context
+CHUNK_CHARS = 1600
+CHUNK_OVERLAP = 200
+
+def chunk_spans(text: str, chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """(start, end) char offsets of overlapping windows covering `text`."""
+    spans = []
+    i = 0
+    n = len(text)
+    step = max(1, chunk_chars - overlap)
+    while i < n:
+        end = min(i + chunk_chars, n)
+        spans.append((i, end))
+        if end >= n:
+            break
+        i += step
+    return spans
+
+def chunk_text(text: str, chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    return [text[s:e] for s, e in chunk_spans(text, chunk_chars, overlap)]
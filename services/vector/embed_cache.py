@@ -0,0 +1,56 @@
+# services/vector/embed_cache.py
+"""
+Persistent embedding cache keyed by (model name, chunk content hash).
+
+Lets a rebuild, a second collection or the hybrid retriever reuse vectors
+instead of re-running the encoder. Stored in SQLite (WAL) so several ingest
+workers and readers can share it.
+"""
+import os, sqlite3, threading
+from typing import Dict, Iterable
+
+import numpy as np
+
+CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./data/cache/embeddings.sqlite")
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS emb ("
+            " model TEXT NOT NULL, hash TEXT NOT NULL, dim INTEGER NOT NULL, vec BLOB NOT NULL,"
+            " PRIMARY KEY (model, hash)) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def get_many(self, model: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        hashes = list(dict.fromkeys(hashes))
+        out = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):   # stay under SQLite's bound-variable limit
+                part = hashes[i:i + 500]
+                q = f"SELECT hash, vec FROM emb WHERE model = ? AND hash IN ({','.join('?' * len(part))})"
+                for h, blob in self._db.execute(q, [model, *part]):
+                    out[h] = np.frombuffer(blob, dtype=np.float32)
+        return out
+
+    def put_many(self, model: str, vectors: Dict[str, np.ndarray]):
+        rows = []
+        for h, v in vectors.items():
+            v = np.asarray(v, dtype=np.float32).ravel()
+            rows.append((model, h, int(v.size), v.tobytes()))
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO emb (model, hash, dim, vec) VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,41 +1,19 @@
 import os
-import glob
 import time
-from typing import List, Dict
 from pathlib import Path
 
 import chromadb
 from chromadb.utils import embedding_functions
 
-CHROMA_PATH = os.getenv("CHROMA_PATH", "./data/chroma")
+from services.vector import manifest as mf
+from services.vector.embed_cache import EmbeddingCache
+from services.vector.query_embed import CHROMA_PATH
 RAW_DIR = "./data/raw"
 COLLECTION_NAME = "docs"
-
-# Approx chunk ~400 tokens via ~1600 chars; overlap to keep context
-CHUNK_CHARS = 1600
-CHUNK_OVERLAP = 200
-
-def read_text_files(raw_dir: str) -> List[Dict]:
-    items = []
-    for fp in glob.glob(os.path.join(raw_dir, "*.txt")):
-        with open(fp, "r", encoding="utf-8") as f:
-            text = f.read().strip()
-        items.append({"path": fp, "text": text})
-    return items
-
-def chunk_text(text: str, chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
-    chunks = []
-    i = 0
-    n = len(text)
-    while i < n:
-        end = min(i + chunk_chars, n)
-        chunks.append(text[i:end])
-        i = end - overlap
-        if i < 0:
-            i = 0
-        if i >= n:
-            break
-    return chunks
+MANIFEST_PATH = os.path.join(CHROMA_PATH, f"manifest_{COLLECTION_NAME}.json")
+# key for the embedding cache: Chroma's default embedder is ONNX all-MiniLM-L6-v2
+EMBED_MODEL = "chroma-default/all-MiniLM-L6-v2"
+BATCH = 256
 
 def main():
     start = time.time()
@@ -52,35 +30,77 @@ def main():
     except:
         col = client.create_collection(COLLECTION_NAME, embedding_function=embedder)
 
-    # Clear existing docs (safe on first run)
-    try:
-        col.delete(where={})
-    except:
-        pass
+    prev = mf.load_manifest(MANIFEST_PATH)
+    # collection wiped or out of sync with the manifest -> resync everything (vectors still come from the cache)
+    # and prune whatever the new manifest doesn't list
+    resync = col.count() != len(mf.chunk_keys(prev))
+    if resync:
+        prev = {"files": {}}
 
-    docs = read_text_files(RAW_DIR)
-    if not docs:
+    new, texts = mf.scan(RAW_DIR, prev)
+    if not new["files"]:
         print(f"No .txt files found in {RAW_DIR}. Add some and re-run.")
         return
+    d = mf.diff(prev, new)
+
+    if d["removed"]:
+        col.delete(ids=[mf.chunk_id(f, h) for f, h in d["removed"]])
 
-    ids, metadatas, contents = [], [], []
-    doc_id = 0
-    for d in docs:
-        base = os.path.basename(d["path"])
-        chunks = chunk_text(d["text"])
-        for j, ch in enumerate(chunks):
-            ids.append(f"doc{doc_id}_chunk{j}")
-            contents.append(ch)
-            metadatas.append({
+    # new/changed chunks are embedded; unchanged ones in edited files only get their new position
+    ids, metadatas, contents, hashes = [], [], [], []
+    moved_ids, moved_metas = [], []
+    added = set(d["added"])
+    for base, e in new["files"].items():
+        if base not in texts:
+            continue                           # size/mtime unchanged: nothing moved
+        seen = set()
+        for j, (s, end, h) in enumerate(e["chunks"]):
+            if h in seen:
+                continue                       # identical windows inside one file are stored once
+            seen.add(h)
+            meta = {
                 "source_file": base,
                 "title": base.replace(".txt","").replace("_"," ").title(),
                 "url": f"local://{base}",
-                "chunk_index": j
-            })
-        doc_id += 1
+                "chunk_index": j,
+                "start": s,
+                "end": end,
+                "hash": h,
+            }
+            if (base, h) in added:
+                ids.append(mf.chunk_id(base, h))
+                contents.append(texts[base][s:end])
+                hashes.append(h)
+                metadatas.append(meta)
+            else:
+                moved_ids.append(mf.chunk_id(base, h))
+                moved_metas.append(meta)
+
+    cache = EmbeddingCache()
+    cached = cache.get_many(EMBED_MODEL, hashes)
+    missing = [i for i, h in enumerate(hashes) if h not in cached]
+    for i in range(0, len(missing), BATCH):
+        part = missing[i:i + BATCH]
+        vecs = embedder([contents[j] for j in part])
+        fresh = {hashes[j]: v for j, v in zip(part, vecs)}
+        cache.put_many(EMBED_MODEL, fresh)
+        cached.update(fresh)
+
+    for i in range(0, len(ids), BATCH):
+        col.upsert(
+            ids=ids[i:i + BATCH],
+            documents=contents[i:i + BATCH],
+            metadatas=metadatas[i:i + BATCH],
+            embeddings=[cached[h].tolist() for h in hashes[i:i + BATCH]],
+        )
+    for i in range(0, len(moved_ids), BATCH):
+        col.update(ids=moved_ids[i:i + BATCH], metadatas=moved_metas[i:i + BATCH])
+    pruned = mf.prune(col, new) if resync else 0
+    mf.save_manifest(MANIFEST_PATH, new)
 
-    col.add(ids=ids, documents=contents, metadatas=metadatas)
-    print(f"Ingested {len(contents)} chunks from {len(docs)} files into collection '{COLLECTION_NAME}'.")
+    print(f"Chunks: {len(d['reused'])} reused, {len(d['added'])} added, {len(d['removed']) + pruned} removed "
+          f"({len(hashes) - len(missing)} embeddings from cache, {len(missing)} encoded) "
+          f"across {len(new['files'])} files in collection '{COLLECTION_NAME}'.")
     print(f"Chroma path: {CHROMA_PATH}")
     print(f"Done in {time.time()-start:.2f}s")
 
@@ -1,43 +1,195 @@
 """
 Semantic embedding ingestion using SentenceTransformers + ChromaDB.
-This will create /app/data/chroma folder with stored embeddings.
+Writes into the persistent store at CHROMA_PATH (collection "semantic_docs"),
+the same one services/vector/query_embed.py reads.
+
+Pipeline (memory stays flat regardless of corpus size):
+  files -> chunk generator -> batches -> process pool (encode) -> bounded queue -> writer thread (Chroma add)
+
+  - only new/changed chunks are encoded (manifest + embedding cache, see manifest.py / embed_cache.py)
+  - each worker loads the model once; the parent process never loads it
+  - at most EMBED_INFLIGHT batches are being encoded and EMBED_QUEUE waiting for the
+    writer, so a slow store throttles the reader instead of buffering the corpus
 """
 import os
+import time
+import queue
+import threading
+import multiprocessing as mp
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.utils import embedding_functions
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List
+
+from services.vector import manifest as mf
+from services.vector.embed_cache import EmbeddingCache
+from services.vector.query_embed import CHROMA_PATH, COLLECTION_METADATA, COLLECTION_NAME
 
 DATA_DIR = Path(__file__).resolve().parents[2] / "data"
 RAW_DIR = DATA_DIR / "raw"
-CHROMA_DIR = DATA_DIR / "chroma"
-CHROMA_DIR.mkdir(parents=True, exist_ok=True)
+CHROMA_DIR = Path(CHROMA_PATH)
+MANIFEST_PATH = str(CHROMA_DIR / f"manifest_{COLLECTION_NAME}.json")
 
 # Load a small, efficient model
-model_name = "sentence-transformers/all-MiniLM-L6-v2"
-print(f"Loading model: {model_name}")
-model = SentenceTransformer(model_name)
-
-# Initialize Chroma client
-client = chromadb.Client()
-collection = client.get_or_create_collection(
-    name="semantic_docs",
-    embedding_function=embedding_functions.SentenceTransformerEmbeddingFunction(model_name)
-)
-
-# Load all text docs under /data/raw
-docs = []
-for path in RAW_DIR.glob("*.txt"):
-    text = path.read_text(encoding="utf-8").strip()
-    if text:
-        docs.append((path.name, text))
-
-if not docs:
-    print(f"No .txt files found in {RAW_DIR}, please add some sample text documents.")
-else:
-    print(f"Found {len(docs)} docs — embedding...")
-    collection.add(
-        documents=[t for _, t in docs],
-        ids=[n for n, _ in docs]
-    )
-    print(f"✅ Embedded {len(docs)} docs into {CHROMA_DIR}")
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+BATCH_SIZE = int(os.getenv("EMBED_BATCH", "128"))
+WORKERS = int(os.getenv("EMBED_WORKERS", str(os.cpu_count() or 1)))
+INFLIGHT = int(os.getenv("EMBED_INFLIGHT", str(2 * WORKERS)))
+QUEUE_SIZE = int(os.getenv("EMBED_QUEUE", "8"))
+
+# ---------------- worker side ----------------
+_model = None
+
+def _init_worker(model_name: str):
+    global _model
+    import torch
+    torch.set_num_threads(1)            # one core per process; the pool provides the parallelism
+    from sentence_transformers import SentenceTransformer
+    _model = SentenceTransformer(model_name, device="cpu")
+
+def _encode(texts: List[str]):
+    return _model.encode(texts, batch_size=len(texts), normalize_embeddings=True,
+                         convert_to_numpy=True, show_progress_bar=False).astype("float32")
+
+# ---------------- parent side ----------------
+def _meta(base: str, j: int, s: int, e: int, h: str) -> Dict:
+    return {
+        "source_file": base,
+        "title": base.replace(".txt", "").replace("_", " ").title(),
+        "url": f"local://{base}",
+        "chunk_index": j,
+        "start": s,
+        "end": e,
+        "hash": h,
+    }
+
+def iter_chunks(prev: Dict, new_files: Dict, stale: List[str], moved: List[Dict]) -> Iterator[Dict]:
+    """
+    Yield new/changed chunks file by file. Fills `new_files` with the fresh
+    manifest, `stale` with ids of chunks that no longer exist in changed files
+    and `moved` with {"id", "meta"} of unchanged chunks of changed files (their
+    position may have shifted).
+    """
+    old = prev.get("files", {})
+    for base, entry, text in mf.iter_files(str(RAW_DIR), prev):
+        new_files[base] = entry
+        if text is None:
+            continue
+        before = {c[2] for c in old.get(base, {}).get("chunks", [])}
+        now = set()
+        for j, (s, e, h) in enumerate(entry["chunks"]):
+            if h in now:
+                continue                 # identical windows inside one file are stored once
+            now.add(h)
+            if h in before:
+                moved.append({"id": mf.chunk_id(base, h), "meta": _meta(base, j, s, e, h)})
+                continue
+            yield {"id": mf.chunk_id(base, h), "hash": h, "text": text[s:e], "meta": _meta(base, j, s, e, h)}
+        stale.extend(mf.chunk_id(base, h) for h in before - now)
+
+def batched(it: Iterator[Dict], n: int) -> Iterator[List[Dict]]:
+    batch = []
+    for x in it:
+        batch.append(x)
+        if len(batch) >= n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _writer(col, q: "queue.Queue", counters: Dict, errors: List):
+    while True:
+        item = q.get()
+        if item is None:
+            return
+        batch, vecs = item
+        try:
+            col.upsert(
+                ids=[c["id"] for c in batch],
+                documents=[c["text"] for c in batch],
+                metadatas=[c["meta"] for c in batch],
+                embeddings=[v.tolist() for v in vecs],
+            )
+            counters["written"] += len(batch)
+        except Exception as e:
+            errors.append(e)
+
+def main():
+    start = time.time()
+    CHROMA_DIR.mkdir(parents=True, exist_ok=True)
+
+    import chromadb
+    client = chromadb.PersistentClient(path=str(CHROMA_DIR))
+    # embeddings are always supplied, so the collection never has to load a model itself
+    col = client.get_or_create_collection(name=COLLECTION_NAME, metadata=COLLECTION_METADATA)
+
+    prev = mf.load_manifest(MANIFEST_PATH)
+    # out of sync with the manifest -> re-add everything (vectors from the cache), then prune the rest
+    resync = col.count() != len(mf.chunk_keys(prev))
+    if resync:
+        prev = {"files": {}}
+
+    cache = EmbeddingCache()
+    new_files, stale, moved = {}, [], []
+    counters = {"chunks": 0, "cached": 0, "encoded": 0, "written": 0}
+    errors: List[Exception] = []
+    out_q: "queue.Queue" = queue.Queue(maxsize=QUEUE_SIZE)
+    writer = threading.Thread(target=_writer, args=(col, out_q, counters, errors), daemon=True)
+    writer.start()
+
+    print(f"Encoding with {MODEL_NAME} on {WORKERS} workers (batch={BATCH_SIZE})")
+    pending = {}
+    # spawn, not fork: the parent already runs the writer thread and holds a SQLite handle
+    with ProcessPoolExecutor(max_workers=WORKERS, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker, initargs=(MODEL_NAME,)) as pool:
+        def drain(block_until: int):
+            while len(pending) > block_until:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    batch = pending.pop(fut)
+                    vecs = fut.result()
+                    cache.put_many(MODEL_NAME, {c["hash"]: v for c, v in zip(batch, vecs)})
+                    counters["encoded"] += len(batch)
+                    out_q.put((batch, vecs))           # blocks when the writer falls behind
+
+        for batch in batched(iter_chunks(prev, new_files, stale, moved), BATCH_SIZE):
+            counters["chunks"] += len(batch)
+            cached = cache.get_many(MODEL_NAME, [c["hash"] for c in batch])
+            hit = [c for c in batch if c["hash"] in cached]
+            if hit:
+                counters["cached"] += len(hit)
+                out_q.put((hit, [cached[c["hash"]] for c in hit]))
+            miss = [c for c in batch if c["hash"] not in cached]
+            if miss:
+                pending[pool.submit(_encode, [c["text"] for c in miss])] = miss
+                drain(INFLIGHT - 1)                    # bounded in-flight work = backpressure
+        drain(0)
+
+    out_q.put(None)
+    writer.join()
+    if errors:
+        raise errors[0]
+
+    # chunks of deleted files + windows that disappeared from changed files
+    gone = set(stale)
+    for base, e in prev.get("files", {}).items():
+        if base not in new_files:
+            gone.update(mf.chunk_id(base, c[2]) for c in e["chunks"])
+    gone = sorted(gone)
+    for i in range(0, len(gone), 1000):
+        col.delete(ids=gone[i:i + 1000])
+    for i in range(0, len(moved), 1000):
+        part = moved[i:i + 1000]
+        col.update(ids=[m["id"] for m in part], metadatas=[m["meta"] for m in part])
+    pruned = mf.prune(col, {"files": new_files}) if resync else 0
+
+    mf.save_manifest(MANIFEST_PATH, {"files": new_files})
+    if not new_files:
+        print(f"No .txt files found in {RAW_DIR}, please add some sample text documents.")
+    else:
+        print(f"✅ {counters['written']} chunks written ({counters['cached']} from cache, "
+              f"{counters['encoded']} encoded), {len(gone) + pruned} removed, {len(new_files)} files -> {CHROMA_DIR}")
+        print(f"Done in {time.time()-start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# services/vector/ingest_facts.py
+"""
+Ingest stage: pull (entity, metric, period, value) facts out of data/raw into
+the fact table read by services/tools/facts.py.
+
+Per sentence: metric phrases (facts.METRICS) are paired with the first figure
+after them (else the nearest one before), e.g.
+
+  "In 2024, Tesla reported revenue of $97.7 billion, up 1%."
+    -> ("tesla", "revenue", "2024", 97700000000.0, "$")
+
+The entity is the lexicon entity nearest before the metric, else the first one
+in the file, else the file name without digits (tesla_2024.txt -> "tesla").
+The period is the sentence's quarter/year, else a year in the file name.
+The table is rebuilt from scratch each run (cheap) and swapped in atomically.
+
+  python -m services.vector.ingest_facts
+"""
+import glob
+import os
+import re
+import time
+from typing import List
+
+from services.tools.facts import (FACTS_PATH, PCT_METRICS, find_entities, find_figures, find_metrics,
+                                  find_period, write_facts)
+from services.vector import manifest as mf
+
+RAW_DIR = "./data/raw"
+SENTENCE_RE = re.compile(r"(?:[^.!?\n]|[.!?](?=\d))+[.!?]?")     # "97.7" stays in one sentence
+
+
+def _file_subject(base: str) -> str:
+    words = [w for w in re.split(r"[_\-\s]+", os.path.splitext(base)[0]) if w and not w.isdigit()]
+    return " ".join(words).lower()
+
+
+def extract_facts(text: str, source_file: str = "") -> List[tuple]:
+    """Rows of (entity, metric, period, value, unit, source_file, sentence) for one document."""
+    lower_doc = text.lower()
+    doc_ents = find_entities(lower_doc)
+    subject = doc_ents[0][2] if doc_ents else _file_subject(source_file)
+    doc_period = find_period(re.sub(r"[_\-]", " ", source_file))     # "_" is a word char for \b
+    rows = []
+    for m in SENTENCE_RE.finditer(text):
+        sent = m.group(0).strip()
+        lower = sent.lower()
+        metrics = find_metrics(lower)
+        if not metrics:
+            continue
+        figures = find_figures(sent)
+        if not figures:
+            continue
+        ents = find_entities(lower)
+        period = find_period(sent) or doc_period
+        for i, (ms, me, metric) in enumerate(metrics):
+            nxt = metrics[i + 1][0] if i + 1 < len(metrics) else len(sent)
+            prev = metrics[i - 1][1] if i else 0
+            usable = [f for f in figures if (f.unit == "%") == (metric in PCT_METRICS)]
+            fig = next((f for f in usable if me <= f.start < nxt), None) \
+                or next((f for f in reversed(usable) if prev <= f.start < ms), None)
+            if fig is None:
+                continue
+            before = [e for e in ents if e[1] <= ms]
+            entity = (before[-1] if before else ents[0])[2] if ents else subject
+            rows.append((entity, metric, period, fig.value, fig.unit, source_file, sent[:300]))
+    return rows
+
+
+def main():
+    start = time.time()
+    rows = []
+    files = sorted(glob.glob(os.path.join(RAW_DIR, "*.txt")))
+    for fp in files:
+        rows += extract_facts(mf.read_text(fp), os.path.basename(fp))
+    n = write_facts(rows, FACTS_PATH)
+    print(f"Extracted {n} facts from {len(files)} files -> {FACTS_PATH}")
+    print(f"Done in {time.time()-start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
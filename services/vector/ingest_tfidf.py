@@ -1,47 +1,55 @@
-import os, glob, pickle, time
+import os, time
 from pathlib import Path
-from typing import List, Dict
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+from services.vector import manifest as mf
+from services.vector.tfidf_store import INDEX_DIR, write_index, current_version
+
 RAW_DIR = "./data/raw"
-INDEX_PATH = "./data/tfidf_index.pkl"
-
-def read_text_files(raw_dir: str) -> List[Dict]:
-    items = []
-    for fp in glob.glob(os.path.join(raw_dir, "*.txt")):
-        with open(fp, "r", encoding="utf-8") as f:
-            text = f.read().strip()
-        base = os.path.basename(fp)
-        items.append({
-            "id": base,
-            "title": base.replace(".txt","").replace("_"," ").title(),
-            "source_file": base,
-            "url": f"local://{base}",
-            "text": text
-        })
-    return items
+MANIFEST_PATH = os.path.join(INDEX_DIR, "manifest.json")
 
 def main():
     start = time.time()
     Path("./data").mkdir(parents=True, exist_ok=True)
 
-    docs = read_text_files(RAW_DIR)
-    if not docs:
+    prev = mf.load_manifest(MANIFEST_PATH) if current_version() else {"files": {}}
+    new, texts = mf.scan(RAW_DIR, prev)
+    if not new["files"]:
         print(f"No .txt files found in {RAW_DIR}. Add some and re-run.")
         return
+    d = mf.diff(prev, new)
+    stats = f"{len(d['reused'])} reused, {len(d['added'])} added, {len(d['removed'])} removed"
+
+    if not d["added"] and not d["removed"] and set(prev["files"]) == set(new["files"]):
+        mf.save_manifest(MANIFEST_PATH, new)   # refresh stat info only
+        print(f"Index {current_version()} up to date ({stats}).")
+        print(f"Done in {time.time()-start:.2f}s")
+        return
+
+    # idf is corpus-wide, so any change means a refit; unchanged files keep their
+    # manifest spans/hashes and are only read for their text
+    docs, passages, corpus = [], [], []
+    for j, (base, e) in enumerate(new["files"].items()):
+        text = texts[base] if base in texts else mf.read_text(os.path.join(RAW_DIR, base))
+        docs.append({
+            "id": base,
+            "title": base.replace(".txt","").replace("_"," ").title(),
+            "source_file": base,
+            "url": f"local://{base}",
+            "text": text
+        })
+        # index overlapping passages (same windows as the Chroma ingester), not whole files
+        for s, end, h in e["chunks"]:
+            passages.append({"doc": j, "start": s, "end": end, "hash": h})
+            corpus.append(text[s:end])
 
-    corpus = [d["text"] for d in docs]
     vec = TfidfVectorizer(stop_words="english")
     X = vec.fit_transform(corpus)
 
-    with open(INDEX_PATH, "wb") as f:
-        pickle.dump({
-            "vectorizer": vec,
-            "matrix": X,
-            "docs": docs
-        }, f)
+    version = write_index(vec, X, docs, passages)
+    mf.save_manifest(MANIFEST_PATH, new)
 
-    print(f"Indexed {len(docs)} docs -> {INDEX_PATH}")
+    print(f"Indexed {len(passages)} passages from {len(docs)} docs -> {INDEX_DIR}/{version} ({stats})")
     print(f"Done in {time.time()-start:.2f}s")
 
 if __name__ == "__main__":
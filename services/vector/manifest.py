@@ -0,0 +1,114 @@
+# services/vector/manifest.py
+"""
+Content-hash manifest for incremental ingestion.
+
+  {"files": {"tesla.txt": {"size": 100, "mtime_ns": ..., "hash": "...",
+                           "chunks": [[start, end, "chunk-hash"], ...]}}}
+
+Files whose size + mtime are unchanged are not re-read or re-hashed.
+Chunk identity is (file, chunk hash), so an edit only invalidates the windows
+whose text actually changed.
+"""
+import os, json, hashlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from services.vector.chunking import chunk_spans
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def load_manifest(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            m = json.load(f)
+        return m if isinstance(m.get("files"), dict) else {"files": {}}
+    except (FileNotFoundError, ValueError):
+        return {"files": {}}
+
+
+def save_manifest(path: str, manifest: Dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def read_text(fp: str) -> str:
+    with open(fp, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def iter_files(raw_dir: str, prev: Dict) -> Iterator[Tuple[str, Dict, Optional[str]]]:
+    """
+    Stream (file name, manifest entry, text) for the current contents of raw_dir.
+    text is None when the file's size/mtime match `prev` and it was not read.
+    """
+    old = prev.get("files", {})
+    with os.scandir(raw_dir) as it:
+        names = sorted(e.name for e in it if e.name.endswith(".txt") and e.is_file())
+    for base in names:
+        fp = os.path.join(raw_dir, base)
+        st = os.stat(fp)
+        e = old.get(base)
+        if e and e.get("size") == st.st_size and e.get("mtime_ns") == st.st_mtime_ns:
+            yield base, e, None
+            continue
+        text = read_text(fp)
+        yield base, {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "hash": content_hash(text),
+            "chunks": [[s, e, content_hash(text[s:e])] for s, e in chunk_spans(text)],
+        }, text
+
+
+def scan(raw_dir: str, prev: Dict) -> Tuple[Dict, Dict[str, str]]:
+    """
+    Build the manifest for the current contents of raw_dir.
+    Returns (manifest, texts) where texts holds only the files that had to be
+    (re-)read because they are new or their size/mtime changed.
+    """
+    files, texts = {}, {}
+    for base, entry, text in iter_files(raw_dir, prev):
+        files[base] = entry
+        if text is not None:
+            texts[base] = text
+    return {"files": files}, texts
+
+
+def chunk_id(source_file: str, h: str) -> str:
+    """Stable vector-store id of a chunk."""
+    return f"{source_file}#{h}"
+
+
+def chunk_keys(manifest: Dict) -> set:
+    return {(f, c[2]) for f, e in manifest.get("files", {}).items() for c in e["chunks"]}
+
+
+def store_ids(col, page: int = 1000) -> Iterator[str]:
+    """Every id in a Chroma collection, a page at a time (no documents or embeddings loaded)."""
+    offset = 0
+    while True:
+        ids = col.get(limit=page, offset=offset, include=[])["ids"]
+        if not ids:
+            return
+        yield from ids
+        offset += len(ids)
+
+
+def prune(col, manifest: Dict, page: int = 1000) -> int:
+    """Delete collection ids the manifest doesn't list (legacy ids, orphans of a lost manifest)."""
+    keep = {chunk_id(f, h) for f, h in chunk_keys(manifest)}
+    doomed = [i for i in store_ids(col, page) if i not in keep]
+    for i in range(0, len(doomed), page):
+        col.delete(ids=doomed[i:i + page])
+    return len(doomed)
+
+
+def diff(old: Dict, new: Dict) -> Dict[str, List[Tuple[str, str]]]:
+    """Chunk-level (file, hash) keys split into reused / added / removed."""
+    a, b = chunk_keys(old), chunk_keys(new)
+    return {"reused": sorted(a & b), "added": sorted(b - a), "removed": sorted(a - b)}
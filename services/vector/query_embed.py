@@ -1,15 +1,106 @@
-from chromadb import PersistentClient
+import os
+import re
+import threading
+from pathlib import Path
+from time import perf_counter
+
+from services.common.lru import LRUCache
+from services.common.tracing import record
+
+# one store for every Chroma ingester and reader (CHROMA_PATH, as in .env)
+CHROMA_PATH = os.getenv("CHROMA_PATH", str(Path(__file__).resolve().parents[2] / "data" / "chroma"))  # /app/data/chroma in the container
+COLLECTION_NAME = "semantic_docs"
+COLLECTION_METADATA = {"hnsw:space": "cosine"}     # must match ingest_embed.py
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"   # must match ingest_embed.py
+QUERY_CACHE_SIZE = int(os.getenv("SEMANTIC_QUERY_CACHE", "4096"))
+
+_WS = re.compile(r"\s+")
+
+def normalize_query(text: str) -> str:
+    """Cache key / encoder input: case, spacing and trailing punctuation don't change the meaning."""
+    return _WS.sub(" ", (text or "").lower()).strip().strip("?!.")
+
+
+class SemanticRetriever:
+    """
+    Process-resident semantic search: one Chroma client, collection handle and
+    encoder per process, created lazily on first use (thread-safe), plus a
+    bounded LRU of query embeddings so repeated questions skip the encoder.
+    """
+
+    def __init__(self, path: str = CHROMA_PATH, collection: str = COLLECTION_NAME,
+                 model_name: str = MODEL_NAME, cache_size: int = QUERY_CACHE_SIZE):
+        self.path = path
+        self.collection_name = collection
+        self.model_name = model_name
+        self.cache = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+        self._collection = None
+        self._model = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    from chromadb import PersistentClient
+                    client = PersistentClient(path=self.path)
+                    self._collection = client.get_or_create_collection(self.collection_name, metadata=COLLECTION_METADATA)
+        return self._collection
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def embed(self, text: str):
+        """Query embedding (unit-length float32), served from the LRU when possible."""
+        key = normalize_query(text)
+        return self.cache.get_or_compute(
+            key, lambda: self.model.encode([key], normalize_embeddings=True, convert_to_numpy=True)[0].astype("float32")
+        )
+
+    def query(self, text: str, k: int = 4, with_timing: bool = False):
+        t0 = perf_counter()
+        hits_before = self.cache.hits
+        qv = self.embed(text)
+        t1 = perf_counter()
+        results = self.collection.query(query_embeddings=[qv.tolist()], n_results=k)
+        t2 = perf_counter()
+        record("embed", t1 - t0)
+        record("ann_search", t2 - t1)
+        docs = results.get("documents", [[]])[0]
+        metas = results.get("metadatas", [[]])[0]
+        ids = results.get("ids", [[]])[0]
+        if with_timing:
+            results["timing"] = {
+                "embed_ms": round((t1 - t0) * 1000, 3),
+                "search_ms": round((t2 - t1) * 1000, 3),
+                "embed_cached": self.cache.hits > hits_before,
+            }
+        return docs, metas, ids, results
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+def get_retriever() -> SemanticRetriever:
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = SemanticRetriever()
+    return _retriever
 
 def get_collection():
     """Return an active Chroma collection used for semantic vector search."""
-    client = PersistentClient(path="/app/data/chroma")
-    return client.get_or_create_collection("semantic_docs")
-
-def query_vector_semantic(query: str, k: int = 4):
-    """Retrieve top-k documents from the semantic (Chroma) store."""
-    coll = get_collection()
-    results = coll.query(query_texts=[query], n_results=k)
-    docs = results.get("documents", [[]])[0]
-    metas = results.get("metadatas", [[]])[0]
-    ids = results.get("ids", [[]])[0]
-    return docs, metas, ids, results
\ No newline at end of file
+    return get_retriever().collection
+
+def query_vector_semantic(query: str, k: int = 4, with_timing: bool = False):
+    """Retrieve top-k documents from the semantic (Chroma) store.
+    with_timing=True adds results["timing"] = {embed_ms, search_ms, embed_cached}."""
+    return get_retriever().query(query, k=k, with_timing=with_timing)
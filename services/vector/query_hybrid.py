@@ -0,0 +1,173 @@
+# services/vector/query_hybrid.py
+"""
+Cascade retrieval: TF-IDF proposes, embeddings re-rank.
+
+  1. TfidfEngine.query_batch(k=HYBRID_CANDIDATES, collapse=False) -> top-N passages
+  2. their vectors by passage_hash: in-process LRU -> embedding cache
+     (services/vector/embed_cache.py, filled by ingest_embed.py: TF-IDF passages
+     and Chroma chunks are the same windows) -> encoder for any still missing,
+     written back so it happens once
+  3. the query embedding from the SemanticRetriever's LRU (query_embed.py)
+  4. cosine = one (N, d) @ (d,) product, fused with the TF-IDF score:
+       rrf     1/(HYBRID_RRF_K + lexical rank) + 1/(HYBRID_RRF_K + semantic rank)
+       linear  HYBRID_ALPHA * semantic + (1 - alpha) * lexical, both min-max scaled
+  5. best passage per document, top k
+
+No ANN search and no Chroma round trip: semantic ranking at about lexical cost.
+If the encoder can't be loaded the TF-IDF order is returned unchanged.
+"""
+import os
+import threading
+from time import perf_counter
+from typing import List, Optional
+
+import numpy as np
+
+from services.common.lru import LRUCache
+from services.common.tracing import record
+from services.vector.query_embed import MODEL_NAME, SemanticRetriever, get_retriever
+from services.vector.query_tfidf import BatchResult, TfidfEngine, get_engine
+
+CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+FUSION = os.getenv("HYBRID_FUSION", "rrf").lower()          # rrf | linear
+ALPHA = float(os.getenv("HYBRID_ALPHA", "0.7"))             # linear: weight of the semantic score
+RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+CHUNK_CACHE_SIZE = int(os.getenv("HYBRID_CHUNK_CACHE", "20000"))
+
+
+def _ranks(scores: np.ndarray) -> np.ndarray:
+    r = np.empty(scores.size, dtype=np.float64)
+    r[np.argsort(-scores, kind="stable")] = np.arange(1, scores.size + 1)
+    return r
+
+
+def _minmax(x: np.ndarray) -> np.ndarray:
+    lo, hi = float(x.min()), float(x.max())
+    return (x - lo) / (hi - lo) if hi > lo else np.ones_like(x)
+
+
+def fuse(lexical: np.ndarray, semantic: np.ndarray, method: str = FUSION,
+         alpha: float = ALPHA, rrf_k: int = RRF_K) -> np.ndarray:
+    """Fused score per candidate (higher is better)."""
+    lexical = np.asarray(lexical, dtype=np.float64)
+    semantic = np.asarray(semantic, dtype=np.float64)
+    if method == "rrf":
+        return 1.0 / (rrf_k + _ranks(lexical)) + 1.0 / (rrf_k + _ranks(semantic))
+    if method == "linear":
+        return alpha * _minmax(semantic) + (1.0 - alpha) * _minmax(lexical)
+    raise ValueError(f"unknown fusion {method!r}, expected rrf or linear")
+
+
+class HybridRetriever:
+    def __init__(self, engine: Optional[TfidfEngine] = None, semantic: Optional[SemanticRetriever] = None,
+                 model_name: str = MODEL_NAME, cache_size: int = CHUNK_CACHE_SIZE):
+        self.engine = engine or get_engine()
+        self.semantic = semantic or get_retriever()
+        self.model_name = model_name
+        self.vectors = LRUCache(maxsize=cache_size)      # passage hash -> unit float32 vector
+        self.encoded = 0
+        self._store = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    from services.vector.embed_cache import EmbeddingCache
+                    self._store = EmbeddingCache()
+        return self._store
+
+    def chunk_vectors(self, idx, rows: np.ndarray, hashes: List[str]) -> np.ndarray:
+        """(N, d) passage vectors, from the LRU, then the embedding cache, then the encoder."""
+        found = {}
+        for h in hashes:
+            v = self.vectors.get(h)
+            if v is not None:
+                found[h] = v
+        missing = [h for h in dict.fromkeys(hashes) if h not in found]
+        if missing:
+            got = self.store.get_many(self.model_name, missing)
+            todo = {h: r for h, r in zip(hashes, rows) if h not in found and h not in got}
+            if todo:    # passages ingested without ingest_embed: encode once, keep for next time
+                vecs = self.semantic.model.encode([idx.passage_text(int(r)) for r in todo.values()],
+                                                  normalize_embeddings=True, convert_to_numpy=True)
+                fresh = {h: v.astype(np.float32) for h, v in zip(todo, vecs)}
+                self.store.put_many(self.model_name, fresh)
+                got.update(fresh)
+                self.encoded += len(fresh)
+            for h, v in got.items():
+                self.vectors.put(h, v)
+            found.update(got)
+        return np.stack([found[h] for h in hashes])
+
+    def query(self, question: str, k: int = 4, n: int = CANDIDATES, fusion: str = FUSION,
+              with_timing: bool = False):
+        """
+        (docs, metas, ids, latency_s) like query_vector; metas carry the fused
+        "score" plus "tfidf" and "cosine". with_timing=True replaces latency_s by a
+        dict of stage timings.
+        """
+        t0 = perf_counter()
+        res = self.engine.query_batch([question], k=max(n, k), collapse=False)
+        rows = res.hits(0)
+        lexical = res.scores[0, :rows.size]
+        idx = res.index
+        t1 = perf_counter()
+        cosine, error = None, None
+        if rows.size:
+            try:
+                qv = self.semantic.embed(question)
+                hashes = [h.decode("ascii") for h in idx.passage_hash[rows]]
+                cosine = self.chunk_vectors(idx, rows, hashes) @ qv
+            except Exception as e:      # no encoder / cache: keep the lexical order
+                error = f"{type(e).__name__}: {e}"
+        t2 = perf_counter()
+        record("hybrid.rescore", t2 - t1)
+        scores = fuse(lexical, cosine, fusion) if cosine is not None else lexical.astype(np.float64)
+
+        keep, seen = [], set()
+        for i in np.argsort(-scores, kind="stable"):
+            d = int(idx.passage_doc[rows[i]])
+            if d not in seen:
+                seen.add(d)
+                keep.append(i)
+                if len(keep) == k:
+                    break
+        keep = np.asarray(keep, dtype=np.int64)
+        top = BatchResult(idx, rows[keep][None, :], scores[keep].astype(np.float32)[None, :])
+        metas = top.to_dicts(0)
+        for m, i in zip(metas, keep):
+            m["tfidf"] = float(lexical[i])
+            m["cosine"] = float(cosine[i]) if cosine is not None else None
+        docs = top.docs(0)
+        ids = [m.pop("id") for m in metas]
+        latency = perf_counter() - t0
+        if with_timing:
+            return docs, metas, ids, {
+                "latency_s": latency,
+                "tfidf_ms": round((t1 - t0) * 1000, 3),
+                "rescore_ms": round((t2 - t1) * 1000, 3),
+                "candidates": int(rows.size),
+                "fusion": fusion if cosine is not None else "tfidf",
+                "error": error,
+            }
+        return docs, metas, ids, latency
+
+
+_hybrid: Optional[HybridRetriever] = None
+_hybrid_lock = threading.Lock()
+
+
+def get_hybrid() -> HybridRetriever:
+    global _hybrid
+    if _hybrid is None:
+        with _hybrid_lock:
+            if _hybrid is None:
+                _hybrid = HybridRetriever()
+    return _hybrid
+
+
+def query_vector_hybrid(question: str, k: int = 4, with_timing: bool = False):
+    """TF-IDF top-N re-ranked by cached chunk embeddings; one passage per document."""
+    return get_hybrid().query(question, k=k, with_timing=with_timing)
@@ -1,33 +1,123 @@
-import os, time, pickle
+import time
+from typing import List
+
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
-INDEX_PATH = "./data/tfidf_index.pkl"
+from services.common.tracing import traced
+from services.vector.tfidf_store import load_index, INDEX_DIR
 
-def query_vector(question: str, k: int = 6):
-    t0 = time.time()
-    if not os.path.exists(INDEX_PATH):
-        raise FileNotFoundError("TF-IDF index not found. Run: python services/vector/ingest_tfidf.py")
-
-    data = pickle.load(open(INDEX_PATH, "rb"))
-    vec, X, docs = data["vectorizer"], data["matrix"], data["docs"]
-
-    qv = vec.transform([question])
-    sims = cosine_similarity(qv, X)[0]
-    top_idx = np.argsort(-sims)[:k]
-
-    results_docs, results_meta, results_ids = [], [], []
-    for rank, i in enumerate(top_idx):
-        d = docs[i]
-        results_docs.append(d["text"])
-        results_meta.append({
-            "source_file": d["source_file"],
-            "title": d["title"],
-            "url": d["url"],
-            "score": float(sims[i]),
-            "rank": int(rank+1),
-        })
-        results_ids.append(d["id"])
 
+class BatchResult:
+    """
+    Top-k passage hits for a batch of questions as compact arrays.
+      ids    (n_questions, k) int64  -> passage row in the index, -1 = no hit
+      scores (n_questions, k) float32 -> cosine similarity, descending per row
+    Dicts/texts are only materialised on request (to_dicts / docs).
+    """
+
+    def __init__(self, index, ids: np.ndarray, scores: np.ndarray):
+        self.index = index
+        self.ids = ids
+        self.scores = scores
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    def hits(self, row: int) -> np.ndarray:
+        return self.ids[row][self.ids[row] >= 0]
+
+    def docs(self, row: int) -> List[str]:
+        """Passage texts for one question."""
+        return [self.index.passage_text(p) for p in self.hits(row)]
+
+    def to_dicts(self, row: int, with_text: bool = False) -> List[dict]:
+        out = []
+        for rank, p in enumerate(self.hits(row)):
+            j = int(self.index.passage_doc[p])
+            d = self.index.docs[j]
+            start, end = self.index.passage_chars[p]
+            item = {
+                "id": f"{d['id']}#{int(start)}-{int(end)}",
+                "doc_id": d["id"],
+                "source_file": d["source_file"],
+                "title": d["title"],
+                "url": d["url"],
+                "start": int(start),
+                "end": int(end),
+                "score": float(self.scores[row, rank]),
+                "rank": rank + 1,
+            }
+            if with_text:
+                item["text"] = self.index.passage_text(p)
+            out.append(item)
+        return out
+
+
+class TfidfEngine:
+    """
+    Vectorised TF-IDF query engine over passages. All questions in a batch are
+    encoded into one sparse matrix and scored against the (pre-normalised)
+    passage rows with a single sparse product; top-k per row uses argpartition
+    over the non-zero scores only.
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.index_dir = index_dir
+
+    @traced("tfidf.query")
+    def query_batch(self, questions: List[str], k: int = 6, collapse: bool = False) -> BatchResult:
+        """collapse=True keeps only the best passage of each document."""
+        idx = load_index(self.index_dir)   # memory-mapped once per process, hot-reloads on new version
+        n = len(questions)
+        ids = np.full((n, k), -1, dtype=np.int64)
+        scores = np.zeros((n, k), dtype=np.float32)
+        if n == 0 or k <= 0:
+            return BatchResult(idx, ids, scores)
+
+        Q = idx.transform_batch(questions)
+        S = (Q @ idx.matrix.T).tocsr()      # (n_questions, n_passages), zeros never materialised
+
+        for r in range(n):
+            lo, hi = S.indptr[r], S.indptr[r + 1]
+            data, cols = S.data[lo:hi], S.indices[lo:hi]
+            if collapse:
+                data, cols = self._best_per_doc(idx, data, cols, k)
+            if data.size > k:
+                part = np.argpartition(-data, k - 1)[:k]
+                data, cols = data[part], cols[part]
+            order = np.argsort(-data, kind="stable")
+            m = order.size
+            ids[r, :m] = cols[order]
+            scores[r, :m] = data[order]
+        return BatchResult(idx, ids, scores)
+
+    @staticmethod
+    def _best_per_doc(idx, data, cols, k):
+        # overlapping windows mean neighbours score alike: over-fetch, then widen if needed
+        m = min(data.size, 4 * k)
+        while True:
+            part = np.argpartition(-data, m - 1)[:m] if m < data.size else np.arange(data.size)
+            part = part[np.argsort(-data[part], kind="stable")]
+            _, first = np.unique(idx.passage_doc[cols[part]], return_index=True)
+            if first.size >= k or m >= data.size:
+                keep = part[np.sort(first)]
+                return data[keep], cols[keep]
+            m = min(data.size, m * 4)
+
+
+_engine = TfidfEngine()
+
+
+def get_engine() -> TfidfEngine:
+    return _engine
+
+
+def query_vector(question: str, k: int = 6, collapse: bool = True):
+    """Best-matching passages (one per document unless collapse=False)."""
+    t0 = time.time()
+    res = _engine.query_batch([question], k=k, collapse=collapse)
+    metas = res.to_dicts(0)
+    results_docs = res.docs(0)
+    results_ids = [m.pop("id") for m in metas]
     latency = time.time() - t0
-    return results_docs, results_meta, results_ids, latency
+    return results_docs, metas, results_ids, latency
@@ -0,0 +1,265 @@
+# services/vector/tfidf_store.py
+"""
+Pickle-free, memory-mappable on-disk format for the TF-IDF index.
+
+Layout (one directory per build, switched atomically via CURRENT):
+
+  data/tfidf_index/
+    CURRENT              -> name of the active version dir, e.g. "v1712345678901"
+    v1712345678901/
+      meta.json          -> format version, analyzer + weighting params, per-doc metadata
+      data.npy           -> CSR values   (float32), one row per passage
+      indices.npy        -> CSR columns  (int32)
+      indptr.npy         -> CSR row ptrs (int64)
+      idf.npy            -> idf weight per term (float32)
+      vocab.npy          -> sorted terms as fixed-width utf-8 bytes
+      texts.bin          -> every doc text, utf-8, back to back
+      text_offsets.npy   -> byte offsets into texts.bin (n_docs + 1)
+      passage_doc.npy    -> parent doc row of each passage (int32)
+      passage_chars.npy  -> (start, end) char offsets inside the parent doc
+      passage_bytes.npy  -> (start, end) absolute byte offsets into texts.bin
+      passage_hash.npy   -> content hash of each passage (keys the embedding cache)
+
+Readers np.load(..., mmap_mode="r") everything, so worker processes share the
+same page-cache pages and a query never copies the corpus.
+"""
+import os, json, time, shutil, threading
+from pathlib import Path
+from typing import List, Dict
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+INDEX_DIR = os.getenv("TFIDF_INDEX_DIR", "./data/tfidf_index")
+FORMAT_VERSION = 2
+KEEP_VERSIONS = 2          # keep the previous build around for readers still mapping it
+
+
+def _atomic_write_text(path: Path, text: str):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _byte_offsets(text: str, char_offsets: List[int]) -> Dict[int, int]:
+    """Map char offsets to utf-8 byte offsets, encoding each segment once."""
+    out, b, prev = {}, 0, 0
+    for c in sorted(set(char_offsets)):
+        b += len(text[prev:c].encode("utf-8"))
+        out[c] = b
+        prev = c
+    return out
+
+
+def write_index(vectorizer, X, docs: List[Dict], passages: List[Dict], index_dir: str = INDEX_DIR) -> str:
+    """
+    Write a fitted TfidfVectorizer + passage matrix as a new version; return its name.
+    `passages[i]` = {"doc": parent doc row, "start": char, "end": char, "hash": str}
+    describes row i of X.
+    """
+    root = Path(index_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    version = f"v{int(time.time() * 1000)}"
+    tmp = root / f"{version}.tmp"
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir()
+
+    # rows are stored unit-length so a query score is a plain dot product
+    X = normalize(sparse.csr_matrix(X, dtype=np.float32), norm="l2", copy=False)
+    X.sort_indices()
+    np.save(tmp / "data.npy", X.data.astype(np.float32, copy=False))
+    np.save(tmp / "indices.npy", X.indices.astype(np.int32, copy=False))
+    np.save(tmp / "indptr.npy", X.indptr.astype(np.int64, copy=False))
+    idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(len(vectorizer.vocabulary_))
+    np.save(tmp / "idf.npy", idf.astype(np.float32))
+
+    # feature_names_out is sorted, and vocabulary_ ids follow that order, so a
+    # term's column id is simply its position in the sorted array
+    terms = [t.encode("utf-8") for t in vectorizer.get_feature_names_out()]
+    np.save(tmp / "vocab.npy", np.array(terms, dtype=bytes))
+
+    by_doc: Dict[int, List[int]] = {}
+    for p in passages:
+        by_doc.setdefault(p["doc"], []).extend((p["start"], p["end"]))
+
+    offsets, byte_maps = [0], []
+    with open(tmp / "texts.bin", "wb") as f:
+        for j, d in enumerate(docs):
+            b = d["text"].encode("utf-8")
+            f.write(b)
+            byte_maps.append(_byte_offsets(d["text"], by_doc.get(j, [])))
+            offsets.append(offsets[-1] + len(b))
+    np.save(tmp / "text_offsets.npy", np.array(offsets, dtype=np.int64))
+
+    np.save(tmp / "passage_doc.npy", np.array([p["doc"] for p in passages], dtype=np.int32))
+    np.save(tmp / "passage_chars.npy", np.array([(p["start"], p["end"]) for p in passages], dtype=np.int64).reshape(-1, 2))
+    np.save(tmp / "passage_hash.npy", np.array([p["hash"].encode("ascii") for p in passages], dtype=bytes))
+    np.save(tmp / "passage_bytes.npy", np.array(
+        [(offsets[p["doc"]] + byte_maps[p["doc"]][p["start"]], offsets[p["doc"]] + byte_maps[p["doc"]][p["end"]])
+         for p in passages], dtype=np.int64).reshape(-1, 2))
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "version": version,
+        "created": time.time(),
+        "shape": list(X.shape),
+        "analyzer": {
+            "stop_words": vectorizer.stop_words,
+            "lowercase": vectorizer.lowercase,
+            "token_pattern": vectorizer.token_pattern,
+            "ngram_range": list(vectorizer.ngram_range),
+            "strip_accents": vectorizer.strip_accents,
+        },
+        # query-side weighting is applied by transform_batch; the df / idf
+        # settings only shaped the stored vocabulary and idf.npy
+        "weighting": {
+            "binary": vectorizer.binary,
+            "sublinear_tf": vectorizer.sublinear_tf,
+            "use_idf": vectorizer.use_idf,
+            "norm": vectorizer.norm,
+            "smooth_idf": vectorizer.smooth_idf,
+            "min_df": vectorizer.min_df,
+            "max_df": vectorizer.max_df,
+        },
+        "docs": [{k: v for k, v in d.items() if k != "text"} for d in docs],
+    }
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    os.replace(tmp, root / version)
+    _atomic_write_text(root / "CURRENT", version)
+    _prune_old_versions(root, keep=KEEP_VERSIONS)
+    return version
+
+
+def _prune_old_versions(root: Path, keep: int):
+    versions = sorted(p for p in root.iterdir() if p.is_dir() and p.name.startswith("v") and not p.name.endswith(".tmp"))
+    for p in versions[:-keep]:
+        shutil.rmtree(p, ignore_errors=True)
+
+
+def current_version(index_dir: str = INDEX_DIR) -> str | None:
+    p = Path(index_dir) / "CURRENT"
+    try:
+        return p.read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class TfidfIndex:
+    """Read-only, memory-mapped view of one index version."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path / "meta.json", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported TF-IDF index format: {self.meta.get('format')}")
+        self.version = self.meta["version"]
+        self.docs = self.meta["docs"]
+
+        load = lambda name: np.load(self.path / name, mmap_mode="r")
+        self.matrix = sparse.csr_matrix(
+            (load("data.npy"), load("indices.npy"), load("indptr.npy")),
+            shape=tuple(self.meta["shape"]),
+            copy=False,
+        )
+        self.idf = load("idf.npy")
+        self.vocab = load("vocab.npy")
+        self.text_offsets = load("text_offsets.npy")
+        self.passage_doc = load("passage_doc.npy")
+        self.passage_chars = load("passage_chars.npy")
+        self.passage_bytes = load("passage_bytes.npy")
+        self.passage_hash = load("passage_hash.npy")
+        self._texts = np.memmap(self.path / "texts.bin", dtype=np.uint8, mode="r") \
+            if self.text_offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        a = self.meta["analyzer"]
+        self._analyze = TfidfVectorizer(
+            stop_words=a["stop_words"],
+            lowercase=a["lowercase"],
+            token_pattern=a["token_pattern"],
+            ngram_range=tuple(a["ngram_range"]),
+            strip_accents=a.get("strip_accents"),
+        ).build_analyzer()
+        # indexes written before "weighting" was recorded used the defaults
+        self.weighting = {"binary": False, "sublinear_tf": False, "norm": "l2", **self.meta.get("weighting", {})}
+
+    def text(self, i: int) -> str:
+        """Full text of doc row i."""
+        s, e = int(self.text_offsets[i]), int(self.text_offsets[i + 1])
+        return self._texts[s:e].tobytes().decode("utf-8")
+
+    def passage_text(self, p: int) -> str:
+        """Text of passage row p, sliced straight out of the mapped blob."""
+        s, e = self.passage_bytes[p]
+        return self._texts[int(s):int(e)].tobytes().decode("utf-8")
+
+    def transform(self, question: str) -> sparse.csr_matrix:
+        return self.transform_batch([question])
+
+    def transform_batch(self, questions: List[str]) -> sparse.csr_matrix:
+        """
+        Same weighting as the fitted TfidfVectorizer's transform (binary /
+        sublinear tf, idf, norm from meta["weighting"]), one row per question,
+        built with a single vocabulary lookup for the batch.
+        """
+        n_terms = self.vocab.shape[0]
+        rows, toks = [], []
+        for r, q in enumerate(questions):
+            ts = self._analyze(q or "")
+            toks.extend(t.encode("utf-8") for t in ts)
+            rows.extend([r] * len(ts))
+        rows = np.asarray(rows, dtype=np.int64)
+        toks = np.array(toks, dtype=bytes)
+        shape = (len(questions), n_terms)
+        if not toks.size or not n_terms:
+            return sparse.csr_matrix(shape, dtype=np.float32)
+
+        pos = np.searchsorted(self.vocab, toks)
+        hit = pos < n_terms
+        hit[hit] = self.vocab[pos[hit]] == toks[hit]
+        rows, cols = rows[hit], pos[hit]
+
+        # duplicates are summed by the constructor -> raw term counts
+        Q = sparse.csr_matrix((np.ones(rows.size, dtype=np.float32), (rows, cols)), shape=shape)
+        Q.sum_duplicates()
+        w = self.weighting
+        if w["binary"]:
+            Q.data[:] = 1.0
+        elif w["sublinear_tf"]:
+            np.log(Q.data, out=Q.data)
+            Q.data += 1.0
+        Q.data *= self.idf[Q.indices]
+        if w["norm"] in ("l1", "l2"):
+            Q = normalize(Q, norm=w["norm"], copy=False)
+        return Q
+
+
+_lock = threading.Lock()
+_loaded: Dict[str, TfidfIndex] = {}
+
+
+def load_index(index_dir: str = INDEX_DIR) -> TfidfIndex:
+    """
+    Process-wide cached index. Re-reads CURRENT (one small file) per call and
+    maps the new version when ingest has switched it, so workers hot-reload.
+    """
+    version = current_version(index_dir)
+    if version is None:
+        raise FileNotFoundError("TF-IDF index not found. Run: python services/vector/ingest_tfidf.py")
+    idx = _loaded.get(index_dir)
+    if idx is not None and idx.version == version:
+        return idx
+    with _lock:
+        idx = _loaded.get(index_dir)
+        if idx is None or idx.version != version:
+            idx = TfidfIndex(Path(index_dir) / version)
+            _loaded[index_dir] = idx
+        return idx